@@ -1,10 +1,54 @@
-from django.contrib import admin
+import copy
+from functools import partial
+
+from django import forms
+from django.contrib import admin, messages
+from django.db import transaction
+from django.utils import timezone
 from django.utils.html import format_html
-from .models import Booking, ContactInquiry
+from packages.admin import PackageRelatedAdmin
+from .inventory import (
+    apply_seat_changes, held_seats, invalidate_availability, release_booking_seats, seat_changes
+)
+from .models import Booking, ContactInquiry, Departure, OutboundEmail, PricingRule
+
+
+def plan_seat_changes(booking, stored, create=True):
+    """
+    Point `booking` at the departure of its package and date, and return the
+    seat changes of saving it over `stored` (None when adding a booking).
+    With create=False a departure that does not exist yet is left unsaved.
+    """
+    if stored is None or (stored.package_id, stored.travel_date) != (booking.package_id, booking.travel_date):
+        booking.departure = Departure.objects.for_date(booking.package, booking.travel_date, create=create)
+    return seat_changes(stored and held_seats(stored), held_seats(booking))
+
+
+class BookingAdminForm(forms.ModelForm):
+    """Booking form that refuses edits needing more seats than the departure has left"""
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.errors:
+            return cleaned_data
+
+        # self.instance keeps the saved values until the form is fully cleaned
+        booking = copy.copy(self.instance)
+        for name, value in cleaned_data.items():
+            setattr(booking, name, value)
+        stored = self.instance if self.instance.pk else None
+        # Validation must not write: save_model() creates the departure
+        for departure, seats in plan_seat_changes(booking, stored, create=False):
+            if seats > departure.seats_remaining:
+                raise forms.ValidationError(
+                    f'Only {departure.seats_remaining} more seat(s) left on {departure.date:%d %b %Y}.'
+                )
+        return cleaned_data
 
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
+class BookingAdmin(PackageRelatedAdmin):
+    form = BookingAdminForm
     list_display = [
         'booking_id',
         'full_name',
@@ -107,18 +151,44 @@ class BookingAdmin(admin.ModelAdmin):
 
     actions = ['mark_confirmed', 'mark_completed', 'mark_cancelled']
 
+    def save_model(self, request, obj, form, change):
+        # Move the booking's seats along with a new date, party size or status
+        with transaction.atomic():
+            stored = Booking.objects.select_related('departure').get(pk=obj.pk) if change else None
+            apply_seat_changes(plan_seat_changes(obj, stored))
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            release_booking_seats(Booking.objects.filter(pk=obj.pk))
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            release_booking_seats(queryset)
+            super().delete_queryset(request, queryset)
+
+    def set_status(self, request, queryset, status):
+        # Cancelled bookings gave their seats back: reopen them one by one from the change form
+        cancelled = queryset.filter(booking_status='cancelled').count()
+        updated = queryset.exclude(booking_status='cancelled').update(booking_status=status)
+        self.message_user(request, f'{updated} booking(s) marked as {status}.')
+        if cancelled:
+            self.message_user(request, f'{cancelled} cancelled booking(s) skipped.', level=messages.WARNING)
+
     def mark_confirmed(self, request, queryset):
-        updated = queryset.update(booking_status='confirmed')
-        self.message_user(request, f'{updated} booking(s) marked as confirmed.')
+        self.set_status(request, queryset, 'confirmed')
     mark_confirmed.short_description = 'Mark as confirmed'
 
     def mark_completed(self, request, queryset):
-        updated = queryset.update(booking_status='completed')
-        self.message_user(request, f'{updated} booking(s) marked as completed.')
+        self.set_status(request, queryset, 'completed')
     mark_completed.short_description = 'Mark as completed'
 
     def mark_cancelled(self, request, queryset):
-        updated = queryset.update(booking_status='cancelled')
+        with transaction.atomic():
+            # Give the seats of newly cancelled bookings back to their departures
+            release_booking_seats(queryset)
+            updated = queryset.update(booking_status='cancelled')
         self.message_user(request, f'{updated} booking(s) marked as cancelled.')
     mark_cancelled.short_description = 'Mark as cancelled'
 
@@ -195,3 +265,61 @@ class ContactInquiryAdmin(admin.ModelAdmin):
         updated = queryset.update(status='closed')
         self.message_user(request, f'{updated} inquiry(ies) marked as closed.')
     mark_closed.short_description = 'Mark as closed'
+
+
+@admin.register(Departure)
+class DepartureAdmin(admin.ModelAdmin):
+    list_display = ['package', 'date', 'capacity', 'seats_booked', 'seats_remaining']
+    list_filter = ['date']
+    list_select_related = ['package']
+    search_fields = ['package__name']
+    readonly_fields = ['seats_booked']
+    raw_id_fields = ['package']
+    date_hierarchy = 'date'
+
+    def invalidate(self, departures):
+        """Drop the cached availability calendars showing these departures on commit"""
+        for package_id, date in {(departure.package_id, departure.date) for departure in departures}:
+            transaction.on_commit(partial(invalidate_availability, package_id, date))
+
+    def save_model(self, request, obj, form, change):
+        # A new package or date also changes the calendar the departure was on
+        stored = list(Departure.objects.filter(pk=obj.pk).only('package_id', 'date')) if change else []
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            self.invalidate(stored + [obj])
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            self.invalidate([obj])
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            self.invalidate(list(queryset.only('package_id', 'date')))
+            super().delete_queryset(request, queryset)
+
+
+@admin.register(PricingRule)
+class PricingRuleAdmin(admin.ModelAdmin):
+    list_display = ['name', 'rule_type', 'percentage', 'package', 'min_people', 'start_date', 'end_date', 'active']
+    list_filter = ['rule_type', 'active']
+    list_select_related = ['package']
+    search_fields = ['name', 'package__name']
+    readonly_fields = ['created_at', 'updated_at']
+    raw_id_fields = ['package']
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'to', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['subject', 'to']
+    readonly_fields = ['attempts', 'last_error', 'created_at', 'sent_at']
+
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status='sent').update(status='pending', attempts=0, next_attempt_at=timezone.now())
+        self.message_user(request, f'{updated} email(s) queued for sending.')
+    retry_now.short_description = 'Retry selected emails now'
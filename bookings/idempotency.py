@@ -0,0 +1,55 @@
+"""
+Deduplication of booking form submissions.
+
+The booking form carries a random key in a hidden field. The first
+submission stores the key next to the booking it created, in the booking's
+transaction; a replay of the same submission (double click, mobile retry,
+back + resubmit) finds the key and is sent to the original booking instead
+of inserting another one and queueing another email. Concurrent replays are
+caught by the unique key.
+
+Keys are only needed while a replay is plausible: ``manage.py
+purge_idempotency_keys`` deletes the ones older than IDEMPOTENCY_KEY_TTL in
+batches.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+
+def booking_id_for_key(key):
+    """The booking ID created by an earlier submission of `key`, or None"""
+    if key is None:
+        return None
+    return (
+        IdempotencyKey.objects.filter(key=key)
+        .values_list('booking__booking_id', flat=True)
+        .first()
+    )
+
+
+def remember_key(key, booking):
+    """Record that `key` created `booking`; raises IntegrityError on a concurrent replay"""
+    if key is not None:
+        IdempotencyKey.objects.create(key=key, booking=booking)
+
+
+def purge_expired_keys(batch_size=1000):
+    """Delete keys older than IDEMPOTENCY_KEY_TTL in batches; return the number deleted"""
+    cutoff = timezone.now() - datetime.timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    purged = 0
+    while True:
+        with transaction.atomic():
+            pks = list(
+                IdempotencyKey.objects.filter(created_at__lt=cutoff)
+                .order_by('created_at')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            deleted, _ = IdempotencyKey.objects.filter(pk__in=pks).delete()
+        purged += deleted
+        if len(pks) < batch_size:
+            return purged
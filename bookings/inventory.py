@@ -0,0 +1,223 @@
+"""
+Seat inventory of package departures.
+
+Every (package, travel date) pair has a Departure row holding its capacity
+and the seats booked so far; it is created with DEPARTURE_DEFAULT_CAPACITY
+the first time the date is booked and can be adjusted in the admin.
+
+Seats are taken with one conditional UPDATE:
+
+    UPDATE ... SET seats_booked = seats_booked + n
+    WHERE id = ? AND seats_booked <= capacity - n
+
+so concurrent bookings can never oversell a departure, and no row is read
+and locked before the decision. The row lock taken by the UPDATE lasts until
+the surrounding transaction commits, so callers reserve as the last write of
+their transaction to keep bookings of the same departure from queueing
+behind each other.
+
+While a customer fills in the booking form, the seats are held: hold_seats()
+reserves them like a booking and records a SeatHold that expires after
+SEAT_HOLD_TTL seconds. Submitting the form claims the hold, turning its seats
+into the booking's without another reservation. ``manage.py
+release_expired_holds`` deletes expired holds in batches and gives their seats
+back, so availability is always read from the Departure row alone, however
+many holds there are. A reservation that finds its departure full releases
+that departure's expired holds itself before giving up, so abandoned forms
+never keep seats off sale while the command is not running.
+"""
+import calendar
+import datetime
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Departure, SeatHold
+
+CACHE_KEY_PREFIX = 'availability'
+
+
+class SoldOut(Exception):
+    """Not enough seats left on a departure"""
+
+
+def _take_seats(departure, seats):
+    return Departure.objects.filter(
+        pk=departure.pk,
+        seats_booked__lte=F('capacity') - seats
+    ).update(seats_booked=F('seats_booked') + seats)
+
+
+def reserve_seats(departure, seats):
+    """Take seats on a departure or raise SoldOut"""
+    reserved = _take_seats(departure, seats)
+    if not reserved and release_expired_holds(departure=departure):
+        reserved = _take_seats(departure, seats)
+    if not reserved:
+        raise SoldOut(f'Only {seats_remaining(departure)} seat(s) left on {departure.date:%d %b %Y}.')
+    transaction.on_commit(lambda: invalidate_availability(departure.package_id, departure.date))
+
+
+def release_seats(departure_id, seats):
+    """Give seats of a cancelled booking back to its departure"""
+    departure = Departure.objects.only('package_id', 'date').get(pk=departure_id)
+    Departure.objects.filter(pk=departure_id, seats_booked__gte=seats).update(
+        seats_booked=F('seats_booked') - seats
+    )
+    transaction.on_commit(lambda: invalidate_availability(departure.package_id, departure.date))
+
+
+def held_seats(booking):
+    """(departure, seats) a booking occupies, or None if it is cancelled or has no departure"""
+    # departure, not departure_id: the admin form checks against unsaved departures
+    if booking.booking_status == 'cancelled' or booking.departure is None:
+        return None
+    return booking.departure, booking.number_of_people
+
+
+def seat_changes(old, new):
+    """
+    Seats to take (+) or give back (-) per departure when a booking goes from
+    `old` to `new`, both held_seats() values. Returns [(departure, seats)].
+    """
+    changes = {}
+    for held, sign in ((old, -1), (new, 1)):
+        if held is not None:
+            departure, seats = held
+            changes.setdefault(departure.pk, [departure, 0])[1] += sign * seats
+    return [(departure, seats) for departure, seats in changes.values() if seats]
+
+
+def apply_seat_changes(changes):
+    """Give back and take the seats listed by seat_changes(); raise SoldOut"""
+    for departure, seats in changes:
+        if seats < 0:
+            release_seats(departure.pk, -seats)
+    for departure, seats in changes:
+        if seats > 0:
+            reserve_seats(departure, seats)
+
+
+def release_booking_seats(bookings):
+    """Give back the seats of every booking of a queryset that still occupies some"""
+    seats = Counter()
+    occupying = bookings.exclude(booking_status='cancelled').exclude(departure=None)
+    for departure_id, number_of_people in occupying.values_list('departure_id', 'number_of_people'):
+        seats[departure_id] += number_of_people
+    for departure_id, count in seats.items():
+        release_seats(departure_id, count)
+
+
+def hold_seats(departure, seats, replace=None):
+    """Hold seats for SEAT_HOLD_TTL, releasing the hold with token `replace`; raise SoldOut"""
+    with transaction.atomic():
+        if replace:
+            release_hold(replace)
+        hold = SeatHold.objects.create(
+            departure=departure,
+            seats=seats,
+            expires_at=timezone.now() + datetime.timedelta(seconds=settings.SEAT_HOLD_TTL),
+        )
+        reserve_seats(departure, seats)
+    return hold
+
+
+def _take_hold(token):
+    """Delete the hold with `token`; return it if this call removed it"""
+    hold = SeatHold.objects.filter(token=token).first()
+    if hold is None:
+        return None
+    # Only the caller whose DELETE removes the row owns its seats (vs. the sweeper)
+    deleted, _ = SeatHold.objects.filter(pk=hold.pk).delete()
+    return hold if deleted else None
+
+
+def release_hold(token):
+    """Give the seats of a hold back"""
+    hold = _take_hold(token)
+    if hold is not None:
+        release_seats(hold.departure_id, hold.seats)
+
+
+def claim_hold(token, departure, seats):
+    """
+    Turn a hold into a booking of `seats` on `departure`.
+
+    Return True if the hold covered the booking; otherwise it is released and
+    the caller has to reserve the seats itself. A hold that expired but was not
+    swept yet still counts, as its seats were never given back.
+    """
+    hold = _take_hold(token) if token else None
+    if hold is None:
+        return False
+    if hold.departure_id == departure.pk and hold.seats == seats:
+        return True
+    release_seats(hold.departure_id, hold.seats)
+    return False
+
+
+def release_expired_holds(batch_size=500, departure=None):
+    """Delete expired holds, of `departure` only if given, and give their seats back; return the number released"""
+    released = 0
+    while True:
+        with transaction.atomic():
+            expired = SeatHold.objects.filter(expires_at__lte=timezone.now()).order_by('expires_at')
+            if departure is not None:
+                expired = expired.filter(departure=departure)
+            if connection.features.has_select_for_update_skip_locked:
+                expired = expired.select_for_update(skip_locked=True)
+            holds = list(expired.values_list('pk', 'departure_id', 'seats')[:batch_size])
+            if not holds:
+                return released
+
+            deleted, _ = SeatHold.objects.filter(pk__in=[pk for pk, _, _ in holds]).delete()
+            if deleted != len(holds):
+                # A booking claimed some of them meanwhile (no row locks): read the batch again
+                transaction.set_rollback(True)
+                continue
+            seats = Counter()
+            for _, departure_id, count in holds:
+                seats[departure_id] += count
+            for departure_id, count in seats.items():
+                release_seats(departure_id, count)
+        released += len(holds)
+        if len(holds) < batch_size:
+            return released
+
+
+def seats_remaining(departure):
+    departure.refresh_from_db(fields=['capacity', 'seats_booked'])
+    return departure.seats_remaining
+
+
+def _cache_key(package_id, year, month):
+    return f'{CACHE_KEY_PREFIX}:{package_id}:{year}-{month:02d}'
+
+
+def invalidate_availability(package_id, date):
+    cache.delete(_cache_key(package_id, date.year, date.month))
+
+
+def availability_calendar(package_id, year, month):
+    """Seats left per date of a month for a package, cached until the next reservation"""
+    key = _cache_key(package_id, year, month)
+    days = cache.get(key)
+    if days is None:
+        first = datetime.date(year, month, 1)
+        last = first.replace(day=calendar.monthrange(year, month)[1])
+        departures = dict(
+            Departure.objects.filter(package_id=package_id, date__range=(first, last))
+            .annotate(remaining=F('capacity') - F('seats_booked'))
+            .values_list('date', 'remaining')
+        )
+        days = {}
+        day = first
+        while day <= last:
+            days[day.isoformat()] = max(departures.get(day, settings.DEPARTURE_DEFAULT_CAPACITY), 0)
+            day += datetime.timedelta(days=1)
+        cache.set(key, days, settings.AVAILABILITY_CACHE_TIMEOUT)
+    return days
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from bookings.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete booking form idempotency keys older than IDEMPOTENCY_KEY_TTL (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Keys deleted per transaction (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        purged = purge_expired_keys(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {purged} expired idempotency keys'))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from bookings.inventory import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'Give the seats of expired booking form holds back (run as a worker with --loop, or from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Holds deleted per transaction (default: 500)',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and sweep periodically',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=30,
+            help='Seconds between sweeps with --loop (default: 30)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired_holds(batch_size=options['batch_size'])
+            if released or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Released {released} expired holds'))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from bookings.outbox import send_queued_emails
+
+
+class Command(BaseCommand):
+    help = 'Send queued outbound emails (run as a worker with --loop, or from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Emails sent per backend connection (default: 100)',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and poll the queue',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Seconds between polls with --loop (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_queued_emails(batch_size=options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Sent {sent} emails'))
+                if failed:
+                    self.stdout.write(self.style.WARNING(f'Failed: {failed} emails (will be retried)'))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
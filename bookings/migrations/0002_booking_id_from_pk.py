@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='booking',
+            name='booking_id',
+            field=models.CharField(blank=True, max_length=20, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_outboundemail'),
+        ('packages', '0008_relatedpackage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PricingRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('rule_type', models.CharField(choices=[('child', 'Child discount'), ('group', 'Group discount'), ('season', 'Seasonal adjustment')], max_length=20)),
+                ('percentage', models.DecimalField(decimal_places=2, help_text='Discount for child/group rules; price change for seasonal rules (e.g. 20 or -10)', max_digits=5)),
+                ('min_people', models.PositiveIntegerField(default=0, help_text='Group rules: smallest group that qualifies')),
+                ('start_date', models.DateField(blank=True, help_text='Seasonal rules: first travel date', null=True)),
+                ('end_date', models.DateField(blank=True, help_text='Seasonal rules: last travel date', null=True)),
+                ('active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('package', models.ForeignKey(blank=True, help_text='Leave empty to apply to every package', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='pricing_rules', to='packages.package')),
+            ],
+            options={
+                'verbose_name': 'Pricing Rule',
+                'verbose_name_plural': 'Pricing Rules',
+                'ordering': ['rule_type', 'name'],
+            },
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def create_departures(apps, schema_editor):
+    # Existing bookings already hold their seats: one departure per package and date
+    Booking = apps.get_model('bookings', 'Booking')
+    Departure = apps.get_model('bookings', 'Departure')
+    bookings = Booking.objects.exclude(booking_status='cancelled')
+    booked = bookings.values('package_id', 'travel_date').annotate(seats=Sum('number_of_people')).order_by()
+    Departure.objects.bulk_create([
+        Departure(
+            package_id=row['package_id'],
+            date=row['travel_date'],
+            capacity=max(settings.DEPARTURE_DEFAULT_CAPACITY, row['seats']),
+            seats_booked=row['seats'],
+        )
+        for row in booked
+    ], batch_size=500)
+
+    departures = {
+        (package_id, date): pk for pk, package_id, date in Departure.objects.values_list('pk', 'package_id', 'date')
+    }
+    bookings = list(bookings.only('pk', 'package_id', 'travel_date'))
+    for booking in bookings:
+        booking.departure_id = departures[booking.package_id, booking.travel_date]
+    Booking.objects.bulk_update(bookings, ['departure'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_pricingrule'),
+        ('packages', '0008_relatedpackage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Departure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('capacity', models.PositiveIntegerField(help_text='Seats on sale for this date')),
+                ('seats_booked', models.PositiveIntegerField(default=0)),
+                ('package', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='departures', to='packages.package')),
+            ],
+            options={
+                'ordering': ['date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='departure',
+            field=models.ForeignKey(blank=True, help_text='Seats are held on this departure', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bookings', to='bookings.departure'),
+        ),
+        migrations.AddConstraint(
+            model_name='departure',
+            constraint=models.UniqueConstraint(fields=('package', 'date'), name='unique_package_departure'),
+        ),
+        migrations.AddConstraint(
+            model_name='departure',
+            constraint=models.CheckConstraint(check=models.Q(('seats_booked__lte', models.F('capacity'))), name='departure_not_oversold'),
+        ),
+        migrations.RunPython(create_departures, migrations.RunPython.noop),
+    ]
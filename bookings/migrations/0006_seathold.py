@@ -0,0 +1,34 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:32
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_departure'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='departure',
+            name='seats_booked',
+            field=models.PositiveIntegerField(default=0, help_text='Seats booked or held'),
+        ),
+        migrations.CreateModel(
+            name='SeatHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('seats', models.PositiveIntegerField()),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('departure', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='bookings.departure')),
+            ],
+            options={
+                'ordering': ['expires_at'],
+            },
+        ),
+    ]
@@ -1,7 +1,68 @@
-from django.db import models
+import uuid
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
 from django.core.validators import MinValueValidator, EmailValidator
 from packages.models import Package
 
+class DepartureManager(models.Manager):
+    def for_date(self, package, date, create=True):
+        """
+        The departure of a package on a date, created with the default capacity on
+        first use; with create=False a missing departure is returned unsaved.
+        """
+        if not create:
+            departure = self.filter(package=package, date=date).first()
+            return departure or self.model(package=package, date=date, capacity=settings.DEPARTURE_DEFAULT_CAPACITY)
+        departure, _ = self.get_or_create(
+            package=package,
+            date=date,
+            defaults={'capacity': settings.DEPARTURE_DEFAULT_CAPACITY},
+        )
+        return departure
+
+
+class Departure(models.Model):
+    """Seat inventory of a package on one travel date (see bookings.inventory)"""
+    package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='departures')
+    date = models.DateField()
+    capacity = models.PositiveIntegerField(help_text="Seats on sale for this date")
+    seats_booked = models.PositiveIntegerField(default=0, help_text="Seats booked or held")
+
+    objects = DepartureManager()
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['package', 'date'], name='unique_package_departure'),
+            models.CheckConstraint(check=models.Q(seats_booked__lte=models.F('capacity')),
+                                   name='departure_not_oversold'),
+        ]
+
+    def __str__(self):
+        return f"{self.package.name} - {self.date}"
+
+    @property
+    def seats_remaining(self):
+        return max(self.capacity - self.seats_booked, 0)
+
+
+class SeatHold(models.Model):
+    """Seats held on a departure while a customer fills in the booking form"""
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    departure = models.ForeignKey(Departure, on_delete=models.CASCADE, related_name='holds')
+    seats = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['expires_at']
+
+    def __str__(self):
+        return f"{self.seats} seat(s) on departure {self.departure_id} until {self.expires_at}"
+
+
 class Booking(models.Model):
     """Customer bookings for travel packages"""
 
@@ -37,6 +98,8 @@ class Booking(models.Model):
     number_of_adults = models.PositiveIntegerField(default=1)
     number_of_children = models.PositiveIntegerField(default=0)
     travel_date = models.DateField()
+    departure = models.ForeignKey(Departure, on_delete=models.SET_NULL, null=True, blank=True,
+                                  related_name='bookings', help_text="Seats are held on this departure")
     special_requests = models.TextField(blank=True, help_text="Any special requirements or requests")
 
     # Pricing
@@ -52,7 +115,8 @@ class Booking(models.Model):
     admin_notes = models.TextField(blank=True, help_text="Internal notes for admin use")
 
     # Timestamps
-    booking_id = models.CharField(max_length=20, unique=True, blank=True)
+    # Derived from the primary key after the row is inserted (NULL until then)
+    booking_id = models.CharField(max_length=20, unique=True, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -62,16 +126,24 @@ class Booking(models.Model):
         verbose_name_plural = "Bookings"
 
     def save(self, *args, **kwargs):
-        if not self.booking_id:
-            # Generate booking ID: BKG + timestamp
-            import datetime
-            timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
-            self.booking_id = f'BKG{timestamp}'
-
         # Calculate balance amount
         self.balance_amount = self.total_price - self.advance_paid
 
-        super().save(*args, **kwargs)
+        if self.booking_id:
+            super().save(*args, **kwargs)
+            return
+
+        # Generate booking ID: BKG + date + primary key. The database allocates the
+        # key, so IDs never collide between concurrent requests, workers or hosts
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+            self.booking_id = self.build_booking_id()
+            Booking.objects.using(self._state.db).filter(pk=self.pk).update(booking_id=self.booking_id)
+
+    def build_booking_id(self):
+        """Human-readable booking ID, e.g. BKG20250114000123"""
+        created = timezone.localtime(self.created_at) if self.created_at else timezone.localtime()
+        return f'BKG{created:%Y%m%d}{self.pk:06d}'
 
     def __str__(self):
         return f"{self.booking_id} - {self.full_name} - {self.package.name}"
@@ -128,3 +200,103 @@ class ContactInquiry(models.Model):
 
     def __str__(self):
         return f"{self.name} - {self.subject}"
+
+
+class PricingRule(models.Model):
+    """Adjustment applied to booking totals by bookings.pricing"""
+
+    RULE_TYPES = [
+        ('child', 'Child discount'),
+        ('group', 'Group discount'),
+        ('season', 'Seasonal adjustment'),
+    ]
+
+    name = models.CharField(max_length=200)
+    rule_type = models.CharField(max_length=20, choices=RULE_TYPES)
+    percentage = models.DecimalField(
+        max_digits=5, decimal_places=2,
+        help_text="Discount for child/group rules; price change for seasonal rules (e.g. 20 or -10)"
+    )
+    package = models.ForeignKey(Package, on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='pricing_rules', help_text="Leave empty to apply to every package")
+    min_people = models.PositiveIntegerField(default=0, help_text="Group rules: smallest group that qualifies")
+    start_date = models.DateField(null=True, blank=True, help_text="Seasonal rules: first travel date")
+    end_date = models.DateField(null=True, blank=True, help_text="Seasonal rules: last travel date")
+    active = models.BooleanField(default=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['rule_type', 'name']
+        verbose_name = "Pricing Rule"
+        verbose_name_plural = "Pricing Rules"
+
+    def __str__(self):
+        return f"{self.name} ({self.get_rule_type_display()}, {self.percentage}%)"
+
+    def applies_to(self, package_id, number_of_people, travel_date):
+        """Whether this rule applies to a booking"""
+        if self.package_id and self.package_id != package_id:
+            return False
+        if self.rule_type == 'group':
+            return number_of_people >= self.min_people
+        if self.rule_type == 'season':
+            if travel_date is None:
+                return False
+            if self.start_date and travel_date < self.start_date:
+                return False
+            if self.end_date and travel_date > self.end_date:
+                return False
+        return True
+
+
+class OutboundEmail(models.Model):
+    """Email waiting to be sent by the send_queued_emails worker"""
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.TextField(help_text="Recipient addresses (one per line)")
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now,
+                                           help_text="Not sent before this time (retry backoff)")
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Outbound Email"
+        verbose_name_plural = "Outbound Emails"
+        indexes = [
+            # The worker's queue scan
+            models.Index(fields=['next_attempt_at', 'id'], condition=models.Q(status='pending'),
+                         name='outbound_email_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} - {self.to.splitlines()[0] if self.to else ''}"
+
+    def get_recipients(self):
+        """Return recipients as a list"""
+        return [address.strip() for address in self.to.split('\n') if address.strip()]
+
+
+class IdempotencyKey(models.Model):
+    """Key sent with a booking form submission, so replays return the original booking"""
+    key = models.UUIDField(unique=True)
+    booking = models.OneToOneField(Booking, on_delete=models.CASCADE, related_name='idempotency_key')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return str(self.key)
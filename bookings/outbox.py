@@ -0,0 +1,129 @@
+"""
+Persistent outbound email queue.
+
+Views call enqueue_email(), which only inserts an OutboundEmail row (in the
+caller's transaction), so a slow or unreachable SMTP server never delays a
+request. ``manage.py send_queued_emails`` drains the queue in batches over
+one reused backend connection. Failed sends are retried with exponential
+backoff (EMAIL_OUTBOX_RETRY_DELAY * 2^attempts) until EMAIL_OUTBOX_MAX_ATTEMPTS
+is reached, after which the email is marked failed and kept for inspection.
+
+Several workers may run at once: a batch is claimed by pushing its
+next_attempt_at past CLAIM_TIMEOUT before sending, using SKIP LOCKED where
+the database supports it, so a claimed email is not picked up twice unless
+its worker dies.
+"""
+import datetime
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed batch is reserved for the worker sending it
+CLAIM_TIMEOUT = datetime.timedelta(minutes=5)
+
+
+def enqueue_email(subject, body, to, from_email=None):
+    """Queue an email for the worker and return the OutboundEmail"""
+    if isinstance(to, str):
+        to = [to]
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to='\n'.join(to),
+    )
+
+
+def claim_batch(batch_size):
+    """Reserve up to batch_size due emails for this worker"""
+    now = timezone.now()
+    with transaction.atomic():
+        queryset = OutboundEmail.objects.filter(
+            status='pending',
+            next_attempt_at__lte=now
+        ).order_by('next_attempt_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        emails = list(queryset[:batch_size])
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            next_attempt_at=now + CLAIM_TIMEOUT
+        )
+    return emails
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt after `attempts` failures"""
+    return datetime.timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def send_batch(batch_size=100):
+    """Send one batch of due emails over a single connection; return (sent, failed)"""
+    emails = claim_batch(batch_size)
+    if not emails:
+        return 0, 0
+
+    sent = failed = 0
+    backend = get_connection(fail_silently=False)
+    try:
+        backend.open()
+    except Exception as e:
+        # Server unreachable: every claimed email counts as one failed attempt
+        logger.warning('Could not connect to the email backend: %s', e)
+        for email in emails:
+            record_failure(email, e)
+        return 0, len(emails)
+
+    try:
+        for email in emails:
+            message = EmailMessage(
+                email.subject,
+                email.body,
+                email.from_email,
+                email.get_recipients(),
+                connection=backend,
+            )
+            try:
+                message.send()
+            except Exception as e:
+                logger.warning('Sending email %s failed: %s', email.pk, e)
+                record_failure(email, e)
+                failed += 1
+            else:
+                email.status = 'sent'
+                email.attempts += 1
+                email.sent_at = timezone.now()
+                email.last_error = ''
+                email.save(update_fields=['status', 'attempts', 'sent_at', 'last_error'])
+                sent += 1
+    finally:
+        backend.close()
+    return sent, failed
+
+
+def record_failure(email, error):
+    """Schedule a retry, or mark the email failed after the last attempt"""
+    email.attempts += 1
+    email.last_error = str(error) or error.__class__.__name__
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = 'failed'
+    else:
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+    email.save(update_fields=['status', 'attempts', 'last_error', 'next_attempt_at'])
+
+
+def send_queued_emails(batch_size=100):
+    """Send batches until no due email is left; return (sent, failed)"""
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = send_batch(batch_size)
+        total_sent += sent
+        total_failed += failed
+        if sent + failed < batch_size:
+            return total_sent, total_failed
@@ -0,0 +1,120 @@
+"""
+Server-side booking prices.
+
+Totals are computed from Package.price and the active PricingRule rows, never
+from the amount posted by the booking form:
+
+- child: children pay the package price less the child discount
+- group: the group discount comes off the subtotal once the party is large enough
+- season: adjusts the total for travel dates in the rule's range (20 = +20%, -10 = -10%)
+
+For each rule type, rules of the booked package take precedence over general
+ones. The largest applicable child and group discount is used, and all
+applicable seasonal adjustments are combined.
+
+Active rules are kept in each worker's memory (travel_agency.local_cache, for
+up to PRICING_RULES_CACHE_TIMEOUT) and invalidated whenever a rule is saved or
+deleted, so a price computation normally runs no query.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+
+from travel_agency import local_cache
+from .models import PricingRule
+
+RULES_CACHE_KEY = 'pricing_rules'
+
+CENT = Decimal('0.01')
+HUNDRED = Decimal('100')
+
+
+def get_rules():
+    """Active pricing rules, kept in the worker's memory across requests"""
+    return local_cache.get(
+        RULES_CACHE_KEY, lambda: list(PricingRule.objects.filter(active=True)), settings.PRICING_RULES_CACHE_TIMEOUT
+    )
+
+
+def invalidate_rules():
+    local_cache.invalidate([RULES_CACHE_KEY])
+
+
+class PriceQuote:
+    """Breakdown of a computed booking price"""
+
+    def __init__(self, unit_price, adults, children, child_price, subtotal,
+                 group_discount, season_adjustment, total):
+        self.unit_price = unit_price
+        self.adults = adults
+        self.children = children
+        self.child_price = child_price
+        self.subtotal = subtotal
+        self.group_discount = group_discount
+        self.season_adjustment = season_adjustment
+        self.total = total
+
+    @property
+    def number_of_people(self):
+        return self.adults + self.children
+
+    def as_dict(self):
+        return {
+            'unit_price': str(self.unit_price),
+            'child_price': str(self.child_price),
+            'adults': self.adults,
+            'children': self.children,
+            'subtotal': str(self.subtotal),
+            'group_discount': str(self.group_discount),
+            'season_adjustment': str(self.season_adjustment),
+            'total': str(self.total),
+        }
+
+
+def _applicable(rules, rule_type, package_id):
+    matching = [rule for rule in rules if rule.rule_type == rule_type]
+    specific = [rule for rule in matching if rule.package_id == package_id]
+    return specific or matching
+
+
+def _money(amount):
+    return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def compute_price(package, adults, children=0, travel_date=None):
+    """Price a booking of `package` for the given party and travel date"""
+    number_of_people = adults + children
+    rules = [
+        rule for rule in get_rules()
+        if rule.applies_to(package.id, number_of_people, travel_date)
+    ]
+
+    child_discount = max(
+        (rule.percentage for rule in _applicable(rules, 'child', package.id)), default=Decimal('0')
+    )
+    group_discount = max(
+        (rule.percentage for rule in _applicable(rules, 'group', package.id)), default=Decimal('0')
+    )
+    child_discount = min(max(child_discount, Decimal('0')), HUNDRED)
+    group_discount = min(max(group_discount, Decimal('0')), HUNDRED)
+
+    unit_price = package.price
+    child_price = _money(unit_price * (HUNDRED - child_discount) / HUNDRED)
+    subtotal = unit_price * adults + child_price * children
+
+    group_amount = _money(subtotal * group_discount / HUNDRED)
+    total = subtotal - group_amount
+    for rule in _applicable(rules, 'season', package.id):
+        total = total * (HUNDRED + rule.percentage) / HUNDRED
+    total = max(_money(total), Decimal('0.00'))
+
+    return PriceQuote(
+        unit_price=unit_price,
+        adults=adults,
+        children=children,
+        child_price=child_price,
+        subtotal=_money(subtotal),
+        group_discount=group_amount,
+        season_adjustment=_money(total - (subtotal - group_amount)),
+        total=total,
+    )
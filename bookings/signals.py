@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+
+from .models import PricingRule
+from .pricing import invalidate_rules
+
+
+def invalidate_pricing_rules(sender, **kwargs):
+    """Drop the cached pricing rules when one changes"""
+    invalidate_rules()
+
+
+post_save.connect(invalidate_pricing_rules, sender=PricingRule, dispatch_uid='pricing_rules_save')
+post_delete.connect(invalidate_pricing_rules, sender=PricingRule, dispatch_uid='pricing_rules_delete')
@@ -1,3 +1,840 @@
-from django.test import TestCase
+import datetime
+import importlib
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from packages.models import PackageCategory
+from travel_agency import local_cache
+from travel_agency.testing import (
+    LOCMEM_CACHES, AdminQueryBudgetTestCase, QueryBudgetTestCase, bulk_create_packages, create_package
+)
+from .inventory import (
+    SoldOut, availability_calendar, claim_hold, hold_seats, release_expired_holds, reserve_seats
+)
+from .idempotency import purge_expired_keys
+from .models import Booking, ContactInquiry, Departure, IdempotencyKey, OutboundEmail, PricingRule, SeatHold
+from .outbox import enqueue_email, send_queued_emails
+from .pricing import compute_price
+from .views import BOOKINGS_SESSION_KEY
+
+
+def booking_fields(package, **kwargs):
+    """Valid Booking field values for tests"""
+    fields = {
+        'package': package,
+        'full_name': 'Guest',
+        'email': 'guest@example.com',
+        'phone': '9999999999',
+        'address': '1 Beach Road',
+        'city': 'Panaji',
+        'state': 'Goa',
+        'pincode': '403001',
+        'number_of_people': 2,
+        'travel_date': datetime.date.today() + datetime.timedelta(days=30),
+        'total_price': Decimal('20000'),
+    }
+    fields.update(kwargs)
+    return fields
+
+
+class BookingIdTests(TestCase):
+    """Booking IDs are readable and allocated once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.package = create_package(PackageCategory.objects.create(name='Beach'), 'Goa Package')
+
+    def test_format(self):
+        booking = Booking.objects.create(**booking_fields(self.package))
+        self.assertRegex(booking.booking_id, r'^BKG\d{8}\d{6,}$')
+        self.assertTrue(booking.booking_id.endswith(f'{booking.pk:06d}'))
+        self.assertEqual(Booking.objects.get(pk=booking.pk).booking_id, booking.booking_id)
+
+    def test_same_second(self):
+        bookings = [Booking.objects.create(**booking_fields(self.package)) for _ in range(20)]
+        self.assertEqual(len({booking.booking_id for booking in bookings}), 20)
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_confirmation_only_for_its_session(self):
+        data = booking_fields(self.package, number_of_adults=2)
+        del data['package']
+        response = self.client.post(reverse('booking_create', args=[self.package.slug]), data)
+        self.assertContains(self.client.get(response.url), 'guest@example.com')
+        # Booking IDs can be guessed: another visitor gets a 404
+        self.assertEqual(Client().get(response.url).status_code, 404)
+        staff = Client()
+        staff.force_login(get_user_model().objects.create_user('staff', password='password', is_staff=True))
+        self.assertEqual(staff.get(response.url).status_code, 200)
+
+    def test_kept_on_update(self):
+        booking = Booking.objects.create(**booking_fields(self.package))
+        booking_id = booking.booking_id
+        booking.advance_paid = Decimal('5000')
+        booking.save()
+        booking.refresh_from_db()
+        self.assertEqual(booking.booking_id, booking_id)
+        self.assertEqual(booking.balance_amount, Decimal('15000'))
+
+
+class BookingIdConcurrencyTests(TransactionTestCase):
+    """Bookings created in parallel threads never share a booking ID"""
+
+    THREADS = 8
+    BOOKINGS = 2000
+
+    def setUp(self):
+        self.package = create_package(PackageCategory.objects.create(name='Beach'), 'Goa Package')
+
+    def create_bookings(self, count):
+        booking_ids = []
+        try:
+            for _ in range(count):
+                while True:
+                    try:
+                        booking_ids.append(Booking.objects.create(**booking_fields(self.package)).booking_id)
+                        break
+                    except OperationalError as e:
+                        # SQLite serializes writers ("database is locked"); only retry that
+                        if 'locked' not in str(e):
+                            raise
+        finally:
+            connection.close()
+        return booking_ids
+
+    def test_parallel_bookings(self):
+        per_thread = self.BOOKINGS // self.THREADS
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            results = list(executor.map(self.create_bookings, [per_thread] * self.THREADS))
+
+        booking_ids = [booking_id for result in results for booking_id in result]
+        self.assertEqual(len(booking_ids), per_thread * self.THREADS)
+        self.assertEqual(len(set(booking_ids)), len(booking_ids))
+        self.assertEqual(Booking.objects.exclude(booking_id=None).count(), len(booking_ids))
+
+
+@override_settings(CACHES=LOCMEM_CACHES,
+                   STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class PricingTests(TestCase):
+    """Booking totals are computed on the server from the package price and pricing rules"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = PackageCategory.objects.create(name='Beach')
+        cls.package = create_package(category, 'Goa Package', price=Decimal('10000'))
+        cls.other = create_package(category, 'Kerala Package', price=Decimal('8000'))
+        cls.travel_date = datetime.date(2030, 12, 24)
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+
+    def test_without_rules(self):
+        quote = compute_price(self.package, adults=2, children=1)
+        self.assertEqual(quote.total, Decimal('30000.00'))
+        self.assertEqual(quote.number_of_people, 3)
+
+    def test_child_discount(self):
+        PricingRule.objects.create(name='Kids', rule_type='child', percentage=Decimal('50'))
+        quote = compute_price(self.package, adults=2, children=2)
+        self.assertEqual(quote.child_price, Decimal('5000.00'))
+        self.assertEqual(quote.total, Decimal('30000.00'))
+
+    def test_group_discount(self):
+        PricingRule.objects.create(name='Group 5+', rule_type='group', percentage=Decimal('10'), min_people=5)
+        PricingRule.objects.create(name='Group 8+', rule_type='group', percentage=Decimal('15'), min_people=8)
+        self.assertEqual(compute_price(self.package, adults=4).total, Decimal('40000.00'))
+        self.assertEqual(compute_price(self.package, adults=5).total, Decimal('45000.00'))
+        self.assertEqual(compute_price(self.package, adults=8).total, Decimal('68000.00'))
+
+    def test_seasonal_adjustment(self):
+        PricingRule.objects.create(name='Christmas', rule_type='season', percentage=Decimal('20'),
+                                   start_date=datetime.date(2030, 12, 20), end_date=datetime.date(2030, 12, 31))
+        quote = compute_price(self.package, adults=2, travel_date=self.travel_date)
+        self.assertEqual(quote.total, Decimal('24000.00'))
+        self.assertEqual(quote.season_adjustment, Decimal('4000.00'))
+        self.assertEqual(compute_price(self.package, adults=2, travel_date=datetime.date(2030, 6, 1)).total,
+                         Decimal('20000.00'))
+
+    def test_package_rule_overrides_general_rule(self):
+        PricingRule.objects.create(name='Kids', rule_type='child', percentage=Decimal('50'))
+        PricingRule.objects.create(name='Goa kids', rule_type='child', percentage=Decimal('25'), package=self.package)
+        self.assertEqual(compute_price(self.package, adults=1, children=1).total, Decimal('17500.00'))
+        self.assertEqual(compute_price(self.other, adults=1, children=1).total, Decimal('12000.00'))
+
+    def test_rules_cached_and_invalidated(self):
+        compute_price(self.package, adults=2)
+        with self.assertNumQueries(0):
+            compute_price(self.package, adults=3, children=1)
+        # Checking the shared version is a cache lookup, not a query of the rules
+        with self.settings(LOCAL_CACHE_CHECK_INTERVAL=0), self.assertNumQueries(0):
+            compute_price(self.package, adults=3, children=1)
+
+        rule = PricingRule.objects.create(name='Kids', rule_type='child', percentage=Decimal('50'))
+        self.assertEqual(compute_price(self.package, adults=1, children=1).total, Decimal('15000.00'))
+        rule.active = False
+        rule.save()
+        self.assertEqual(compute_price(self.package, adults=1, children=1).total, Decimal('20000.00'))
+
+    def test_booking_ignores_posted_total(self):
+        PricingRule.objects.create(name='Kids', rule_type='child', percentage=Decimal('50'))
+        data = booking_fields(self.package, number_of_adults=2, number_of_children=1,
+                              travel_date=self.travel_date.isoformat(), total_price='1.00',
+                              advance_paid='99999999')
+        del data['package']
+        self.client.post(reverse('booking_create', args=[self.package.slug]), data)
+
+        booking = Booking.objects.get()
+        self.assertEqual(booking.total_price, Decimal('25000.00'))
+        self.assertEqual(booking.number_of_people, 3)
+        self.assertEqual(booking.advance_paid, Decimal('25000.00'))
+        self.assertEqual(booking.balance_amount, Decimal('0.00'))
+
+    def test_booking_rejects_invalid_party(self):
+        data = booking_fields(self.package, number_of_adults=0)
+        del data['package']
+        response = self.client.post(reverse('booking_create', args=[self.package.slug]), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Booking.objects.exists())
+
+    def test_quote_endpoint(self):
+        response = self.client.get(reverse('booking_quote', args=[self.package.slug]),
+                                   {'number_of_adults': 2, 'number_of_children': 1})
+        self.assertEqual(response.json()['total'], '30000.00')
+        response = self.client.get(reverse('booking_quote', args=[self.package.slug]), {'number_of_adults': 20})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES,
+                   STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class InventoryTests(TestCase):
+    """Seats are reserved per departure and never oversold"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.package = create_package(PackageCategory.objects.create(name='Beach'), 'Goa Package')
+        cls.travel_date = datetime.date(2030, 12, 24)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_departure_created_with_default_capacity(self):
+        with self.settings(DEPARTURE_DEFAULT_CAPACITY=12):
+            departure = Departure.objects.for_date(self.package, self.travel_date)
+        self.assertEqual(departure.capacity, 12)
+        self.assertEqual(Departure.objects.for_date(self.package, self.travel_date), departure)
+
+    def test_reserve_until_sold_out(self):
+        departure = Departure.objects.create(package=self.package, date=self.travel_date, capacity=5)
+        reserve_seats(departure, 3)
+        reserve_seats(departure, 2)
+        with self.assertRaisesMessage(SoldOut, 'Only 0 seat(s) left'):
+            reserve_seats(departure, 1)
+        departure.refresh_from_db()
+        self.assertEqual(departure.seats_booked, 5)
+
+    def test_calendar_cached_and_invalidated(self):
+        departure = Departure.objects.create(package=self.package, date=self.travel_date, capacity=5)
+        days = availability_calendar(self.package.id, 2030, 12)
+        self.assertEqual(len(days), 31)
+        self.assertEqual(days['2030-12-24'], 5)
+        with self.assertNumQueries(0):
+            availability_calendar(self.package.id, 2030, 12)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_seats(departure, 2)
+        self.assertEqual(availability_calendar(self.package.id, 2030, 12)['2030-12-24'], 3)
+
+    def test_sold_out_booking_rejected(self):
+        Departure.objects.create(package=self.package, date=self.travel_date, capacity=2, seats_booked=1)
+        data = booking_fields(self.package, number_of_adults=2, travel_date=self.travel_date.isoformat())
+        del data['package']
+        data['idempotency_key'] = key = str(uuid.uuid4())
+        response = self.client.post(reverse('booking_create', args=[self.package.slug]), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Booking.objects.exists())
+        self.assertFalse(OutboundEmail.objects.exists())
+        # Shown again as submitted, with the key that created nothing yet
+        self.assertContains(response, '>1 Beach Road</textarea>')
+        self.assertContains(response, 'name="number_of_adults" id="numAdults" class="form-control" min="1" value="2"')
+        self.assertContains(response, f'name="idempotency_key" value="{key}"')
+
+        data['number_of_adults'] = 1
+        self.client.post(reverse('booking_create', args=[self.package.slug]), data)
+        self.assertEqual(Booking.objects.get().number_of_adults, 1)
+
+    def test_invalid_booking_keeps_input(self):
+        data = booking_fields(self.package, number_of_adults='two', travel_date=self.travel_date.isoformat())
+        del data['package']
+        response = self.client.post(reverse('booking_create', args=[self.package.slug]), data)
+        self.assertContains(response, 'Please enter valid numbers of adults and children.')
+        self.assertContains(response, 'name="email" class="form-control" value="guest@example.com"')
+        self.assertContains(response, f'value="{self.travel_date.isoformat()}"')
+
+    def test_cancel_releases_seats(self):
+        departure = Departure.objects.create(package=self.package, date=self.travel_date, capacity=5, seats_booked=2)
+        Booking.objects.create(**booking_fields(self.package, departure=departure))
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password'))
+        changelist = reverse('admin:bookings_booking_changelist')
+        data = {'action': 'mark_cancelled', '_selected_action': Booking.objects.values_list('pk', flat=True)}
+        self.client.post(changelist, data)
+        self.client.post(changelist, data)
+        departure.refresh_from_db()
+        self.assertEqual(departure.seats_booked, 0)
+
+        # Confirming does not reopen cancelled bookings, whose seats are gone
+        self.client.post(changelist, {**data, 'action': 'mark_confirmed'})
+        self.assertEqual(Booking.objects.get().booking_status, 'cancelled')
+
+    def test_migration_backfill(self):
+        migration = importlib.import_module('bookings.migrations.0005_departure')
+        other_date = self.travel_date + datetime.timedelta(days=1)
+        Booking.objects.create(**booking_fields(self.package, travel_date=self.travel_date, number_of_people=2))
+        Booking.objects.create(**booking_fields(self.package, travel_date=self.travel_date, number_of_people=3))
+        Booking.objects.create(**booking_fields(self.package, travel_date=other_date, number_of_people=40))
+        cancelled = Booking.objects.create(**booking_fields(self.package, travel_date=other_date,
+                                                            booking_status='cancelled'))
+
+        migration.create_departures(apps, None)
+        self.assertEqual(list(Departure.objects.values_list('date', 'capacity', 'seats_booked')), [
+            (self.travel_date, settings.DEPARTURE_DEFAULT_CAPACITY, 5), (other_date, 40, 40),
+        ])
+        self.assertFalse(Booking.objects.exclude(pk=cancelled.pk).filter(departure=None).exists())
+        self.assertEqual(
+            set(Booking.objects.exclude(pk=cancelled.pk).values_list('departure__date', 'travel_date')),
+            {(self.travel_date, self.travel_date), (other_date, other_date)},
+        )
+        cancelled.refresh_from_db()
+        self.assertIsNone(cancelled.departure)
+
+    def test_availability_endpoint(self):
+        Departure.objects.create(package=self.package, date=self.travel_date, capacity=5, seats_booked=5)
+        url = reverse('booking_availability', args=[self.package.slug])
+        data = self.client.get(url, {'month': '2030-12'}).json()
+        self.assertEqual(data['days']['2030-12-24'], 0)
+        self.assertEqual(data['days']['2030-12-25'], data['default_capacity'])
+        self.assertEqual(self.client.get(url, {'month': 'december'}).status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES,
+                   STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class BookingAdminInventoryTests(TestCase):
+    """Admin edits and deletes of bookings move their seats between departures"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.package = create_package(PackageCategory.objects.create(name='Beach'), 'Goa Package')
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.travel_date = datetime.date(2030, 12, 24)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+        self.departure = Departure.objects.create(package=self.package, date=self.travel_date, capacity=5,
+                                                  seats_booked=2)
+        self.booking = Booking.objects.create(**booking_fields(self.package, departure=self.departure,
+                                                               travel_date=self.travel_date))
+
+    def assertSeatsBooked(self, departure, seats):
+        departure.refresh_from_db()
+        self.assertEqual(departure.seats_booked, seats)
+
+    def edit(self, **changes):
+        data = {
+            **booking_fields(self.package), 'package': self.package.pk, 'travel_date': self.travel_date,
+            'booking_status': 'confirmed', 'payment_status': 'pending', 'number_of_adults': 2,
+            'number_of_children': 0, 'advance_paid': 0, **changes,
+        }
+        return self.client.post(reverse('admin:bookings_booking_change', args=[self.booking.pk]), data)
+
+    def test_status_change(self):
+        self.assertEqual(self.edit(booking_status='cancelled').status_code, 302)
+        self.assertSeatsBooked(self.departure, 0)
+        self.edit(booking_status='confirmed')
+        self.assertSeatsBooked(self.departure, 2)
+
+    def test_party_size_change(self):
+        self.edit(number_of_people=4)
+        self.assertSeatsBooked(self.departure, 4)
+        self.edit(number_of_people=1)
+        self.assertSeatsBooked(self.departure, 1)
+
+    def test_party_size_over_capacity(self):
+        response = self.edit(number_of_people=6)
+        self.assertContains(response, 'Only 3 more seat(s) left on 24 Dec 2030.')
+        self.assertSeatsBooked(self.departure, 2)
+        self.assertEqual(Booking.objects.get().number_of_people, 2)
+
+    def test_travel_date_change(self):
+        self.edit(travel_date=self.travel_date + datetime.timedelta(days=1))
+        self.assertSeatsBooked(self.departure, 0)
+        booking = Booking.objects.select_related('departure').get()
+        self.assertEqual(booking.departure.date, self.travel_date + datetime.timedelta(days=1))
+        self.assertEqual(booking.departure.seats_booked, 2)
+
+    def test_new_date_over_capacity(self):
+        # The form checks a date without departure against the default capacity, without creating it
+        new_date = self.travel_date + datetime.timedelta(days=1)
+        response = self.edit(travel_date=new_date, number_of_people=settings.DEPARTURE_DEFAULT_CAPACITY + 1)
+        self.assertContains(response, f'Only {settings.DEPARTURE_DEFAULT_CAPACITY} more seat(s) left')
+        self.assertFalse(Departure.objects.filter(date=new_date).exists())
+
+    def test_capacity_change_invalidates_calendar(self):
+        self.assertEqual(availability_calendar(self.package.id, 2030, 12)['2030-12-24'], 3)
+        url = reverse('admin:bookings_departure_change', args=[self.departure.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'package': self.package.pk, 'date': self.travel_date, 'capacity': 10})
+        self.assertEqual(availability_calendar(self.package.id, 2030, 12)['2030-12-24'], 8)
+
+        url = reverse('admin:bookings_departure_delete', args=[self.departure.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {'post': 'yes'})
+        self.assertEqual(availability_calendar(self.package.id, 2030, 12)['2030-12-24'],
+                         settings.DEPARTURE_DEFAULT_CAPACITY)
+
+    def test_reopen_sold_out(self):
+        Booking.objects.update(booking_status='cancelled')
+        Departure.objects.filter(pk=self.departure.pk).update(seats_booked=4)
+        self.assertContains(self.edit(booking_status='confirmed'), 'Only 1 more seat(s) left')
+        self.assertEqual(Booking.objects.get().booking_status, 'cancelled')
+
+    def test_delete(self):
+        self.client.post(reverse('admin:bookings_booking_delete', args=[self.booking.pk]), {'post': 'yes'})
+        self.assertFalse(Booking.objects.exists())
+        self.assertSeatsBooked(self.departure, 0)
+
+    def test_bulk_delete(self):
+        # Two more seats belong to a booking that is not deleted
+        Departure.objects.filter(pk=self.departure.pk).update(seats_booked=4)
+        cancelled = Booking.objects.create(**booking_fields(self.package, departure=self.departure,
+                                                            booking_status='cancelled'))
+        self.client.post(reverse('admin:bookings_booking_changelist'), {
+            'action': 'delete_selected', 'post': 'yes', '_selected_action': [self.booking.pk, cancelled.pk],
+        })
+        self.assertFalse(Booking.objects.exists())
+        # Only the seats of the booking that still held them come back
+        self.assertSeatsBooked(self.departure, 2)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class SeatHoldTests(TestCase):
+    """Seats chosen on the booking form are held until booked or expired"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.package = create_package(PackageCategory.objects.create(name='Beach'), 'Goa Package')
+        cls.travel_date = timezone.localdate() + datetime.timedelta(days=30)
+
+    def setUp(self):
+        cache.clear()
+        self.departure = Departure.objects.create(package=self.package, date=self.travel_date, capacity=4)
+
+    def assertSeatsBooked(self, seats):
+        self.departure.refresh_from_db()
+        self.assertEqual(self.departure.seats_booked, seats)
+
+    def expire(self, *holds):
+        SeatHold.objects.filter(pk__in=[hold.pk for hold in holds]).update(
+            expires_at=timezone.now() - datetime.timedelta(seconds=1)
+        )
+
+    def test_hold_takes_seats(self):
+        hold_seats(self.departure, 3)
+        self.assertSeatsBooked(3)
+        with self.assertRaises(SoldOut):
+            hold_seats(self.departure, 2)
+        self.assertEqual(SeatHold.objects.count(), 1)
+
+    def test_replace_hold(self):
+        hold = hold_seats(self.departure, 3)
+        hold_seats(self.departure, 4, replace=hold.token)
+        self.assertSeatsBooked(4)
+        self.assertEqual(SeatHold.objects.get().seats, 4)
+
+    def test_claim_hold(self):
+        hold = hold_seats(self.departure, 2)
+        self.assertTrue(claim_hold(hold.token, self.departure, 2))
+        self.assertSeatsBooked(2)
+        self.assertFalse(SeatHold.objects.exists())
+        self.assertFalse(claim_hold(hold.token, self.departure, 2))
+
+    def test_claim_mismatched_hold_releases_it(self):
+        hold = hold_seats(self.departure, 2)
+        self.assertFalse(claim_hold(hold.token, self.departure, 3))
+        self.assertSeatsBooked(0)
+
+    def test_release_expired_holds(self):
+        holds = [hold_seats(self.departure, 1) for _ in range(4)]
+        self.expire(*holds[:3])
+        self.assertEqual(release_expired_holds(batch_size=2), 3)
+        self.assertSeatsBooked(1)
+        self.assertEqual(list(SeatHold.objects.all()), holds[3:])
+
+        out = StringIO()
+        call_command('release_expired_holds', stdout=out)
+        self.assertIn('Released 0 expired holds', out.getvalue())
+
+    def test_full_departure_releases_expired_holds(self):
+        other = Departure.objects.create(package=self.package, date=self.travel_date + datetime.timedelta(days=1),
+                                         capacity=4)
+        expired = [hold_seats(self.departure, 3), hold_seats(other, 1)]
+        self.expire(*expired)
+        # Without waiting for release_expired_holds
+        hold_seats(self.departure, 2)
+        self.assertSeatsBooked(2)
+        self.assertEqual(SeatHold.objects.filter(departure=other).count(), 1)
+
+    def open_form(self, client=None):
+        (client or self.client).get(reverse('booking_create', args=[self.package.slug]))
+        return reverse('booking_hold', args=[self.package.slug])
+
+    def test_hold_needs_booking_form_session(self):
+        url = reverse('booking_hold', args=[self.package.slug])
+        party = {'number_of_adults': 2, 'travel_date': self.travel_date.isoformat()}
+        self.assertEqual(self.client.post(url, party).status_code, 403)
+        self.assertFalse(SeatHold.objects.exists())
+
+    def test_hold_date_window(self):
+        url = self.open_form()
+        today = timezone.localdate()
+        for date in (today - datetime.timedelta(days=1), today + datetime.timedelta(days=366)):
+            response = self.client.post(url, {'number_of_adults': 2, 'travel_date': date.isoformat()})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(Departure.objects.all()), [self.departure])
+
+    def test_session_hold_reused_or_replaced(self):
+        url = self.open_form()
+        party = {'number_of_adults': 2, 'travel_date': self.travel_date.isoformat()}
+        token = self.client.post(url, party).json()['token']
+        with self.assertNumQueries(3):
+            # The session, the package and the active holds, no write
+            self.assertEqual(self.client.post(url, party).json()['token'], token)
+        self.assertNotEqual(self.client.post(url, {**party, 'number_of_adults': 3}).json()['token'], token)
+        self.assertSeatsBooked(3)
+        self.assertEqual(SeatHold.objects.count(), 1)
+
+    @override_settings(SEAT_HOLDS_PER_SESSION=1)
+    def test_holds_per_session(self):
+        other = create_package(self.package.category, 'Kerala Package')
+        party = {'number_of_adults': 2, 'travel_date': self.travel_date.isoformat()}
+        self.client.post(self.open_form(), party)
+        self.client.get(reverse('booking_create', args=[other.slug]))
+        response = self.client.post(reverse('booking_hold', args=[other.slug]), party)
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(Departure.objects.filter(package=other).exists())
+        # Once the first hold expires, the session may hold seats again
+        self.expire(*SeatHold.objects.all())
+        self.assertEqual(self.client.post(reverse('booking_hold', args=[other.slug]), party).status_code, 200)
+
+    def test_booking_claims_hold(self):
+        url = self.open_form()
+        party = {'number_of_adults': 2, 'travel_date': self.travel_date.isoformat()}
+        self.assertEqual(self.client.get(url, party).status_code, 405)
+        token = self.client.post(url, party).json()['token']
+        other_visitor = Client()
+        self.open_form(other_visitor)
+        self.assertEqual(other_visitor.post(url, {**party, 'number_of_adults': 3}).status_code, 409)
+        self.assertSeatsBooked(2)
+
+        data = booking_fields(self.package, hold_token=token, **party)
+        del data['package']
+        self.client.post(reverse('booking_create', args=[self.package.slug]), data)
+        self.assertEqual(Booking.objects.get().departure, self.departure)
+        self.assertSeatsBooked(2)
+        self.assertFalse(SeatHold.objects.exists())
+
+
+class InventoryConcurrencyTests(TransactionTestCase):
+    """Parallel reservations fill a departure exactly, without overselling or lost updates"""
+
+    THREADS = 8
+    ATTEMPTS = 40
+    CAPACITY = 50
+
+    def setUp(self):
+        package = create_package(PackageCategory.objects.create(name='Beach'), 'Goa Package')
+        self.departure = Departure.objects.create(package=package, date=datetime.date(2030, 12, 24),
+                                                  capacity=self.CAPACITY)
+
+    def reserve(self, count):
+        reserved = 0
+        try:
+            for _ in range(count):
+                while True:
+                    try:
+                        reserve_seats(self.departure, 1)
+                        reserved += 1
+                        break
+                    except SoldOut:
+                        break
+                    except OperationalError as e:
+                        # SQLite serializes writers ("database is locked"); only retry that
+                        if 'locked' not in str(e):
+                            raise
+        finally:
+            connection.close()
+        return reserved
+
+    def test_parallel_reservations(self):
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            reserved = sum(executor.map(self.reserve, [self.ATTEMPTS] * self.THREADS))
+
+        self.departure.refresh_from_db()
+        self.assertEqual(reserved, self.CAPACITY)
+        self.assertEqual(self.departure.seats_booked, self.CAPACITY)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class IdempotencyTests(TestCase):
+    """Replayed booking submissions return the original booking"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.package = create_package(PackageCategory.objects.create(name='Beach'), 'Goa Package')
+
+    def setUp(self):
+        cache.clear()
+
+    def submit(self, key):
+        data = booking_fields(self.package, number_of_adults=2, idempotency_key=key)
+        del data['package']
+        data['travel_date'] = data['travel_date'].isoformat()
+        return self.client.post(reverse('booking_create', args=[self.package.slug]), data)
+
+    def test_form_has_key(self):
+        response = self.client.get(reverse('booking_create', args=[self.package.slug]))
+        self.assertContains(response, 'name="idempotency_key"')
+
+    def test_replay_returns_original_booking(self):
+        key = str(uuid.uuid4())
+        first = self.submit(key)
+        # Session, package and key lookups only: no insert, no email
+        with self.assertNumQueries(3):
+            replay = self.submit(key)
+        self.assertEqual(replay.url, first.url)
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+        self.assertEqual(Departure.objects.get().seats_booked, 2)
+
+    def test_distinct_keys(self):
+        self.submit(str(uuid.uuid4()))
+        self.submit(str(uuid.uuid4()))
+        self.submit('')
+        self.assertEqual(Booking.objects.count(), 3)
+
+    def test_purge_expired_keys(self):
+        for _ in range(3):
+            self.submit(str(uuid.uuid4()))
+        IdempotencyKey.objects.filter(pk__in=IdempotencyKey.objects.values_list('pk', flat=True)[:2]).update(
+            created_at=timezone.now() - datetime.timedelta(days=2)
+        )
+        self.assertEqual(purge_expired_keys(batch_size=1), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+        self.assertEqual(Booking.objects.count(), 3)
+
+        out = StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+        self.assertIn('Deleted 0 expired idempotency keys', out.getvalue())
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class IdempotencyConcurrencyTests(TransactionTestCase):
+    """Simultaneous replays of one submission create a single booking"""
+
+    THREADS = 6
+
+    def setUp(self):
+        self.package = create_package(PackageCategory.objects.create(name='Beach'), 'Goa Package')
+        self.data = booking_fields(self.package, number_of_adults=2, idempotency_key=str(uuid.uuid4()))
+        del self.data['package']
+        self.data['travel_date'] = self.data['travel_date'].isoformat()
+
+    def submit(self, _):
+        try:
+            while True:
+                try:
+                    return Client().post(reverse('booking_create', args=[self.package.slug]), self.data).url
+                except OperationalError as e:
+                    # SQLite serializes writers ("database is locked"); only retry that
+                    if 'locked' not in str(e):
+                        raise
+        finally:
+            connection.close()
+
+    def test_parallel_replays(self):
+        with ThreadPoolExecutor(max_workers=self.THREADS) as executor:
+            urls = set(executor.map(self.submit, range(self.THREADS)))
+
+        booking = Booking.objects.get()
+        self.assertEqual(urls, {reverse('booking_success', args=[booking.booking_id])})
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    """Email backend whose server rejects every message"""
+
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError('SMTP server unavailable')
+
+
+class OpenCountingEmailBackend(BaseEmailBackend):
+    """locmem-like backend that counts opened connections"""
+
+    opened = 0
+
+    def open(self):
+        OpenCountingEmailBackend.opened += 1
+        return True
+
+    def send_messages(self, email_messages):
+        mail.outbox.extend(email_messages)
+        return len(email_messages)
+
+
+@override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=3, EMAIL_OUTBOX_RETRY_DELAY=60)
+class OutboxTests(TestCase):
+    """Booking emails are queued by the request and sent by the worker"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.package = create_package(PackageCategory.objects.create(name='Beach'), 'Goa Package')
+
+    def test_booking_queues_confirmation(self):
+        data = booking_fields(self.package, number_of_adults=2, total_price='20000')
+        del data['package']
+        response = self.client.post(reverse('booking_create', args=[self.package.slug]), data)
+
+        booking = Booking.objects.get()
+        self.assertRedirects(response, reverse('booking_success', args=[booking.booking_id]),
+                             fetch_redirect_response=False)
+        self.assertEqual(mail.outbox, [])
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.subject, f'Booking Confirmation - {booking.booking_id}')
+        self.assertEqual(email.get_recipients(), ['guest@example.com'])
+
+        call_command('send_queued_emails', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['guest@example.com'])
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'sent')
+        self.assertIsNotNone(email.sent_at)
+
+    @override_settings(EMAIL_BACKEND='bookings.tests.OpenCountingEmailBackend')
+    def test_batches_reuse_connection(self):
+        OpenCountingEmailBackend.opened = 0
+        for i in range(25):
+            enqueue_email('Hello', 'Body', f'guest{i}@example.com')
+
+        self.assertEqual(send_queued_emails(batch_size=10), (25, 0))
+        self.assertEqual(len(mail.outbox), 25)
+        self.assertEqual(OpenCountingEmailBackend.opened, 3)
+
+    @override_settings(EMAIL_BACKEND='bookings.tests.FailingEmailBackend')
+    def test_retry_with_backoff(self):
+        email = enqueue_email('Hello', 'Body', 'guest@example.com')
+
+        with self.assertLogs('bookings.outbox', 'WARNING'):
+            self.assertEqual(send_queued_emails(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('pending', 1))
+        self.assertIn('SMTP server unavailable', email.last_error)
+        delay = email.next_attempt_at - timezone.now()
+        self.assertGreater(delay.total_seconds(), 50)
+
+        # Not due yet: nothing is sent or retried
+        self.assertEqual(send_queued_emails(), (0, 0))
+
+        OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        with self.assertLogs('bookings.outbox', 'WARNING'):
+            send_queued_emails()
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 2)
+        self.assertGreater((email.next_attempt_at - timezone.now()).total_seconds(), 110)
+
+        OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        with self.assertLogs('bookings.outbox', 'WARNING'):
+            send_queued_emails()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', 3))
+
+
+class BookingQueryBudgetTests(QueryBudgetTestCase):
+    """Query budgets of the booking pages"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.package = create_package(PackageCategory.objects.create(name='Beach'), 'Goa Package')
+        cls.booking = Booking.objects.create(
+            package=cls.package,
+            full_name='Guest',
+            email='guest@example.com',
+            phone='9999999999',
+            address='1 Beach Road',
+            city='Panaji',
+            state='Goa',
+            pincode='403001',
+            number_of_people=2,
+            travel_date=datetime.date.today() + datetime.timedelta(days=30),
+            total_price=Decimal('20000'),
+        )
+
+    def test_booking_create_form(self):
+        # Four of them start the session that seat holds are recorded in
+        self.assertMaxQueries(7, reverse('booking_create', args=[self.package.slug]))
+
+    def test_booking_success(self):
+        session = self.client.session
+        session[BOOKINGS_SESSION_KEY] = [self.booking.booking_id]
+        session.save()
+        self.assertMaxQueries(4, reverse('booking_success', args=[self.booking.booking_id]))
+
+
+class BookingAdminQueryBudgetTests(AdminQueryBudgetTestCase):
+    """Booking admin changelists must not run a query per row"""
+
+    @classmethod
+    def setUpTestData(cls):
+        packages = bulk_create_packages(PackageCategory.objects.create(name='Beach', slug='beach'), 200)
+        travel_date = datetime.date.today() + datetime.timedelta(days=30)
+        Booking.objects.bulk_create([
+            Booking(
+                package=packages[i % len(packages)],
+                booking_id=f'BKGTEST{i:06d}',
+                full_name=f'Guest {i}',
+                email=f'guest{i}@example.com',
+                phone='9999999999',
+                address='1 Beach Road',
+                city='Panaji',
+                state='Goa',
+                pincode='403001',
+                number_of_people=2,
+                travel_date=travel_date,
+                total_price=Decimal('20000'),
+                balance_amount=Decimal('20000'),
+            )
+            for i in range(2000)
+        ], batch_size=500)
+        ContactInquiry.objects.bulk_create([
+            ContactInquiry(name=f'Guest {i}', email=f'guest{i}@example.com', phone='9999999999',
+                           subject='Question', message='Hello', package=packages[i % len(packages)])
+            for i in range(2000)
+        ], batch_size=500)
+
+    def test_booking_changelist(self):
+        self.assertChangelistQueries(10, Booking)
+
+    def test_contact_inquiry_changelist(self):
+        self.assertChangelistQueries(8, ContactInquiry)
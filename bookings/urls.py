@@ -3,6 +3,9 @@ from . import views
 
 urlpatterns = [
     path('book/<slug:package_slug>/', views.booking_create, name='booking_create'),
+    path('quote/<slug:package_slug>/', views.booking_quote, name='booking_quote'),
+    path('hold/<slug:package_slug>/', views.booking_hold, name='booking_hold'),
+    path('availability/<slug:package_slug>/', views.booking_availability, name='booking_availability'),
     path('success/<str:booking_id>/', views.booking_success, name='booking_success'),
     path('contact/', views.contact_create, name='contact_submit'),
 ]
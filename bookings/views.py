@@ -1,9 +1,86 @@
+import datetime
+import uuid
+from decimal import Decimal, InvalidOperation
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.core.mail import send_mail
+from django.db import transaction
 from django.conf import settings
+from django.db import IntegrityError
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_POST
+from django.utils import timezone
 from packages.models import Package
-from .models import Booking, ContactInquiry
+from .idempotency import booking_id_for_key, remember_key
+from .inventory import SoldOut, availability_calendar, claim_hold, hold_seats, reserve_seats
+from .models import Booking, ContactInquiry, Departure, SeatHold
+from .outbox import enqueue_email
+from .pricing import compute_price
+
+# Session key of {package id: token of the seat hold} for the visitor's booking forms
+HOLDS_SESSION_KEY = 'seat_holds'
+# Session key of the IDs of the visitor's latest bookings, whose confirmation pages they may see
+BOOKINGS_SESSION_KEY = 'booking_ids'
+BOOKINGS_REMEMBERED = 10
+
+
+def parse_party(data, package, date_required=True):
+    """Read adults, children and travel date from form data; raise ValueError with a message"""
+    try:
+        adults = int(data.get('number_of_adults') or 1)
+        children = int(data.get('number_of_children') or 0)
+    except ValueError:
+        raise ValueError('Please enter valid numbers of adults and children.')
+    if adults < 1 or children < 0:
+        raise ValueError('A booking needs at least one adult.')
+    if not package.min_people <= adults + children <= package.max_people:
+        raise ValueError(f'This package takes {package.min_people} to {package.max_people} people.')
+
+    travel_date = data.get('travel_date')
+    if not travel_date:
+        if date_required:
+            raise ValueError('Please choose a travel date.')
+        return adults, children, None
+    try:
+        return adults, children, datetime.date.fromisoformat(travel_date)
+    except ValueError:
+        raise ValueError('Please enter a valid travel date.')
+
+
+def check_hold_date(travel_date):
+    """Raise ValueError with a message unless seats can be held for `travel_date`"""
+    today = timezone.localdate()
+    if travel_date < today:
+        raise ValueError('Please choose a travel date in the future.')
+    if travel_date > today + datetime.timedelta(days=settings.BOOKING_WINDOW_DAYS):
+        raise ValueError(f'Bookings open {settings.BOOKING_WINDOW_DAYS} days before travel.')
+
+
+def parse_amount(value):
+    """Read a non-negative money amount from form data; raise ValueError with a message"""
+    try:
+        amount = Decimal(value or 0)
+    except InvalidOperation:
+        raise ValueError('Please enter a valid advance amount.')
+    if not amount.is_finite() or amount < 0:
+        raise ValueError('Please enter a valid advance amount.')
+    return amount
+
+
+def parse_token(value):
+    """A hold token or idempotency key from form data, or None"""
+    try:
+        return uuid.UUID(value) if value else None
+    except ValueError:
+        return None
+
+
+def show_booking(request, booking_id):
+    """Redirect to the confirmation page of a booking, letting this session see it"""
+    booking_ids = request.session.get(BOOKINGS_SESSION_KEY, [])
+    if booking_id not in booking_ids:
+        request.session[BOOKINGS_SESSION_KEY] = booking_ids[1 - BOOKINGS_REMEMBERED:] + [booking_id]
+    return redirect('booking_success', booking_id=booking_id)
 
 
 def booking_create(request, package_slug):
@@ -11,6 +88,22 @@ def booking_create(request, package_slug):
     package = get_object_or_404(Package, slug=package_slug, available=True)
 
     if request.method == 'POST':
+        # A replayed submission goes to the booking it already created
+        idempotency_key = parse_token(request.POST.get('idempotency_key'))
+        booking_id = booking_id_for_key(idempotency_key)
+        if booking_id:
+            return show_booking(request, booking_id)
+
+        # Price the booking on the server; the posted total is only a preview
+        try:
+            adults, children, travel_date = parse_party(request.POST, package)
+            advance_paid = parse_amount(request.POST.get('advance_paid'))
+        except ValueError as e:
+            messages.error(request, str(e))
+            return render_booking_form(request, package, idempotency_key)
+        quote = compute_price(package, adults, children, travel_date)
+        advance_paid = min(advance_paid, quote.total)
+
         # Get form data
         booking = Booking(
             package=package,
@@ -22,40 +115,153 @@ def booking_create(request, package_slug):
             city=request.POST.get('city'),
             state=request.POST.get('state'),
             pincode=request.POST.get('pincode'),
-            number_of_people=request.POST.get('number_of_people'),
-            number_of_adults=request.POST.get('number_of_adults', 1),
-            number_of_children=request.POST.get('number_of_children', 0),
-            travel_date=request.POST.get('travel_date'),
+            number_of_people=quote.number_of_people,
+            number_of_adults=adults,
+            number_of_children=children,
+            travel_date=travel_date,
             special_requests=request.POST.get('special_requests', ''),
-            total_price=float(request.POST.get('total_price')),
-            advance_paid=float(request.POST.get('advance_paid', 0)),
+            total_price=quote.total,
+            advance_paid=advance_paid,
+            departure=Departure.objects.for_date(package, travel_date),
         )
-        booking.save()
-
-        # Send confirmation email (optional)
         try:
-            send_mail(
-                f'Booking Confirmation - {booking.booking_id}',
-                f'Dear {booking.full_name},\n\nYour booking for {package.name} has been received.\n\nBooking ID: {booking.booking_id}\n\nWe will contact you shortly.\n\nThank you!',
-                settings.DEFAULT_FROM_EMAIL,
-                [booking.email],
-                fail_silently=True,
-            )
-        except:
-            pass
+            with transaction.atomic():
+                booking.save()
+                remember_key(idempotency_key, booking)
+
+                # Queue the confirmation email (sent by the send_queued_emails worker)
+                enqueue_email(
+                    f'Booking Confirmation - {booking.booking_id}',
+                    f'Dear {booking.full_name},\n\nYour booking for {package.name} has been received.\n\nBooking ID: {booking.booking_id}\n\nWe will contact you shortly.\n\nThank you!',
+                    [booking.email],
+                )
+
+                # Seats held while the form was filled in become the booking's;
+                # otherwise reserve them as the last write (short departure row lock)
+                hold_token = parse_token(request.POST.get('hold_token'))
+                if not claim_hold(hold_token, booking.departure, booking.number_of_people):
+                    reserve_seats(booking.departure, booking.number_of_people)
+        except SoldOut as e:
+            # Rolled back with the booking: the key (and the hold) can be submitted again
+            messages.error(request, str(e))
+            return render_booking_form(request, package, idempotency_key)
+        except IntegrityError:
+            # The same submission was being processed concurrently and won
+            booking_id = booking_id_for_key(idempotency_key)
+            if booking_id is None:
+                raise
+            return show_booking(request, booking_id)
 
         messages.success(request, f'Booking created successfully! Your booking ID is {booking.booking_id}')
-        return redirect('booking_success', booking_id=booking.booking_id)
+        return show_booking(request, booking.booking_id)
+
+    return render_booking_form(request, package)
 
+
+def render_booking_form(request, package, idempotency_key=None):
+    """The booking form, filled in with the submitted values when it is shown again after an error"""
+    # Starts the session that seat holds are recorded in (see booking_hold)
+    request.session.setdefault(HOLDS_SESSION_KEY, {})
     context = {
         'package': package,
+        'idempotency_key': idempotency_key or uuid.uuid4(),
+        'form_data': request.POST,
     }
     return render(request, 'bookings/booking_form.html', context)
 
 
+def booking_quote(request, package_slug):
+    """Price preview for the booking form (JSON)"""
+    package = get_object_or_404(
+        Package.objects.only('id', 'price', 'min_people', 'max_people'),
+        slug=package_slug,
+        available=True
+    )
+    try:
+        adults, children, travel_date = parse_party(request.GET, package, date_required=False)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(compute_price(package, adults, children, travel_date).as_dict())
+
+
+@require_POST
+def booking_hold(request, package_slug):
+    """
+    Hold seats for the date and party chosen on the booking form (JSON).
+
+    Holds are recorded in the session started by the booking form: one per
+    package, replaced when the party or date changes and returned as is when
+    they don't, and at most SEAT_HOLDS_PER_SESSION at a time.
+    """
+    holds = request.session.get(HOLDS_SESSION_KEY)
+    if holds is None:
+        return JsonResponse({'error': 'Please reload the booking form.'}, status=403)
+    package = get_object_or_404(
+        Package.objects.only('id', 'min_people', 'max_people'),
+        slug=package_slug,
+        available=True
+    )
+    try:
+        adults, children, travel_date = parse_party(request.POST, package)
+        check_hold_date(travel_date)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    active = {
+        str(hold.token): hold
+        for hold in SeatHold.objects.select_related('departure').filter(
+            token__in=holds.values(), expires_at__gt=timezone.now()
+        )
+    }
+    hold = active.get(holds.get(str(package.id)))
+    if hold is not None:
+        if (hold.departure.date, hold.seats) == (travel_date, adults + children):
+            return hold_response(hold)
+    elif len(active) >= settings.SEAT_HOLDS_PER_SESSION:
+        return JsonResponse({'error': 'Please finish or leave one of your other bookings first.'}, status=429)
+
+    departure = Departure.objects.for_date(package, travel_date)
+    try:
+        hold = hold_seats(departure, adults + children, replace=holds.get(str(package.id)))
+    except SoldOut as e:
+        return JsonResponse({'error': str(e)}, status=409)
+    holds[str(package.id)] = str(hold.token)
+    request.session.modified = True
+    return hold_response(hold)
+
+
+def hold_response(hold):
+    return JsonResponse({
+        'token': str(hold.token),
+        'seats': hold.seats,
+        'expires_at': hold.expires_at.isoformat(),
+    })
+
+
+def booking_availability(request, package_slug):
+    """Seats left per travel date of a month (JSON), ?month=YYYY-MM"""
+    package = get_object_or_404(Package.objects.only('id'), slug=package_slug, available=True)
+    month = request.GET.get('month')
+    try:
+        if month:
+            first = datetime.datetime.strptime(month, '%Y-%m').date()
+        else:
+            first = timezone.localdate().replace(day=1)
+    except ValueError:
+        return JsonResponse({'error': 'Use month=YYYY-MM.'}, status=400)
+    return JsonResponse({
+        'month': f'{first:%Y-%m}',
+        'default_capacity': settings.DEPARTURE_DEFAULT_CAPACITY,
+        'days': availability_calendar(package.id, first.year, first.month),
+    })
+
+
 def booking_success(request, booking_id):
-    """Display booking confirmation"""
-    booking = get_object_or_404(Booking, booking_id=booking_id)
+    """Display booking confirmation to the session that made the booking (and to staff)"""
+    # Booking IDs are sequential, and the page shows the customer's details
+    if booking_id not in request.session.get(BOOKINGS_SESSION_KEY, []) and not request.user.is_staff:
+        raise Http404('No booking matches the given query.')
+    booking = get_object_or_404(Booking.objects.select_related('package'), booking_id=booking_id)
     context = {
         'booking': booking,
     }
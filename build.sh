@@ -6,6 +6,7 @@ pip install -r requirements.txt
 
 python manage.py collectstatic --no-input
 python manage.py migrate
+python manage.py createcachetable
 
 # Create superuser if none exists
 python manage.py create_superuser_if_none
@@ -15,3 +16,9 @@ python manage.py import_packages
 
 # Fetch images for packages (force re-download to ensure files exist)
 python manage.py fetch_package_images --images-per-package=5 --force
+
+# Generate responsive image derivatives for any images that lack them
+python manage.py generate_image_derivatives
+
+# Precompute related-package recommendations (also run periodically)
+python manage.py compute_recommendations
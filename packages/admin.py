@@ -1,8 +1,17 @@
 from django.contrib import admin
+from django.db.models import Count
 from django.utils.html import format_html
+from pages.cache import update_and_invalidate
 from .models import PackageCategory, Package, PackageImage, PackageReview
 
 
+class PackageRelatedAdmin(admin.ModelAdmin):
+    """Admin of a model whose __str__ shows the package name (changelist, delete confirmation)"""
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('package')
+
+
 class PackageImageInline(admin.TabularInline):
     """Inline admin for package gallery images"""
     model = PackageImage
@@ -26,9 +35,13 @@ class PackageCategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     readonly_fields = ['created_at']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(num_packages=Count('packages'))
+
     def package_count(self, obj):
-        return obj.packages.count()
+        return obj.num_packages
     package_count.short_description = 'Number of Packages'
+    package_count.admin_order_field = 'num_packages'
 
 
 @admin.register(Package)
@@ -45,6 +58,7 @@ class PackageAdmin(admin.ModelAdmin):
         'created_at'
     ]
     list_filter = ['category', 'available', 'featured', 'popular', 'destination_country', 'created_at']
+    list_select_related = ['category']
     search_fields = ['name', 'destination_city', 'location', 'description']
     prepopulated_fields = {'slug': ('name',)}
     readonly_fields = ['views', 'created_at', 'updated_at', 'discount_display', 'price_per_day_display']
@@ -131,7 +145,7 @@ class PackageAdmin(admin.ModelAdmin):
     inlines = [PackageImageInline, PackageReviewInline]
 
     def price_display(self, obj):
-        discount = obj.get_discount_percentage()
+        discount = obj.discount_percentage
         if discount > 0:
             return format_html(
                 '<strong style="color: green;">₹{}</strong> <del style="color: red;">₹{}</del> <span style="color: orange;">({}% off)</span>',
@@ -147,7 +161,7 @@ class PackageAdmin(admin.ModelAdmin):
     duration_display.short_description = 'Duration'
 
     def discount_display(self, obj):
-        discount = obj.get_discount_percentage()
+        discount = obj.discount_percentage
         if discount > 0:
             return format_html(
                 '<strong style="color: green; font-size: 16px;">{}% OFF</strong>',
@@ -157,34 +171,34 @@ class PackageAdmin(admin.ModelAdmin):
     discount_display.short_description = 'Current Discount'
 
     def price_per_day_display(self, obj):
-        return f'₹{obj.get_price_per_day()} per day'
+        return f'₹{obj.price_per_day} per day'
     price_per_day_display.short_description = 'Price Per Day'
 
     actions = ['make_featured', 'remove_featured', 'make_available', 'make_unavailable']
 
     def make_featured(self, request, queryset):
-        updated = queryset.update(featured=True)
+        updated = update_and_invalidate(queryset, featured=True)
         self.message_user(request, f'{updated} package(s) marked as featured.')
     make_featured.short_description = 'Mark selected packages as featured'
 
     def remove_featured(self, request, queryset):
-        updated = queryset.update(featured=False)
+        updated = update_and_invalidate(queryset, featured=False)
         self.message_user(request, f'{updated} package(s) removed from featured.')
     remove_featured.short_description = 'Remove from featured'
 
     def make_available(self, request, queryset):
-        updated = queryset.update(available=True)
+        updated = update_and_invalidate(queryset, available=True)
         self.message_user(request, f'{updated} package(s) marked as available.')
     make_available.short_description = 'Mark as available'
 
     def make_unavailable(self, request, queryset):
-        updated = queryset.update(available=False)
+        updated = update_and_invalidate(queryset, available=False)
         self.message_user(request, f'{updated} package(s) marked as unavailable.')
     make_unavailable.short_description = 'Mark as unavailable'
 
 
 @admin.register(PackageImage)
-class PackageImageAdmin(admin.ModelAdmin):
+class PackageImageAdmin(PackageRelatedAdmin):
     list_display = ['package', 'caption', 'order', 'image_preview']
     list_filter = ['package']
     search_fields = ['package__name', 'caption']
@@ -197,7 +211,7 @@ class PackageImageAdmin(admin.ModelAdmin):
 
 
 @admin.register(PackageReview)
-class PackageReviewAdmin(admin.ModelAdmin):
+class PackageReviewAdmin(PackageRelatedAdmin):
     list_display = ['name', 'package', 'rating_display', 'approved', 'created_at']
     list_filter = ['approved', 'rating', 'created_at']
     search_fields = ['name', 'email', 'package__name', 'review']
@@ -211,11 +225,11 @@ class PackageReviewAdmin(admin.ModelAdmin):
     rating_display.short_description = 'Rating'
 
     def approve_reviews(self, request, queryset):
-        updated = queryset.update(approved=True)
+        updated = update_and_invalidate(queryset, approved=True)
         self.message_user(request, f'{updated} review(s) approved.')
     approve_reviews.short_description = 'Approve selected reviews'
 
     def unapprove_reviews(self, request, queryset):
-        updated = queryset.update(approved=False)
+        updated = update_and_invalidate(queryset, approved=False)
         self.message_user(request, f'{updated} review(s) unapproved.')
     unapprove_reviews.short_description = 'Unapprove selected reviews'
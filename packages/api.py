@@ -0,0 +1,192 @@
+"""
+Read-only JSON API for the catalogue.
+
+    /api/categories/                categories with their number of available packages
+    /api/packages/                  package cards, same filters and sorts as package_list
+    /api/packages/<slug>/           one package
+
+Rows are read with values() and serialized as plain dicts, so no model
+instances are built. Package responses carry a strong ETag and a
+Last-Modified header derived from Package.updated_at and the updated_at of
+the packages' categories (a renamed slug changes what ?category= matches);
+clients and caches revalidate with If-None-Match / If-Modified-Since and get
+a 304 after one small query. The package list is paginated by cursor
+(?cursor=, see packages.pagination), following the `next` URL of each page;
+a cursor that was not issued by the API, a price bound that is not a number
+and an unknown sort get a 400.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Count, Max, Q
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
+
+from .models import ItineraryDay, Package, PackageCategory, PackageQuerySet
+from .pagination import InvalidCursor, paginate_by_keyset
+from .views import SORT_OPTIONS, filter_packages, parse_price
+
+# Part of every ETag: bump when a payload changes shape so clients refetch
+API_VERSION = 1
+
+PAGE_SIZE = 12
+
+# The sorts of package_list, including its default
+API_SORTS = ['-featured'] + SORT_OPTIONS
+
+CARD_VALUES = PackageQuerySet.CARD_FIELDS
+
+DETAIL_VALUES = CARD_VALUES + [
+    'description', 'location', 'destination_state', 'category__slug',
+    'inclusions_list', 'exclusions_list', 'highlights_list', 'activities',
+    'transport_mode', 'min_people', 'max_people', 'updated_at',
+]
+
+COMPACT_JSON = {'separators': (',', ':')}
+
+api_cache_control = cache_control(public=True, max_age=settings.API_CACHE_MAX_AGE)
+
+
+def _etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def _media_url(name):
+    return default_storage.url(name) if name else None
+
+
+def _card(row):
+    """JSON-ready card from a values() row"""
+    row['featured_image'] = _media_url(row['featured_image'])
+    return row
+
+
+def _latest(*timestamps):
+    return max((timestamp for timestamp in timestamps if timestamp), default=None)
+
+
+def _catalogue_version(request):
+    """Latest change to a package or its category and the package count, read once per request"""
+    if not hasattr(request, '_catalogue_version'):
+        version = Package.objects.aggregate(
+            latest=Max('updated_at'), category_latest=Max('category__updated_at'), count=Count('id')
+        )
+        request._catalogue_version = (_latest(version['latest'], version['category_latest']), version['count'])
+    return request._catalogue_version
+
+
+def _package_version(request, slug):
+    """(id, latest change to the package or its category) of an available package, or None; read once per request"""
+    if not hasattr(request, '_package_version'):
+        version = (
+            Package.objects.filter(slug=slug, available=True)
+            .values_list('id', 'updated_at', 'category__updated_at')
+            .first()
+        )
+        request._package_version = (version[0], _latest(*version[1:])) if version else None
+    return request._package_version
+
+
+def _invalid_filter(params):
+    """Error message for an invalid price bound or sort of the package list, or None"""
+    for param in ('min_price', 'max_price'):
+        if params.get(param):
+            try:
+                parse_price(params[param])
+            except ValueError:
+                return f'Invalid {param}: use a number.'
+    if params.get('sort', '-featured') not in API_SORTS:
+        return f'Invalid sort: use one of {", ".join(API_SORTS)}.'
+    return None
+
+
+def package_list_etag(request):
+    # No validators for a 400, so it is never revalidated into a 304
+    if _invalid_filter(request.GET):
+        return None
+    latest, count = _catalogue_version(request)
+    # Same filters in any order share an ETag
+    query = sorted((key, sorted(values)) for key, values in request.GET.lists())
+    return _etag(API_VERSION, latest, count, query)
+
+
+def package_list_last_modified(request):
+    if _invalid_filter(request.GET):
+        return None
+    return _catalogue_version(request)[0]
+
+
+def package_detail_etag(request, slug):
+    version = _package_version(request, slug)
+    return _etag(API_VERSION, *version) if version else None
+
+
+def package_detail_last_modified(request, slug):
+    version = _package_version(request, slug)
+    return version[1] if version else None
+
+
+@require_GET
+@api_cache_control
+def category_list(request):
+    """Categories with their number of available packages"""
+    categories = [
+        {**category, 'icon': _media_url(category['icon'])}
+        for category in PackageCategory.objects.annotate(
+            num_packages=Count('packages', filter=Q(packages__available=True))
+        ).values('id', 'name', 'slug', 'description', 'icon', 'num_packages')
+    ]
+    # No timestamp to derive it from: the ETag is a hash of the payload
+    etag = f'"{_etag(API_VERSION, categories)}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse({'results': categories}, json_dumps_params=COMPACT_JSON)
+    response.headers['ETag'] = etag
+    return response
+
+
+@require_GET
+@api_cache_control
+@condition(etag_func=package_list_etag, last_modified_func=package_list_last_modified)
+def package_list(request):
+    """Package cards, filtered and sorted like the package list page"""
+    error = _invalid_filter(request.GET)
+    if error:
+        return JsonResponse({'error': error}, status=400)
+    packages, sort_by = filter_packages(Package.objects.filter(available=True), request.GET)
+    try:
+        page = paginate_by_keyset(packages.values(*CARD_VALUES), sort_by, request.GET.get('cursor'),
+                                  per_page=PAGE_SIZE)
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor: follow the `next` URL of a previous page.'}, status=400)
+
+    next_url = None
+    if page.has_next:
+        query = request.GET.copy()
+        query['cursor'] = page.next_cursor
+        next_url = f'{request.path}?{query.urlencode()}'
+
+    return JsonResponse(
+        {'results': [_card(row) for row in page], 'next': next_url},
+        json_dumps_params=COMPACT_JSON
+    )
+
+
+@require_GET
+@api_cache_control
+@condition(etag_func=package_detail_etag, last_modified_func=package_detail_last_modified)
+def package_detail(request, slug):
+    """One package with its itinerary"""
+    version = _package_version(request, slug)
+    if version is None:
+        raise Http404('No package matches the given query.')
+
+    package = _card(Package.objects.filter(pk=version[0]).values(*DETAIL_VALUES).get())
+    package['category'] = package.pop('category__slug')
+    package['itinerary'] = list(
+        ItineraryDay.objects.filter(package_id=version[0]).values('day_number', 'title', 'activities')
+    )
+    return JsonResponse(package, json_dumps_params=COMPACT_JSON)
@@ -0,0 +1,10 @@
+from django.urls import path
+from . import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('categories/', api.category_list, name='category_list'),
+    path('packages/', api.package_list, name='package_list'),
+    path('packages/<slug:slug>/', api.package_detail, name='package_detail'),
+]
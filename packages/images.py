@@ -0,0 +1,190 @@
+"""
+Responsive image derivatives.
+
+Every uploaded image is resized into a few fixed widths, each saved as WebP
+and JPEG next to the other media files (local storage or Cloudinary, through
+default_storage):
+
+    packages/featured/goa.jpg -> derivatives/packages/featured/goa_card.webp
+                                 derivatives/packages/featured/goa_card.jpg
+                                 ...
+
+Derivatives are generated when a model's image field changes (see
+register_image_fields) and by the generate_image_derivatives command for
+existing files. Both record the stored names of the set in the model's
+image_derivatives column, so the {% responsive_image %} template tag turns
+them into a <picture> element with srcset without any cache or storage
+lookup, falling back to the original file while no set is recorded.
+"""
+import logging
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models.signals import post_init, post_save
+from PIL import Image, ImageOps
+
+# Variant name -> target width in pixels (images are never upscaled)
+VARIANTS = {
+    'thumb': 320,
+    'card': 640,
+    'hero': 1280,
+}
+
+# Output format -> (file extension, Pillow save options)
+FORMATS = {
+    'webp': ('webp', {'format': 'WEBP', 'quality': 75, 'method': 4}),
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 80, 'optimize': True, 'progressive': True}),
+}
+
+DERIVATIVES_DIR = 'derivatives'
+
+# Model -> image field names, filled by register_image_fields()
+IMAGE_FIELD_REGISTRY = {}
+
+# JSONField of every registered model: {field: {'name': image name, 'variants': {variant: {format: name}}}}
+DERIVATIVES_FIELD = 'image_derivatives'
+
+logger = logging.getLogger(__name__)
+
+# Stored names of each derivative set, or {} while it is incomplete, are cached so that
+# generation checks don't hit storage for every image; generating a set replaces the entry
+CACHE_KEY_PREFIX = 'image_derivatives'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def derivative_name(name, variant, fmt):
+    """Storage name of one derivative of the image stored as `name`"""
+    path = PurePosixPath(name)
+    extension = FORMATS[fmt][0]
+    return str(PurePosixPath(DERIVATIVES_DIR) / path.parent / f'{path.stem}_{variant}.{extension}')
+
+
+def _cache_key(name):
+    return f'{CACHE_KEY_PREFIX}:{name}'
+
+
+def derivative_names(name):
+    """Storage names of an image's derivatives by (variant, format), or None if the set is incomplete"""
+    names = cache.get(_cache_key(name))
+    if names is None:
+        names = {
+            (variant, fmt): derivative_name(name, variant, fmt)
+            for variant in VARIANTS for fmt in FORMATS
+        }
+        if not all(default_storage.exists(derivative) for derivative in names.values()):
+            names = {}
+        cache.set(_cache_key(name), names, CACHE_TIMEOUT)
+    return names or None
+
+
+def has_derivatives(name):
+    """Whether the full derivative set of an image exists"""
+    return derivative_names(name) is not None
+
+
+def generate_derivatives(name, force=False):
+    """Create every variant of an image; return the number of files written"""
+    if not force and has_derivatives(name):
+        return 0
+
+    with default_storage.open(name, 'rb') as original:
+        image = Image.open(original)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    names = {}
+    for variant, width in VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((width, width * 4), Image.LANCZOS)
+        for fmt, (_, save_options) in FORMATS.items():
+            output = resized.convert('RGB') if fmt == 'jpeg' else resized
+            buffer = BytesIO()
+            output.save(buffer, **save_options)
+
+            target = derivative_name(name, variant, fmt)
+            if default_storage.exists(target):
+                default_storage.delete(target)
+            # The storage may pick another name (e.g. if the target could not be freed)
+            names[(variant, fmt)] = default_storage.save(target, ContentFile(buffer.getvalue()))
+
+    cache.set(_cache_key(name), names, CACHE_TIMEOUT)
+    return len(names)
+
+
+def stored_derivatives(file):
+    """Derivative names of an image field file by (variant, format), as recorded on its instance, or None"""
+    # Read __dict__ directly: a deferred column must not cost a query per rendered image
+    record = (file.instance.__dict__.get(DERIVATIVES_FIELD) or {}).get(file.field.name)
+    if not record or record['name'] != file.name:
+        return None
+    return {
+        (variant, fmt): name
+        for variant, formats in record['variants'].items()
+        for fmt, name in formats.items()
+    }
+
+
+def update_derivative_records(instance, field_names):
+    """Record the derivative names of some image fields on an instance; return whether they changed"""
+    records = dict(getattr(instance, DERIVATIVES_FIELD) or {})
+    for field in field_names:
+        file = getattr(instance, field)
+        names = derivative_names(file.name) if file else None
+        if names is None:
+            records.pop(field, None)
+            continue
+        variants = {}
+        for (variant, fmt), name in names.items():
+            variants.setdefault(variant, {})[fmt] = name
+        records[field] = {'name': file.name, 'variants': variants}
+    if records == getattr(instance, DERIVATIVES_FIELD):
+        return False
+    setattr(instance, DERIVATIVES_FIELD, records)
+    return True
+
+
+def register_image_fields(model, field_names):
+    """Generate derivatives whenever one of the model's image fields changes"""
+    IMAGE_FIELD_REGISTRY[model] = list(field_names)
+
+    def remember_names(sender, instance, **kwargs):
+        # Read __dict__ directly: deferred fields must not trigger a query.
+        # Store plain names, since FieldFile.save() renames the file object in place
+        instance._original_image_names = {
+            field: getattr(instance.__dict__.get(field), 'name', instance.__dict__.get(field))
+            for field in field_names
+        }
+
+    def build_changed(sender, instance, **kwargs):
+        original = getattr(instance, '_original_image_names', {})
+        changed = []
+        for field in field_names:
+            if field not in instance.__dict__:
+                continue
+            file = getattr(instance, field)
+            if (file.name or None) == (original.get(field) or None):
+                continue
+            changed.append(field)
+            if file:
+                try:
+                    generate_derivatives(file.name)
+                except (OSError, ValueError):
+                    # Templates fall back to the original file; never fail the save
+                    logger.exception('Could not generate derivatives for %s', file.name)
+        if changed and update_derivative_records(instance, changed):
+            # update() rather than save(), which would run this handler again
+            sender._default_manager.filter(pk=instance.pk).update(
+                **{DERIVATIVES_FIELD: getattr(instance, DERIVATIVES_FIELD)}
+            )
+        remember_names(sender, instance)
+
+    post_init.connect(remember_names, sender=model, weak=False,
+                      dispatch_uid=f'image_names_{model._meta.label}')
+    post_save.connect(build_changed, sender=model, weak=False,
+                      dispatch_uid=f'image_derivatives_{model._meta.label}')
@@ -0,0 +1,220 @@
+"""
+Parsing of package .docx documents for the import_packages command.
+
+Kept free of model imports so parse_document() can run in worker processes.
+"""
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+from docx import Document
+
+from .itinerary import DAY_HEADING, ITINERARY_HEADING
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_filename(filename):
+    """Extract package info from filename"""
+    # Clean filename
+    name = filename.replace('Tour Package', '').replace('tour package', '').strip()
+    name = ' '.join(name.split())
+
+    # Extract destination
+    parts = name.split('-')
+    if len(parts) > 1:
+        destination = parts[0].strip()
+        duration_part = parts[1].strip()
+    else:
+        # Try to parse without hyphen
+        words = name.split()
+        destination = words[0]
+        duration_part = ' '.join(words[1:])
+
+    # Extract duration
+    duration_days = 1
+    duration_nights = 0
+
+    days_match = re.search(r'(\d+)\s*[Dd]ay', duration_part)
+    nights_match = re.search(r'(\d+)\s*[Nn]ight', duration_part)
+
+    if days_match:
+        duration_days = int(days_match.group(1))
+    if nights_match:
+        duration_nights = int(nights_match.group(1))
+
+    # Construct package name
+    package_name = f"{duration_days}D/{duration_nights}N {destination} Tour Package"
+
+    return {
+        'name': package_name,
+        'destination': destination,
+        'duration_days': duration_days,
+        'duration_nights': duration_nights,
+    }
+
+
+# Bump when the parser output changes, so cached parses of old versions are ignored
+PARSER_VERSION = 2
+
+# Heading text (lowercased, without trailing punctuation) -> section it starts
+SECTION_HEADINGS = {
+    'about the tour': 'description',
+    'about': 'description',
+    'overview': 'description',
+    'highlights': 'highlights',
+    'inclusions': 'inclusions',
+    'inclusion': 'inclusions',
+    'includes': 'inclusions',
+    'exclusions': 'exclusions',
+    'exclusion': 'exclusions',
+    'excludes': 'exclusions',
+    'itinerary': 'itinerary',
+    'tour provider': None,
+}
+
+DETAIL_LINE = re.compile(r'^([A-Za-z][A-Za-z ]{1,30}):\s*(.*)$')
+LIST_NUMBER = re.compile(r'^\d+\s*[.)]\s*')
+PRICE_AMOUNT = re.compile(r'(\d[\d,]*)')
+
+
+def parse_paragraphs(paragraphs):
+    """
+    Split document lines into structured sections in a single pass.
+
+    Lines before the first heading are "Key: value" details (Duration, Price, ...);
+    "---" and unknown headings such as "Tour Provider" close the current section.
+    """
+    sections = {
+        'title': '',
+        'details': {},
+        'price': None,
+        'description': [],
+        'highlights': [],
+        'inclusions': [],
+        'exclusions': [],
+        'itinerary': [],
+    }
+    current = 'details'
+
+    for text in paragraphs:
+        text = text.strip()
+        if not text:
+            continue
+        if not sections['title']:
+            sections['title'] = text
+            continue
+        if text == '---':
+            current = None
+            continue
+
+        heading = text.rstrip('.:').strip().lower()
+        if heading in SECTION_HEADINGS:
+            current = SECTION_HEADINGS[heading]
+            continue
+        # "Itinerary (1 Day)"
+        if ITINERARY_HEADING.match(text):
+            current = 'itinerary'
+            continue
+
+        if current == 'details':
+            match = DETAIL_LINE.match(text)
+            if match:
+                key, value = match.group(1).strip().lower(), match.group(2).strip()
+                sections['details'][key] = value
+                if key == 'price' and sections['price'] is None:
+                    amount = PRICE_AMOUNT.search(value)
+                    if amount:
+                        sections['price'] = int(amount.group(1).replace(',', ''))
+        elif current == 'itinerary':
+            day = DAY_HEADING.match(text)
+            if day:
+                sections['itinerary'].append({
+                    'day': int(day.group(1)),
+                    'title': (day.group(2) or '').strip(),
+                    'activities': [],
+                })
+                continue
+            if not sections['itinerary']:
+                # Single-day itineraries often have no "Day 1" heading
+                sections['itinerary'].append({'day': 1, 'title': '', 'activities': []})
+            sections['itinerary'][-1]['activities'].append(LIST_NUMBER.sub('', text))
+        elif current in ('highlights', 'inclusions', 'exclusions'):
+            # Highlights sometimes repeat the day headings of the itinerary
+            if not DAY_HEADING.match(text):
+                sections[current].append(LIST_NUMBER.sub('', text))
+        elif current == 'description':
+            sections['description'].append(text)
+
+    return sections
+
+
+def format_itinerary(days):
+    """Render parsed itinerary days in the "Day N: title / - activity" text format"""
+    lines = []
+    for day in days:
+        heading = f"Day {day['day']}: {day['title']}" if day['title'] else f"Day {day['day']}"
+        lines.append(f"\n{heading}" if lines else heading)
+        lines.extend(f'- {activity}' for activity in day['activities'])
+    return '\n'.join(lines)
+
+
+def extract_content(sections):
+    """Map parsed sections to Package field values; missing sections are left out"""
+    result = {}
+    if sections['description']:
+        result['description'] = '\n\n'.join(sections['description'])
+    for field in ('inclusions', 'exclusions', 'highlights'):
+        if sections[field]:
+            result[field] = '\n'.join(sections[field])
+    if sections['itinerary']:
+        result['itinerary'] = format_itinerary(sections['itinerary'])
+    if sections['price'] is not None:
+        result['price'] = sections['price']
+    return result
+
+
+def parse_sections(path, content_hash, cache_dir=None):
+    """
+    Parse a document into sections, reusing the cached result for the same file hash.
+
+    The cache is one JSON file per (parser version, content hash), written atomically
+    so parallel workers never see partial files.
+    """
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = Path(cache_dir) / f'v{PARSER_VERSION}-{content_hash}.json'
+        try:
+            with open(cache_file, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    sections = parse_paragraphs(para.text for para in Document(path).paragraphs)
+
+    if cache_file is not None:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_file.with_name(f'{cache_file.name}.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(sections, f)
+        os.replace(tmp_path, cache_file)
+    return sections
+
+
+def parse_document(path, content_hash, cache_dir=None):
+    """Parse one package document (runs in a worker process)"""
+    sections = parse_sections(path, content_hash, cache_dir)
+    return {
+        'package_data': parse_filename(path.stem),
+        'sections': sections,
+        'content': extract_content(sections),
+    }
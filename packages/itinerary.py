@@ -0,0 +1,72 @@
+"""
+Splitting of the free-text Package.itinerary into per-day rows.
+
+The text format is the one written by the admin and import_packages:
+
+    Day 1: Arrival at Goa
+    - Check-in to hotel
+    - Evening at leisure
+
+    Day 2: Departure
+    ...
+
+Packages imported before the section parser hold the whole document text, so
+when the text has an "Itinerary" heading only the lines after it are split, up
+to the next "---" or section heading. Lines before the first "Day N" heading
+are dropped when there is a "Day 1" heading; otherwise they are the unlabelled
+first day, so itineraries without headings become a single day.
+"""
+import re
+
+DAY_HEADING = re.compile(r'^\(?day\s*-?\s*(\d+)\)?\s*(?:[:\-–.]\s*(.*))?$', re.IGNORECASE)
+BULLET = re.compile(r'^(?:[-*•]|\d+\s*[.)])\s*')
+ITINERARY_HEADING = re.compile(r'^itinerary\s*(?:\(.*\))?\s*[.:]?$', re.IGNORECASE)
+SECTION_END = re.compile(
+    r'^(?:-{3,}|(?:about the tour|highlights|inclusions?|includes|exclusions?|excludes|tour provider)\s*[.:]?)$',
+    re.IGNORECASE,
+)
+
+
+def itinerary_lines(text):
+    """Return the non-empty lines of the itinerary section of a text"""
+    lines = [line.strip() for line in (text or '').splitlines()]
+    lines = [line for line in lines if line]
+    start = next((i for i, line in enumerate(lines) if ITINERARY_HEADING.match(line)), None)
+    if start is None:
+        return lines
+
+    section = []
+    for line in lines[start + 1:]:
+        if SECTION_END.match(line):
+            break
+        section.append(line)
+    return section
+
+
+def parse_itinerary(text):
+    """Return [{'day_number', 'title', 'activities'}] for an itinerary text, ordered by day"""
+    lines = itinerary_lines(text)
+    has_day_one = any(
+        heading and int(heading.group(1)) == 1 for heading in map(DAY_HEADING.match, lines)
+    )
+
+    days = {}
+    current = None
+    for line in lines:
+        heading = DAY_HEADING.match(line)
+        if heading:
+            number = int(heading.group(1))
+            current = days.setdefault(number, {'day_number': number, 'title': '', 'activities': []})
+            if heading.group(2) and not current['title']:
+                current['title'] = heading.group(2).strip()[:200]
+            continue
+
+        if current is None:
+            if has_day_one:
+                continue
+            current = days.setdefault(1, {'day_number': 1, 'title': '', 'activities': []})
+        activity = BULLET.sub('', line)
+        if activity:
+            current['activities'].append(activity)
+
+    return [days[number] for number in sorted(days)]
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from packages.recommendations import RECOMMENDATIONS_PER_PACKAGE, compute_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Precompute related-package recommendations (run periodically, e.g. nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=RECOMMENDATIONS_PER_PACKAGE,
+            help=f'Recommendations stored per package (default: {RECOMMENDATIONS_PER_PACKAGE})',
+        )
+
+    def handle(self, *args, **options):
+        written = compute_recommendations(limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'Stored {written} recommendations'))
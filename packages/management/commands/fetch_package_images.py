@@ -1,13 +1,164 @@
+import hashlib
+import json
 import os
+import threading
 import time
-import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.management.base import BaseCommand
-from django.core.files import File
-from django.core.files.temp import NamedTemporaryFile
 from packages.models import Package
 from decouple import config
 
+PEXELS_SEARCH_URL = 'https://api.pexels.com/v1/search'
+
+IMAGE_FIELDS = ['featured_image', 'image_2', 'image_3', 'image_4', 'image_5']
+
+# Media storage directory for content-addressed package photos
+PHOTO_STORAGE_DIR = 'packages/pexels'
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def drain_until(self, timestamp):
+        """Hold all callers until the given epoch time (server-side quota reset)"""
+        with self.lock:
+            self.tokens = 0
+            self.updated = time.monotonic() + max(0, timestamp - time.time())
+
+
+class ProgressManifest:
+    """JSON record of finished packages so an interrupted run can resume"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.completed = {}
+        if self.path.exists():
+            try:
+                self.completed = json.loads(self.path.read_text()).get('completed', {})
+            except (ValueError, OSError):
+                self.completed = {}
+
+    def is_completed(self, package):
+        return package.slug in self.completed
+
+    def mark_completed(self, package, image_count):
+        with self.lock:
+            self.completed[package.slug] = {'images': image_count, 'finished_at': time.time()}
+            # Write to a temporary file and rename so a crash never leaves half a manifest
+            tmp_path = self.path.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps({'completed': self.completed}, indent=2))
+            os.replace(tmp_path, self.path)
+
+    def delete(self):
+        if self.path.exists():
+            self.path.unlink()
+
+
+class ImageCache:
+    """Content-addressed on-disk cache of Pexels search results and photos
+
+    Layout of the cache directory:
+        searches/<sha1 of query>.json   photos returned for a search query
+        objects/<sha256>.jpg            photo bytes, stored once per content hash
+        photos.json                     Pexels photo id -> source URL and content hash
+
+    Packages sharing a destination reuse the same search and photos, and a
+    photo is only downloaded again when Pexels serves it from a new URL.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        (self.path / 'searches').mkdir(parents=True, exist_ok=True)
+        (self.path / 'objects').mkdir(parents=True, exist_ok=True)
+        self.index_path = self.path / 'photos.json'
+        self.index = {}
+        if self.index_path.exists():
+            try:
+                self.index = json.loads(self.index_path.read_text())
+            except (ValueError, OSError):
+                self.index = {}
+        self.lock = threading.Lock()
+        self.key_locks = {}
+
+    def key_lock(self, key):
+        """Lock serializing work on one query or photo across worker threads"""
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def search_path(self, query):
+        return self.path / 'searches' / f'{hashlib.sha1(query.encode()).hexdigest()}.json'
+
+    def get_search(self, query, max_age):
+        """Return cached photos for a query if younger than max_age seconds"""
+        path = self.search_path(query)
+        if not path.exists() or time.time() - path.stat().st_mtime > max_age:
+            return None
+        try:
+            return json.loads(path.read_text())
+        except (ValueError, OSError):
+            return None
+
+    def set_search(self, query, photos):
+        self.write_atomic(self.search_path(query), json.dumps(photos))
+
+    def get_photo(self, photo_id, url):
+        """Return (digest, bytes) of a cached photo, or None if missing or changed"""
+        with self.lock:
+            entry = self.index.get(str(photo_id))
+        if not entry or entry['url'] != url:
+            return None
+        blob = self.path / 'objects' / f"{entry['sha256']}.jpg"
+        if not blob.exists():
+            return None
+        return entry['sha256'], blob.read_bytes()
+
+    def set_photo(self, photo_id, url, content):
+        """Store photo bytes under their content hash and return the hash"""
+        digest = hashlib.sha256(content).hexdigest()
+        blob = self.path / 'objects' / f'{digest}.jpg'
+        if not blob.exists():
+            self.write_atomic(blob, content)
+        with self.lock:
+            self.index[str(photo_id)] = {'url': url, 'sha256': digest}
+            self.write_atomic(self.index_path, json.dumps(self.index))
+        return digest
+
+    def write_atomic(self, path, data):
+        tmp_path = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+        if isinstance(data, bytes):
+            tmp_path.write_bytes(data)
+        else:
+            tmp_path.write_text(data)
+        os.replace(tmp_path, path)
+
 
 class Command(BaseCommand):
     help = 'Fetch and assign images to packages from Pexels API'
@@ -35,6 +186,41 @@ class Command(BaseCommand):
             action='store_true',
             help='Force re-download images even if they already exist',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of packages processed in parallel (default: 4)',
+        )
+        parser.add_argument(
+            '--requests-per-hour',
+            type=int,
+            default=200,
+            help='Pexels API request budget per hour (default: 200, the free tier limit)',
+        )
+        parser.add_argument(
+            '--manifest',
+            type=str,
+            default=str(settings.BASE_DIR / '.fetch_package_images.json'),
+            help='Progress file used to resume an interrupted run',
+        )
+        parser.add_argument(
+            '--cache-dir',
+            type=str,
+            default=str(settings.BASE_DIR / '.image_cache'),
+            help='Directory of the local search and photo cache',
+        )
+        parser.add_argument(
+            '--search-cache-hours',
+            type=int,
+            default=24,
+            help='Reuse cached Pexels search results younger than this (default: 24)',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore the progress file and process every package again',
+        )
 
     def handle(self, *args, **options):
         # Get API key from argument or environment
@@ -49,64 +235,79 @@ class Command(BaseCommand):
             ))
             return
 
-        images_per_package = options.get('images_per_package', 5)
+        self.api_key = api_key
+        self.images_per_package = options.get('images_per_package', 5)
+        self.force = options.get('force', False)
         limit = options.get('limit')
-        force = options.get('force', False)
+        workers = max(1, options.get('workers', 4))
+
+        # API calls share one token bucket; image downloads from the CDN are not rate limited
+        requests_per_hour = options.get('requests_per_hour', 200)
+        self.rate_limiter = TokenBucket(rate=requests_per_hour / 3600, capacity=requests_per_hour)
+        self.session = self.create_session(pool_size=workers * 2)
+        self.image_cache = ImageCache(options['cache_dir'])
+        self.search_max_age = options.get('search_cache_hours', 24) * 3600
+
+        self.manifest = ProgressManifest(options['manifest'])
+        if options.get('restart'):
+            self.manifest.delete()
+            self.manifest = ProgressManifest(options['manifest'])
 
         # Get packages that need images
         packages = Package.objects.all()
         if limit:
             packages = packages[:limit]
+        packages = list(packages)
 
-        total_packages = packages.count()
-        self.stdout.write(self.style.SUCCESS(f'Found {total_packages} packages'))
+        self.stdout.write(self.style.SUCCESS(f'Found {len(packages)} packages'))
 
         processed = 0
         skipped = 0
         errors = 0
 
+        pending = []
         for package in packages:
-            try:
-                # Check if package already has images (skip if not forcing)
-                if not force and package.featured_image and package.image_2 and package.image_3:
-                    self.stdout.write(self.style.WARNING(
-                        f'Skipped (has images): {package.name}'
+            if self.manifest.is_completed(package):
+                self.stdout.write(self.style.WARNING(f'Skipped (done in previous run): {package.name}'))
+                skipped += 1
+            elif not self.force and package.featured_image and package.image_2 and package.image_3:
+                self.stdout.write(self.style.WARNING(f'Skipped (has images): {package.name}'))
+                skipped += 1
+            else:
+                pending.append(package)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(self.process_package, package): package for package in pending}
+            for future in as_completed(futures):
+                package = futures[future]
+                try:
+                    updated_fields = future.result()
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(
+                        f'  ERROR processing {package.name}: {str(e)}'
                     ))
-                    skipped += 1
+                    errors += 1
                     continue
 
-                self.stdout.write(f'Processing: {package.name}')
-
-                # Fetch images from Pexels
-                images = self.fetch_images(
-                    api_key,
-                    package.destination_city,
-                    images_per_package
-                )
-
-                if not images:
+                if updated_fields is None:
                     self.stdout.write(self.style.WARNING(
                         f'  No images found for: {package.destination_city}'
                     ))
                     errors += 1
                     continue
 
-                # Download and assign images to package
-                self.assign_images_to_package(package, images, force)
-
+                # Database writes stay on the main thread
+                if updated_fields:
+                    package.save(update_fields=updated_fields)
+                self.manifest.mark_completed(package, len(updated_fields))
                 self.stdout.write(self.style.SUCCESS(
-                    f'  Assigned {len(images)} images to {package.name}'
+                    f'  Assigned {len(updated_fields)} images to {package.name}'
                 ))
                 processed += 1
 
-                # Rate limiting: Sleep to avoid hitting API limits
-                time.sleep(1)
-
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(
-                    f'  ERROR processing {package.name}: {str(e)}'
-                ))
-                errors += 1
+        # A clean run starts over next time; otherwise keep progress for the retry
+        if not errors:
+            self.manifest.delete()
 
         # Summary
         self.stdout.write(self.style.SUCCESS('\n=== Image Fetching Complete ==='))
@@ -114,12 +315,43 @@ class Command(BaseCommand):
         self.stdout.write(self.style.WARNING(f'Skipped: {skipped} packages'))
         self.stdout.write(self.style.ERROR(f'Errors: {errors} packages'))
 
-    def fetch_images(self, api_key, query, per_page=5):
+    def create_session(self, pool_size):
+        """HTTP session reusing TCP/TLS connections across all requests and threads"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def process_package(self, package):
+        """Fetch and store images for one package (runs in a worker thread)
+
+        Returns the list of updated image fields, or None if Pexels had no images.
+        """
+        self.stdout.write(f'Processing: {package.name}')
+
+        images = self.fetch_images(package.destination_city, self.images_per_package)
+        if not images:
+            return None
+
+        return self.assign_images_to_package(package, images, self.force)
+
+    def fetch_images(self, query, per_page=5):
+        """Fetch images for a destination, from the local cache when possible"""
+        cache_key = f'{query}|{per_page}'
+        # One search per destination even when several workers need it at once
+        with self.image_cache.key_lock(f'search:{cache_key}'):
+            images = self.image_cache.get_search(cache_key, self.search_max_age)
+            if images is None:
+                images = self.search_pexels(query, per_page)
+                if images:
+                    self.image_cache.set_search(cache_key, images)
+        return images
+
+    def search_pexels(self, query, per_page=5):
         """Fetch images from Pexels API"""
-        url = 'https://api.pexels.com/v1/search'
-
         headers = {
-            'Authorization': api_key
+            'Authorization': self.api_key
         }
 
         params = {
@@ -129,13 +361,27 @@ class Command(BaseCommand):
         }
 
         try:
-            response = requests.get(url, headers=headers, params=params, timeout=10)
+            for attempt in range(3):
+                self.rate_limiter.acquire()
+                response = self.session.get(PEXELS_SEARCH_URL, headers=headers, params=params, timeout=10)
+                if response.status_code != 429:
+                    break
+                # Quota exhausted: hold every worker until Pexels resets it
+                reset_at = float(response.headers.get('X-Ratelimit-Reset', time.time() + 60))
+                self.stdout.write(self.style.WARNING('  Pexels rate limit reached, waiting for reset'))
+                self.rate_limiter.drain_until(reset_at)
             response.raise_for_status()
+
+            if response.headers.get('X-Ratelimit-Remaining') == '0':
+                reset_at = float(response.headers.get('X-Ratelimit-Reset', time.time() + 60))
+                self.rate_limiter.drain_until(reset_at)
+
             data = response.json()
 
             images = []
             for photo in data.get('photos', []):
                 images.append({
+                    'id': photo['id'],
                     'url': photo['src']['large'],
                     'photographer': photo['photographer'],
                 })
@@ -147,16 +393,11 @@ class Command(BaseCommand):
             return []
 
     def assign_images_to_package(self, package, images, force=False):
-        """Download and assign images to package fields"""
+        """Download images and store them on the package fields (without saving the row)"""
+        updated_fields = []
 
-        # Map images to package fields
-        image_fields = ['featured_image', 'image_2', 'image_3', 'image_4', 'image_5']
-
-        for idx, image_data in enumerate(images[:5]):
-            if idx >= len(image_fields):
-                break
-
-            field_name = image_fields[idx]
+        for idx, image_data in enumerate(images[:len(IMAGE_FIELDS)]):
+            field_name = IMAGE_FIELDS[idx]
 
             # Skip if field already has an image (unless forcing)
             current_value = getattr(package, field_name)
@@ -164,25 +405,11 @@ class Command(BaseCommand):
                 continue
 
             try:
-                # Download image
-                img_url = image_data['url']
-                response = requests.get(img_url, timeout=10)
-                response.raise_for_status()
-
-                # Save to temporary file (Python 3.14 compatible)
-                img_temp = NamedTemporaryFile()
-                img_temp.write(response.content)
-                img_temp.flush()
-                img_temp.seek(0)
+                name = self.store_photo(image_data)
+                getattr(package, field_name).name = name
+                updated_fields.append(field_name)
 
-                # Generate filename
-                filename = f'{package.slug}_{idx + 1}.jpg'
-
-                # Assign to package field
-                field = getattr(package, field_name)
-                field.save(filename, File(img_temp), save=False)
-
-                self.stdout.write(f'    Downloaded: {filename}')
+                self.stdout.write(f'    Assigned: {name}')
 
             except Exception as e:
                 self.stdout.write(self.style.WARNING(
@@ -190,5 +417,24 @@ class Command(BaseCommand):
                 ))
                 continue
 
-        # Save package with all new images
-        package.save()
+        return updated_fields
+
+    def store_photo(self, image_data):
+        """Return the media storage name of a photo, downloading and uploading only if needed"""
+        photo_id = image_data.get('id', image_data['url'])
+        with self.image_cache.key_lock(f'photo:{photo_id}'):
+            cached = self.image_cache.get_photo(photo_id, image_data['url'])
+            if cached:
+                digest, content = cached
+            else:
+                # Download image over the pooled session
+                response = self.session.get(image_data['url'], timeout=10)
+                response.raise_for_status()
+                content = response.content
+                digest = self.image_cache.set_photo(photo_id, image_data['url'], content)
+
+            # Identical photos share one file in media storage
+            name = f'{PHOTO_STORAGE_DIR}/{digest[:32]}.jpg'
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(content))
+            return name
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from packages.view_counter import flush_views
+
+
+class Command(BaseCommand):
+    help = 'Write buffered package view counts to the database (run on shutdown)'
+
+    def handle(self, *args, **options):
+        flushed = flush_views()
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} buffered views'))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from packages.images import (
+    DERIVATIVES_FIELD, IMAGE_FIELD_REGISTRY, generate_derivatives, update_derivative_records,
+)
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive WebP/JPEG derivatives for existing uploaded images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate derivatives even if they already exist',
+        )
+
+    def handle(self, *args, **options):
+        force = options.get('force', False)
+        generated = 0
+        errors = 0
+
+        # Images shared by several rows (e.g. same Pexels photo) are processed once
+        seen = set()
+        for model, field_names in IMAGE_FIELD_REGISTRY.items():
+            # Rows whose recorded derivative names changed, written in bulk
+            changed = []
+            for instance in model._default_manager.only('pk', DERIVATIVES_FIELD, *field_names):
+                for field in field_names:
+                    name = getattr(instance, field).name
+                    if not name or name in seen:
+                        continue
+                    seen.add(name)
+                    try:
+                        if generate_derivatives(name, force=force):
+                            generated += 1
+                            self.stdout.write(f'Generated: {name}')
+                    except (OSError, ValueError) as e:
+                        self.stdout.write(self.style.ERROR(f'[ERROR] {name}: {str(e)}'))
+                        errors += 1
+                if update_derivative_records(instance, field_names):
+                    changed.append(instance)
+            model._default_manager.bulk_update(changed, [DERIVATIVES_FIELD], batch_size=500)
+
+        self.stdout.write(self.style.SUCCESS(f'\n=== Derivatives Complete ==='))
+        self.stdout.write(self.style.SUCCESS(f'Generated: {generated} images'))
+        self.stdout.write(self.style.WARNING(f'Up to date: {len(seen) - generated - errors} images'))
+        self.stdout.write(self.style.ERROR(f'Errors: {errors} images'))
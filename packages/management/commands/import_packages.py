@@ -1,88 +1,260 @@
 import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from docx import Document
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from django.core.files import File
-from packages.models import Package, PackageCategory
+from django.db import transaction
+from django.utils import timezone
+from packages.importers import file_hash, parse_document
+from packages.models import (
+    Amenity, ImportedDocument, ItineraryDay, Package, PackageCategory, PackageSearchDocument,
+)
 from django.utils.text import slugify
+from pages.cache import SECTION_DEPENDENCIES, invalidate_home_sections, invalidate_pages
+
+# Package fields refreshed from the document when an imported file changes.
+# Everything else (pricing, flags, images) is left to the admin after the first import.
+DOCUMENT_FIELDS = ['description', 'inclusions', 'exclusions', 'itinerary', 'highlights']
+LIST_FIELDS = ['inclusions_list', 'exclusions_list', 'highlights_list']
 
 
 class Command(BaseCommand):
     help = 'Import travel packages from Word documents'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of processes parsing documents in parallel (default: CPU count)',
+        )
+        parser.add_argument(
+            '--cache-dir',
+            type=str,
+            default=str(settings.BASE_DIR / '.import_cache'),
+            help='Directory of parsed documents, keyed by file hash',
+        )
+        parser.add_argument(
+            '--docs-dir',
+            type=str,
+            default=str(settings.BASE_DIR / 'travle dcoument'),
+            help='Directory of the package .docx documents',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show the parsed sections of every document without saving anything',
+        )
+
     def handle(self, *args, **options):
         # Path to documents
-        base_dir = Path(__file__).resolve().parent.parent.parent.parent
-        docs_dir = base_dir / 'travle dcoument'
+        docs_dir = Path(options['docs_dir'])
 
         if not docs_dir.exists():
             self.stdout.write(self.style.ERROR(f'Directory not found: {docs_dir}'))
             return
 
-        # Create categories
-        categories_map = self.create_categories()
-
         # Get all docx files
-        docx_files = list(docs_dir.glob('*.docx'))
+        docx_files = sorted(docs_dir.glob('*.docx'))
         self.stdout.write(self.style.SUCCESS(f'Found {len(docx_files)} package files'))
 
-        imported_count = 0
-        skipped_count = 0
-
+        if options['dry_run']:
+            # Preview every document; unchanged ones come from the parse cache
+            records = {}
+        else:
+            records = {
+                record.filename: record
+                for record in ImportedDocument.objects.select_related('package')
+            }
+
+        # Find changed documents; unchanged ones are never opened
+        changed_files = []
+        unchanged_records = []
         for docx_file in docx_files:
-            try:
-                # Extract destination and duration from filename
-                filename = docx_file.stem
-                package_data = self.parse_filename(filename)
-
-                # Check if package already exists
-                if Package.objects.filter(name=package_data['name']).exists():
-                    self.stdout.write(self.style.WARNING(f'Skipped (exists): {package_data["name"]}'))
-                    skipped_count += 1
-                    continue
-
-                # Read document content
-                doc = Document(docx_file)
-                content = self.extract_content(doc)
-
-                # Determine category
-                category = self.get_category(package_data['destination'], categories_map)
-
-                # Create package
-                package = Package.objects.create(
-                    name=package_data['name'],
-                    category=category,
-                    short_description=f"Explore {package_data['destination']} in {package_data['duration_days']} days",
-                    description=content.get('description', f"Experience the best of {package_data['destination']} with our carefully curated tour package."),
-                    price=content.get('price', 10000),
-                    original_price=content.get('original_price', None),
-                    duration_days=package_data['duration_days'],
-                    duration_nights=package_data['duration_nights'],
-                    location=package_data['destination'],
-                    destination_city=package_data['destination'],
-                    destination_state=self.get_state(package_data['destination']),
-                    destination_country='India',
-                    inclusions=content.get('inclusions', 'Accommodation\nMeals as per itinerary\nTransportation\nSightseeing'),
-                    exclusions=content.get('exclusions', 'Flight tickets\nPersonal expenses\nTravel insurance'),
-                    itinerary=content.get('itinerary', self.generate_default_itinerary(package_data)),
-                    highlights=content.get('highlights', ''),
-                    hotel_type='3-Star',
-                    meal_plan='Breakfast',
-                    transport_mode='AC Vehicle',
-                    available=True,
-                    featured=True if imported_count < 8 else False,  # Mark first 8 as featured
-                    popular=True if imported_count < 6 else False,
-                )
+            stat = docx_file.stat()
+            record = records.get(docx_file.name)
+            if record and record.mtime == stat.st_mtime and record.size == stat.st_size:
+                continue
+
+            content_hash = file_hash(docx_file)
+            if record and record.content_hash == content_hash:
+                # Touched (e.g. fresh checkout) but identical
+                record.mtime = stat.st_mtime
+                unchanged_records.append(record)
+                continue
+
+            changed_files.append((docx_file, stat, content_hash))
+
+        unchanged_count = len(docx_files) - len(changed_files)
+        self.stdout.write(f'Unchanged since last import: {unchanged_count} files')
+
+        # Parse changed documents in worker processes
+        parsed = []
+        if changed_files:
+            workers = max(1, min(options['workers'], len(changed_files)))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(parse_document, docx_file, content_hash, options['cache_dir']): (
+                        docx_file, stat, content_hash
+                    )
+                    for docx_file, stat, content_hash in changed_files
+                }
+                for future in as_completed(futures):
+                    docx_file, stat, content_hash = futures[future]
+                    try:
+                        parsed.append((docx_file, stat, content_hash, future.result()))
+                    except Exception as e:
+                        self.stdout.write(self.style.ERROR(f'[ERROR] Error importing {docx_file.name}: {str(e)}'))
+        parsed.sort(key=lambda item: item[0].name)
+
+        if options['dry_run']:
+            for docx_file, stat, content_hash, result in parsed:
+                self.show_sections(docx_file, result)
+            return
 
+        # Create categories
+        categories_map = self.create_categories()
+
+        existing_packages = {
+            package.name: package for package in Package.objects.only('id', 'name', *DOCUMENT_FIELDS)
+        }
+        # Packages already tracked by a document; a second file with the same name is skipped
+        claimed = {record.package.name for record in records.values() if record.package}
+        new_packages = []
+        updated_packages = []
+        # Fields written by bulk_update -> packages whose document changed those fields
+        updated_fields = defaultdict(list)
+        record_packages = []
+        skipped_count = 0
+
+        for docx_file, stat, content_hash, result in parsed:
+            package_data = result['package_data']
+            content = result['content']
+            record = records.get(docx_file.name)
+
+            if record and record.package:
+                # Changed document of a package we imported: refresh its text
+                package = record.package
+                fields = self.apply_document_fields(package, content)
+                updated_fields[tuple(fields)].append(package)
+                updated_packages.append(package)
+                self.stdout.write(self.style.SUCCESS(f'[OK] Updated: {package.name}'))
+            elif package_data['name'] in claimed:
+                package = None
+                self.stdout.write(self.style.WARNING(f'Skipped (exists): {package_data["name"]}'))
+                skipped_count += 1
+            elif package_data['name'] in existing_packages:
+                # A package imported before documents were tracked: adopt it and refresh
+                # its text, so it no longer holds the whole document
+                package = existing_packages[package_data['name']]
+                claimed.add(package.name)
+                fields = self.apply_document_fields(package, content)
+                updated_fields[tuple(fields)].append(package)
+                updated_packages.append(package)
+                self.stdout.write(self.style.SUCCESS(f'[OK] Adopted: {package.name}'))
+            else:
+                package = self.build_package(package_data, content, categories_map, len(new_packages))
+                existing_packages[package.name] = package
+                claimed.add(package.name)
+                new_packages.append(package)
                 self.stdout.write(self.style.SUCCESS(f'[OK] Imported: {package.name}'))
-                imported_count += 1
 
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f'[ERROR] Error importing {docx_file.name}: {str(e)}'))
+            record_packages.append((ImportedDocument(
+                filename=docx_file.name,
+                content_hash=content_hash,
+                mtime=stat.st_mtime,
+                size=stat.st_size,
+            ), package))
+
+        with transaction.atomic():
+            Package.objects.bulk_create(new_packages, batch_size=500)
+            for fields, packages in updated_fields.items():
+                Package.objects.bulk_update(packages, fields, batch_size=500)
+            PackageSearchDocument.objects.refresh_many(new_packages + updated_packages)
+            ItineraryDay.objects.refresh_many(new_packages + updated_packages)
+            Amenity.objects.refresh_many(new_packages + updated_packages)
+
+            # Primary keys of new packages are only known after bulk_create
+            for record, package in record_packages:
+                record.package = package
+            ImportedDocument.objects.bulk_create(
+                [record for record, _ in record_packages],
+                update_conflicts=True,
+                unique_fields=['filename'],
+                update_fields=['package', 'content_hash', 'mtime', 'size', 'imported_at'],
+            )
+            ImportedDocument.objects.bulk_update(unchanged_records, ['mtime'], batch_size=500)
+
+        # Bulk writes bypass the post_save signals that keep the homepage and page caches fresh
+        if new_packages or updated_packages:
+            invalidate_home_sections(SECTION_DEPENDENCIES[Package])
+            invalidate_pages()
 
         self.stdout.write(self.style.SUCCESS(f'\n=== Import Complete ==='))
-        self.stdout.write(self.style.SUCCESS(f'Imported: {imported_count} packages'))
-        self.stdout.write(self.style.WARNING(f'Skipped: {skipped_count} packages'))
+        self.stdout.write(self.style.SUCCESS(f'Imported: {len(new_packages)} packages'))
+        self.stdout.write(self.style.SUCCESS(f'Updated: {len(updated_packages)} packages'))
+        self.stdout.write(self.style.WARNING(f'Skipped: {skipped_count + unchanged_count} packages'))
+
+    def show_sections(self, docx_file, result):
+        """Print a summary of a parsed document"""
+        sections = result['sections']
+        self.stdout.write(self.style.SUCCESS(f"{docx_file.name} -> {result['package_data']['name']}"))
+        self.stdout.write(f"  Price: {sections['price'] or '-'}")
+        for field in ('highlights', 'inclusions', 'exclusions'):
+            self.stdout.write(f"  {field.capitalize()}: {len(sections[field])} items")
+        for day in sections['itinerary']:
+            self.stdout.write(f"  Day {day['day']}: {len(day['activities'])} activities")
+
+    def build_package(self, package_data, content, categories_map, imported_count):
+        """Build an unsaved package from a parsed document"""
+        package = Package(
+            name=package_data['name'],
+            slug=slugify(package_data['name']),
+            category=self.get_category(package_data['destination'], categories_map),
+            short_description=f"Explore {package_data['destination']} in {package_data['duration_days']} days",
+            description=content.get('description', f"Experience the best of {package_data['destination']} with our carefully curated tour package."),
+            price=content.get('price', 10000),
+            original_price=content.get('original_price', None),
+            duration_days=package_data['duration_days'],
+            duration_nights=package_data['duration_nights'],
+            location=package_data['destination'],
+            destination_city=package_data['destination'],
+            destination_state=self.get_state(package_data['destination']),
+            destination_country='India',
+            inclusions=content.get('inclusions', 'Accommodation\nMeals as per itinerary\nTransportation\nSightseeing'),
+            exclusions=content.get('exclusions', 'Flight tickets\nPersonal expenses\nTravel insurance'),
+            itinerary=content.get('itinerary', self.generate_default_itinerary(package_data)),
+            highlights=content.get('highlights', ''),
+            hotel_type='3-Star',
+            meal_plan='Breakfast',
+            transport_mode='AC Vehicle',
+            available=True,
+            featured=True if imported_count < 8 else False,  # Mark first 8 as featured
+            popular=True if imported_count < 6 else False,
+        )
+        # bulk_create skips save(), which fills these in
+        package.discount_percentage = package.get_discount_percentage()
+        package.price_per_day = package.get_price_per_day()
+        self.set_list_fields(package)
+        return package
+
+    def apply_document_fields(self, package, content):
+        """Refresh the document-derived text of an existing package; return the fields to write"""
+        # Sections missing from the document keep the current, possibly admin-edited, text
+        fields = [field for field in DOCUMENT_FIELDS if field in content]
+        for field in fields:
+            setattr(package, field, content[field])
+        package.updated_at = timezone.now()
+        self.set_list_fields(package)
+        list_fields = [f'{field}_list' for field in fields if f'{field}_list' in LIST_FIELDS]
+        return fields + list_fields + ['updated_at']
+
+    def set_list_fields(self, package):
+        """Fill the parsed list columns that save() would normally set"""
+        package.inclusions_list = package.get_inclusions_list()
+        package.exclusions_list = package.get_exclusions_list()
+        package.highlights_list = package.get_highlights_list()
 
     def create_categories(self):
         """Create package categories"""
@@ -106,84 +278,6 @@ class Command(BaseCommand):
 
         return categories_map
 
-    def parse_filename(self, filename):
-        """Extract package info from filename"""
-        # Clean filename
-        name = filename.replace('Tour Package', '').replace('tour package', '').strip()
-        name = ' '.join(name.split())
-
-        # Extract destination
-        parts = name.split('-')
-        if len(parts) > 1:
-            destination = parts[0].strip()
-            duration_part = parts[1].strip()
-        else:
-            # Try to parse without hyphen
-            words = name.split()
-            destination = words[0]
-            duration_part = ' '.join(words[1:])
-
-        # Extract duration
-        duration_days = 1
-        duration_nights = 0
-
-        import re
-        days_match = re.search(r'(\d+)\s*[Dd]ay', duration_part)
-        nights_match = re.search(r'(\d+)\s*[Nn]ight', duration_part)
-
-        if days_match:
-            duration_days = int(days_match.group(1))
-        if nights_match:
-            duration_nights = int(nights_match.group(1))
-
-        # Construct package name
-        package_name = f"{duration_days}D/{duration_nights}N {destination} Tour Package"
-
-        return {
-            'name': package_name,
-            'destination': destination,
-            'duration_days': duration_days,
-            'duration_nights': duration_nights,
-        }
-
-    def extract_content(self, doc):
-        """Extract content from Word document"""
-        full_text = []
-        for para in doc.paragraphs:
-            text = para.text.strip()
-            if text:
-                full_text.append(text)
-
-        content = '\n'.join(full_text)
-
-        # Try to extract sections
-        result = {
-            'description': '',
-            'inclusions': '',
-            'exclusions': '',
-            'itinerary': '',
-            'highlights': '',
-            'price': 10000,
-        }
-
-        # Simple extraction logic
-        if content:
-            result['description'] = content[:500] if len(content) > 500 else content
-
-            # Look for common keywords
-            if 'inclusion' in content.lower():
-                idx = content.lower().find('inclusion')
-                result['inclusions'] = content[idx:idx+300]
-
-            if 'exclusion' in content.lower():
-                idx = content.lower().find('exclusion')
-                result['exclusions'] = content[idx:idx+300]
-
-            if 'itinerary' in content.lower() or 'day 1' in content.lower():
-                result['itinerary'] = content
-
-        return result
-
     def get_category(self, destination, categories_map):
         """Get category for destination"""
         dest_lower = destination.lower()
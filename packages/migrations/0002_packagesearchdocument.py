@@ -0,0 +1,110 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:04
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+SQLITE_FORWARD_SQL = [
+    """
+    CREATE VIRTUAL TABLE packages_package_fts USING fts5(
+        title, body,
+        content='packages_packagesearchdocument',
+        content_rowid='package_id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER packages_package_fts_ai AFTER INSERT ON packages_packagesearchdocument BEGIN
+        INSERT INTO packages_package_fts(rowid, title, body)
+        VALUES (new.package_id, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER packages_package_fts_ad AFTER DELETE ON packages_packagesearchdocument BEGIN
+        INSERT INTO packages_package_fts(packages_package_fts, rowid, title, body)
+        VALUES ('delete', old.package_id, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER packages_package_fts_au AFTER UPDATE ON packages_packagesearchdocument BEGIN
+        INSERT INTO packages_package_fts(packages_package_fts, rowid, title, body)
+        VALUES ('delete', old.package_id, old.title, old.body);
+        INSERT INTO packages_package_fts(rowid, title, body)
+        VALUES (new.package_id, new.title, new.body);
+    END
+    """,
+]
+
+SQLITE_REVERSE_SQL = [
+    'DROP TRIGGER IF EXISTS packages_package_fts_au',
+    'DROP TRIGGER IF EXISTS packages_package_fts_ad',
+    'DROP TRIGGER IF EXISTS packages_package_fts_ai',
+    'DROP TABLE IF EXISTS packages_package_fts',
+]
+
+POSTGRES_FORWARD_SQL = [
+    """
+    CREATE INDEX packages_search_document_gin ON packages_packagesearchdocument
+    USING gin ((setweight(to_tsvector('simple', title), 'A') ||
+                setweight(to_tsvector('simple', body), 'B')))
+    """,
+]
+
+POSTGRES_REVERSE_SQL = [
+    'DROP INDEX IF EXISTS packages_search_document_gin',
+]
+
+
+def run_for_vendor(sqlite_sql, postgres_sql):
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        statements = {'sqlite': sqlite_sql, 'postgresql': postgres_sql}.get(vendor, [])
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+def build_search_documents(apps, schema_editor):
+    Package = apps.get_model('packages', 'Package')
+    PackageSearchDocument = apps.get_model('packages', 'PackageSearchDocument')
+
+    def tokens(*values):
+        return ' '.join(re.findall(r'[^\W_]+', ' '.join(values).lower()))
+
+    PackageSearchDocument.objects.bulk_create([
+        PackageSearchDocument(
+            package=package,
+            title=tokens(package.name, package.destination_city,
+                         package.destination_state, package.location),
+            body=tokens(package.short_description, package.highlights,
+                        package.itinerary, package.description),
+        )
+        for package in Package.objects.all()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackageSearchDocument',
+            fields=[
+                ('package', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='packages.package')),
+                ('title', models.TextField(blank=True, help_text='Name, city, state and location tokens')),
+                ('body', models.TextField(blank=True, help_text='Highlights, itinerary and description tokens')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(
+            run_for_vendor(SQLITE_FORWARD_SQL, POSTGRES_FORWARD_SQL),
+            run_for_vendor(SQLITE_REVERSE_SQL, POSTGRES_REVERSE_SQL),
+        ),
+        migrations.RunPython(build_search_documents, migrations.RunPython.noop),
+    ]
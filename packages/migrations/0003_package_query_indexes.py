@@ -0,0 +1,41 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0002_packagesearchdocument'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(condition=models.Q(('available', True)), fields=['featured', 'created_at', 'id'], name='package_avail_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(condition=models.Q(('available', True)), fields=['price', 'id'], name='package_avail_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(condition=models.Q(('available', True)), fields=['duration_days', 'id'], name='package_avail_duration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(condition=models.Q(('available', True)), fields=['created_at', 'id'], name='package_avail_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(condition=models.Q(('available', True)), fields=['category', 'featured', 'created_at'], name='package_avail_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(condition=models.Q(('available', True), ('featured', True)), fields=['featured', 'created_at'], name='package_home_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(condition=models.Q(('available', True), ('popular', True)), fields=['featured', 'created_at'], name='package_home_popular_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:09
+
+from django.db import migrations, models
+
+
+def backfill_card_fields(apps, schema_editor):
+    Package = apps.get_model('packages', 'Package')
+    packages = list(Package.objects.all())
+    for package in packages:
+        if package.original_price and package.original_price > package.price:
+            discount = (package.original_price - package.price) / package.original_price * 100
+            package.discount_percentage = round(discount)
+        if package.duration_days > 0:
+            package.price_per_day = round(package.price / package.duration_days, 2)
+        else:
+            package.price_per_day = package.price
+    Package.objects.bulk_update(packages, ['discount_percentage', 'price_per_day'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0003_package_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='discount_percentage',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='price_per_day',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(backfill_card_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0004_package_card_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=255, unique=True)),
+                ('content_hash', models.CharField(help_text='SHA-256 of the file contents', max_length=64)),
+                ('mtime', models.FloatField(help_text='File modification time at the last import')),
+                ('size', models.PositiveBigIntegerField()),
+                ('imported_at', models.DateTimeField(auto_now=True)),
+                ('package', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='source_documents', to='packages.package')),
+            ],
+            options={
+                'ordering': ['filename'],
+            },
+        ),
+    ]
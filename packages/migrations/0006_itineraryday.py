@@ -0,0 +1,99 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:17
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of packages.itinerary.parse_itinerary as of this migration.
+# Package.itinerary may hold the whole imported document, so only the
+# "Itinerary" section is split.
+DAY_HEADING = re.compile(r'^\(?day\s*-?\s*(\d+)\)?\s*(?:[:\-–.]\s*(.*))?$', re.IGNORECASE)
+BULLET = re.compile(r'^(?:[-*•]|\d+\s*[.)])\s*')
+ITINERARY_HEADING = re.compile(r'^itinerary\s*(?:\(.*\))?\s*[.:]?$', re.IGNORECASE)
+SECTION_END = re.compile(
+    r'^(?:-{3,}|(?:about the tour|highlights|inclusions?|includes|exclusions?|excludes|tour provider)\s*[.:]?)$',
+    re.IGNORECASE,
+)
+
+
+def itinerary_lines(text):
+    lines = [line.strip() for line in (text or '').splitlines()]
+    lines = [line for line in lines if line]
+    start = next((i for i, line in enumerate(lines) if ITINERARY_HEADING.match(line)), None)
+    if start is None:
+        return lines
+
+    section = []
+    for line in lines[start + 1:]:
+        if SECTION_END.match(line):
+            break
+        section.append(line)
+    return section
+
+
+def parse_itinerary(text):
+    lines = itinerary_lines(text)
+    has_day_one = any(
+        heading and int(heading.group(1)) == 1 for heading in map(DAY_HEADING.match, lines)
+    )
+
+    days = {}
+    current = None
+    for line in lines:
+        heading = DAY_HEADING.match(line)
+        if heading:
+            number = int(heading.group(1))
+            current = days.setdefault(number, {'day_number': number, 'title': '', 'activities': []})
+            if heading.group(2) and not current['title']:
+                current['title'] = heading.group(2).strip()[:200]
+            continue
+
+        if current is None:
+            if has_day_one:
+                continue
+            current = days.setdefault(1, {'day_number': 1, 'title': '', 'activities': []})
+        activity = BULLET.sub('', line)
+        if activity:
+            current['activities'].append(activity)
+
+    return [days[number] for number in sorted(days)]
+
+
+def split_itineraries(apps, schema_editor):
+    Package = apps.get_model('packages', 'Package')
+    ItineraryDay = apps.get_model('packages', 'ItineraryDay')
+    days = [
+        ItineraryDay(package_id=package_id, **day)
+        for package_id, itinerary in Package.objects.values_list('id', 'itinerary')
+        for day in parse_itinerary(itinerary)
+    ]
+    ItineraryDay.objects.bulk_create(days, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0005_importeddocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItineraryDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day_number', models.PositiveSmallIntegerField()),
+                ('title', models.CharField(blank=True, max_length=200)),
+                ('activities', models.JSONField(blank=True, default=list, help_text='List of activities for the day')),
+                ('package', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='itinerary_days', to='packages.package')),
+            ],
+            options={
+                'ordering': ['day_number'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='itineraryday',
+            constraint=models.UniqueConstraint(fields=('package', 'day_number'), name='unique_itinerary_day'),
+        ),
+        migrations.RunPython(split_itineraries, migrations.RunPython.noop),
+    ]
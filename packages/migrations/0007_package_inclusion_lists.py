@@ -0,0 +1,78 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:18
+
+from django.db import migrations, models
+
+
+def split_lines(text):
+    return [item.strip() for item in (text or '').split('\n') if item.strip()]
+
+
+def normalize(name):
+    return ' '.join(name.lower().split())[:255]
+
+
+def backfill_lists(apps, schema_editor):
+    Package = apps.get_model('packages', 'Package')
+    Amenity = apps.get_model('packages', 'Amenity')
+    Through = Package.amenities.through
+
+    packages = list(Package.objects.only('id', 'inclusions', 'exclusions', 'highlights'))
+    amenities = {}
+    for package in packages:
+        package.inclusions_list = split_lines(package.inclusions)
+        package.exclusions_list = split_lines(package.exclusions)
+        package.highlights_list = split_lines(package.highlights)
+        for name in package.inclusions_list:
+            amenities.setdefault(normalize(name), name[:255])
+    Package.objects.bulk_update(packages, ['inclusions_list', 'exclusions_list', 'highlights_list'], batch_size=500)
+
+    Amenity.objects.bulk_create([Amenity(key=key, name=name) for key, name in amenities.items()])
+    ids = dict(Amenity.objects.values_list('key', 'id'))
+    Through.objects.bulk_create([
+        Through(package_id=package.id, amenity_id=amenity_id)
+        for package in packages
+        for amenity_id in {ids[normalize(name)] for name in package.inclusions_list}
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0006_itineraryday'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Amenity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('key', models.CharField(help_text='Lowercased name used for lookups', max_length=255, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Amenities',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='exclusions_list',
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='highlights_list',
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='inclusions_list',
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='amenities',
+            field=models.ManyToManyField(blank=True, editable=False, help_text='Normalized inclusions, for filtering', related_name='packages', to='packages.amenity'),
+        ),
+        migrations.RunPython(backfill_lists, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0007_package_inclusion_lists'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPackage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField(help_text='1 = best match')),
+                ('package', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='packages.package')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_for', to='packages.package')),
+            ],
+            options={
+                'ordering': ['rank'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relatedpackage',
+            constraint=models.UniqueConstraint(fields=('package', 'rank'), name='unique_related_package_rank'),
+        ),
+    ]
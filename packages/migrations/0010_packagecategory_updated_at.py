@@ -0,0 +1,20 @@
+# Generated by Django 5.0.2 on 2026-10-18 21:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0009_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='packagecategory',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -2,6 +2,12 @@ from django.db import models
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator
 
+
+def split_lines(text):
+    """Non-empty, stripped lines of a one-per-line text field"""
+    return [item.strip() for item in (text or '').split('\n') if item.strip()]
+
+
 class PackageCategory(models.Model):
     """Categories for travel packages (e.g., Adventure, Honeymoon, Family, Religious)"""
     name = models.CharField(max_length=100)
@@ -9,6 +15,7 @@ class PackageCategory(models.Model):
     description = models.TextField(blank=True)
     icon = models.ImageField(upload_to='categories/', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Package Categories"
@@ -23,6 +30,27 @@ class PackageCategory(models.Model):
         return self.name
 
 
+class PackageQuerySet(models.QuerySet):
+    """Queryset helpers for Package"""
+
+    # Columns needed to render a package card (lists, homepage, related packages)
+    CARD_FIELDS = [
+        'id', 'name', 'slug', 'short_description',
+        'price', 'original_price', 'currency', 'discount_percentage', 'price_per_day',
+        'duration_days', 'duration_nights', 'destination_city', 'destination_country',
+        'featured_image', 'image_derivatives', 'hotel_type', 'meal_plan',
+        'available', 'featured', 'created_at',
+    ]
+
+    def cards(self):
+        """Load only the card columns, skipping the large text fields"""
+        return self.only(*self.CARD_FIELDS)
+
+    def with_inclusion(self, name):
+        """Packages including the given amenity, e.g. with_inclusion('Guided sightseeing')"""
+        return self.filter(amenities__key=Amenity.normalize(name))
+
+
 class Package(models.Model):
     """Main travel package model"""
     # Basic Information
@@ -37,6 +65,9 @@ class Package(models.Model):
     original_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
                                          help_text="Original price before discount")
     currency = models.CharField(max_length=3, default='INR')
+    # Denormalized for card rendering, kept in sync on save()
+    discount_percentage = models.PositiveSmallIntegerField(default=0, editable=False)
+    price_per_day = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
 
     # Trip Details
     duration_days = models.PositiveIntegerField(help_text="Number of days")
@@ -52,16 +83,24 @@ class Package(models.Model):
     image_3 = models.ImageField(upload_to='packages/', blank=True, null=True)
     image_4 = models.ImageField(upload_to='packages/', blank=True, null=True)
     image_5 = models.ImageField(upload_to='packages/', blank=True, null=True)
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False,
+                                         help_text="Stored names of the responsive image derivatives")
 
     # Inclusions & Exclusions
     inclusions = models.TextField(help_text="What's included (one per line)")
     exclusions = models.TextField(help_text="What's not included (one per line)")
+    # Parsed lists for rendering, kept in sync on save()
+    inclusions_list = models.JSONField(default=list, editable=False)
+    exclusions_list = models.JSONField(default=list, editable=False)
+    amenities = models.ManyToManyField('Amenity', blank=True, editable=False, related_name='packages',
+                                       help_text="Normalized inclusions, for filtering")
 
     # Itinerary
     itinerary = models.TextField(help_text="Day-wise itinerary")
 
     # Additional Details
     highlights = models.TextField(help_text="Package highlights (one per line)", blank=True)
+    highlights_list = models.JSONField(default=list, editable=False)
     activities = models.TextField(help_text="Activities included (one per line)", blank=True)
     hotel_type = models.CharField(max_length=100, blank=True, help_text="e.g., 3-star, 4-star, Resort")
     meal_plan = models.CharField(max_length=100, blank=True, help_text="e.g., Breakfast, All Meals")
@@ -79,14 +118,59 @@ class Package(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PackageQuerySet.as_manager()
+
     class Meta:
         ordering = ['-featured', '-created_at']
+        # Partial indexes on the available rows: every public query filters on
+        # available=True, which Django renders as a bare boolean predicate that
+        # SQLite can only match against an index with the same condition.
+        indexes = [
+            # package_list: default, price, duration and newest-first orderings
+            models.Index(fields=['featured', 'created_at', 'id'], condition=models.Q(available=True),
+                         name='package_avail_featured_idx'),
+            models.Index(fields=['price', 'id'], condition=models.Q(available=True),
+                         name='package_avail_price_idx'),
+            models.Index(fields=['duration_days', 'id'], condition=models.Q(available=True),
+                         name='package_avail_duration_idx'),
+            models.Index(fields=['created_at', 'id'], condition=models.Q(available=True),
+                         name='package_avail_created_idx'),
+            # package_list category filter and related packages on package_detail
+            models.Index(fields=['category', 'featured', 'created_at'], condition=models.Q(available=True),
+                         name='package_avail_category_idx'),
+            # Homepage featured and popular sections
+            models.Index(fields=['featured', 'created_at'], condition=models.Q(featured=True, available=True),
+                         name='package_home_featured_idx'),
+            models.Index(fields=['featured', 'created_at'], condition=models.Q(popular=True, available=True),
+                         name='package_home_popular_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        self.discount_percentage = self.get_discount_percentage()
+        self.price_per_day = self.get_price_per_day()
+        self.inclusions_list = self.get_inclusions_list()
+        self.exclusions_list = self.get_exclusions_list()
+        self.highlights_list = self.get_highlights_list()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if {'price', 'original_price', 'duration_days'} & update_fields:
+                update_fields |= {'discount_percentage', 'price_per_day'}
+            for field in ('inclusions', 'exclusions', 'highlights'):
+                if field in update_fields:
+                    update_fields.add(f'{field}_list')
+            kwargs['update_fields'] = update_fields
         super().save(*args, **kwargs)
 
+        # Keep the full-text search document and itinerary rows in sync
+        PackageSearchDocument.objects.refresh(self)
+        if update_fields is None or 'itinerary' in update_fields:
+            ItineraryDay.objects.refresh(self)
+        if update_fields is None or 'inclusions' in update_fields:
+            Amenity.objects.refresh(self)
+
     def __str__(self):
         return self.name
 
@@ -105,21 +189,23 @@ class Package(models.Model):
 
     def get_inclusions_list(self):
         """Return inclusions as a list"""
-        return [item.strip() for item in self.inclusions.split('\n') if item.strip()]
+        return split_lines(self.inclusions)
 
     def get_exclusions_list(self):
         """Return exclusions as a list"""
-        return [item.strip() for item in self.exclusions.split('\n') if item.strip()]
+        return split_lines(self.exclusions)
 
     def get_highlights_list(self):
         """Return highlights as a list"""
-        return [item.strip() for item in self.highlights.split('\n') if item.strip()]
+        return split_lines(self.highlights)
 
 
 class PackageImage(models.Model):
     """Additional images for packages"""
     package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='gallery_images')
     image = models.ImageField(upload_to='packages/gallery/')
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False,
+                                         help_text="Stored names of the responsive image derivatives")
     caption = models.CharField(max_length=200, blank=True)
     order = models.PositiveIntegerField(default=0)
 
@@ -130,6 +216,105 @@ class PackageImage(models.Model):
         return f"{self.package.name} - Image {self.order}"
 
 
+class AmenityManager(models.Manager):
+    """Maintains the amenities linked to packages from their inclusions"""
+
+    def refresh(self, package):
+        return self.refresh_many([package])
+
+    def refresh_many(self, packages):
+        """Relink the amenities of many packages, creating missing ones (for bulk writes)"""
+        wanted = {}
+        for package in packages:
+            for name in package.inclusions_list:
+                wanted.setdefault(Amenity.normalize(name), name)
+        self.bulk_create([self.model(key=key, name=name[:255]) for key, name in wanted.items()],
+                         ignore_conflicts=True)
+        ids = dict(self.filter(key__in=wanted).values_list('key', 'id'))
+
+        Through = Package.amenities.through
+        Through.objects.filter(package__in=[package.pk for package in packages]).delete()
+        Through.objects.bulk_create([
+            Through(package_id=package.pk, amenity_id=amenity_id)
+            for package in packages
+            for amenity_id in {ids[Amenity.normalize(name)] for name in package.inclusions_list}
+        ], batch_size=500)
+
+
+class Amenity(models.Model):
+    """A distinct inclusion shared by packages (e.g. "Guided sightseeing")"""
+    name = models.CharField(max_length=255)
+    key = models.CharField(max_length=255, unique=True, help_text="Lowercased name used for lookups")
+
+    objects = AmenityManager()
+
+    class Meta:
+        verbose_name_plural = "Amenities"
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    @staticmethod
+    def normalize(name):
+        """Lookup key of an inclusion: lowercase with collapsed whitespace"""
+        return ' '.join(name.lower().split())[:255]
+
+
+class ItineraryDayManager(models.Manager):
+    """Rebuilds the per-day rows of a package from its itinerary text"""
+
+    def build(self, package):
+        """Return unsaved rows for the package's itinerary"""
+        from .itinerary import parse_itinerary
+
+        return [self.model(package=package, **day) for day in parse_itinerary(package.itinerary)]
+
+    def refresh(self, package):
+        return self.refresh_many([package])
+
+    def refresh_many(self, packages):
+        """Replace the rows of many packages with two statements (for bulk writes)"""
+        self.filter(package__in=[package.pk for package in packages]).delete()
+        return self.bulk_create([day for package in packages for day in self.build(package)], batch_size=500)
+
+
+class ItineraryDay(models.Model):
+    """One day of a package itinerary, split from Package.itinerary when the package is saved"""
+    package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='itinerary_days')
+    day_number = models.PositiveSmallIntegerField()
+    title = models.CharField(max_length=200, blank=True)
+    activities = models.JSONField(default=list, blank=True, help_text="List of activities for the day")
+
+    objects = ItineraryDayManager()
+
+    class Meta:
+        ordering = ['day_number']
+        constraints = [
+            models.UniqueConstraint(fields=['package', 'day_number'], name='unique_itinerary_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.package.name} - Day {self.day_number}"
+
+
+class RelatedPackage(models.Model):
+    """Precomputed recommendation of one package for another (see packages.recommendations)"""
+    package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='recommendations')
+    related = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='recommended_for')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField(help_text="1 = best match")
+
+    class Meta:
+        ordering = ['rank']
+        constraints = [
+            models.UniqueConstraint(fields=['package', 'rank'], name='unique_related_package_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.package_id} -> {self.related_id} (#{self.rank})"
+
+
 class PackageReview(models.Model):
     """Customer reviews for packages"""
     package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='reviews')
@@ -145,4 +330,74 @@ class PackageReview(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"{self.name} - {self.package.name}"
\ No newline at end of file
+        return f"{self.name} - {self.package.name}"
+
+
+class PackageSearchDocumentManager(models.Manager):
+    """Builds and stores the precomputed search document for a package"""
+
+    def build(self, package):
+        """Return an unsaved search document for the package"""
+        from .search import tokenize
+
+        title = ' '.join(tokenize(' '.join([
+            package.name,
+            package.destination_city,
+            package.destination_state,
+            package.location,
+        ])))
+        body = ' '.join(tokenize(' '.join([
+            package.short_description,
+            package.highlights,
+            package.itinerary,
+            package.description,
+        ])))
+        return self.model(package=package, title=title, body=body)
+
+    def refresh(self, package):
+        document = self.build(package)
+        document, _ = self.update_or_create(
+            package=package,
+            defaults={'title': document.title, 'body': document.body},
+        )
+        return document
+
+    def refresh_many(self, packages):
+        """Upsert the search documents of many packages in one statement (for bulk writes)"""
+        return self.bulk_create(
+            [self.build(package) for package in packages],
+            update_conflicts=True,
+            unique_fields=['package'],
+            update_fields=['title', 'body', 'updated_at'],
+        )
+
+
+class PackageSearchDocument(models.Model):
+    """Tokenized search document for a package, indexed by the database full-text engine"""
+    package = models.OneToOneField(Package, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='search_document')
+    title = models.TextField(blank=True, help_text="Name, city, state and location tokens")
+    body = models.TextField(blank=True, help_text="Highlights, itinerary and description tokens")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = PackageSearchDocumentManager()
+
+    def __str__(self):
+        return f"Search document - {self.package_id}"
+
+
+class ImportedDocument(models.Model):
+    """Source .docx file of an imported package, used to skip unchanged files on re-import"""
+    filename = models.CharField(max_length=255, unique=True)
+    package = models.ForeignKey(Package, on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='source_documents')
+    content_hash = models.CharField(max_length=64, help_text="SHA-256 of the file contents")
+    mtime = models.FloatField(help_text="File modification time at the last import")
+    size = models.PositiveBigIntegerField()
+    imported_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['filename']
+
+    def __str__(self):
+        return self.filename
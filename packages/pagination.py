@@ -0,0 +1,128 @@
+"""
+Keyset (cursor) pagination for the package catalogue.
+
+Instead of COUNT(*) + OFFSET, each page is fetched with a WHERE clause that
+continues after the last row of the previous page, on the active sort keys
+plus the id as a tiebreaker. Deep pages cost the same as the first one.
+
+Cursors come from the query string, so anything that does not decode to one
+scalar value per sort key raises InvalidCursor instead of reaching the query.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# Sort option -> full ordering, ending with a unique tiebreaker
+KEYSET_ORDERINGS = {
+    '-featured': ['-featured', '-created_at', '-id'],
+    'price': ['price', 'id'],
+    '-price': ['-price', '-id'],
+    'duration_days': ['duration_days', 'id'],
+    '-duration_days': ['-duration_days', '-id'],
+    '-created_at': ['-created_at', '-id'],
+}
+
+
+# JSON types a cursor value may have; None would turn into an IS NULL lookup
+CURSOR_VALUE_TYPES = (str, int, float, bool)
+
+
+class InvalidCursor(Exception):
+    """The cursor was not produced by encode_cursor() for this ordering"""
+
+
+class KeysetPage:
+    """One page of results plus the cursor for the next one"""
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(values):
+    """Encode the sort key values of a row as an opaque URL-safe cursor"""
+    # Full precision: a truncated timestamp or price would skip or repeat rows
+    values = [
+        value.isoformat() if isinstance(value, datetime)
+        else str(value) if isinstance(value, Decimal)
+        else value
+        for value in values
+    ]
+    payload = json.dumps(values, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering):
+    """Decode a cursor back into typed sort key values, or None if it is invalid"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(ordering):
+            return None
+        if not all(isinstance(value, CURSOR_VALUE_TYPES) for value in values):
+            return None
+        values = [
+            model._meta.get_field(key.lstrip('-')).to_python(value)
+            for key, value in zip(ordering, values)
+        ]
+    except (binascii.Error, TypeError, ValueError, ValidationError):
+        return None
+    return values if None not in values else None
+
+
+def keyset_filter(ordering, values):
+    """Build the condition selecting rows that sort strictly after the given values"""
+    condition = Q()
+    equal = {}
+    for key, value in zip(ordering, values):
+        field = key.lstrip('-')
+        lookup = 'lt' if key.startswith('-') else 'gt'
+        condition |= Q(**equal, **{f'{field}__{lookup}': value})
+        equal[field] = value
+
+    # Redundant bound on the leading key lets the database seek into the index
+    # instead of scanning it from the start
+    first = ordering[0]
+    bound = 'lte' if first.startswith('-') else 'gte'
+    return Q(**{f'{first.lstrip("-")}__{bound}': values[0]}) & condition
+
+
+def paginate_by_keyset(queryset, sort_by, cursor=None, per_page=12):
+    """Return the KeysetPage of queryset that follows the given cursor; raise InvalidCursor if it is invalid"""
+    ordering = KEYSET_ORDERINGS.get(sort_by, KEYSET_ORDERINGS['-featured'])
+    queryset = queryset.order_by(*ordering)
+
+    if cursor:
+        values = decode_cursor(cursor, queryset.model, ordering)
+        if values is None:
+            raise InvalidCursor(cursor)
+        queryset = queryset.filter(keyset_filter(ordering, values))
+
+    # Fetch one extra row to find out whether there is a next page
+    rows = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        # Rows are model instances, or dicts for values() querysets
+        next_cursor = encode_cursor([
+            last[key.lstrip('-')] if isinstance(last, dict) else getattr(last, key.lstrip('-'))
+            for key in ordering
+        ])
+
+    return KeysetPage(rows, next_cursor)
@@ -0,0 +1,165 @@
+"""
+Precomputed "related packages" recommendations.
+
+``manage.py compute_recommendations`` scores pairs of available packages and
+stores the top matches of each package in the RelatedPackage table. The
+detail page then reads its suggestions with one indexed query instead of
+computing them per request. Run the command periodically (e.g. nightly cron)
+so new packages and bookings are taken into account; until a package has rows
+the detail page falls back to other packages of the same category.
+
+A pair scores higher the more of these it shares:
+
+- the same category or destination state/city
+- a similar duration and price
+- customers (by email) who booked both packages
+
+Only pairs sharing a category, state or city, or booked by the same customer,
+are scored; other pairs have nothing in common but a similar duration or
+price and are not recommended. The work grows with the size of those groups
+instead of the square of the catalogue.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+from itertools import combinations
+
+from django.db import transaction
+
+from pages.cache import invalidate_pages
+from .models import Package, RelatedPackage
+
+# Number of recommendations stored per package
+RECOMMENDATIONS_PER_PACKAGE = 8
+
+WEIGHTS = {
+    'category': 3.0,
+    'state': 2.0,
+    'city': 1.0,
+    'duration': 1.5,
+    'price': 1.5,
+    'co_booking': 2.0,
+}
+
+# Bookings that never happened say nothing about customer interest
+IGNORED_BOOKING_STATUSES = ['cancelled']
+
+
+def co_booking_counts():
+    """Number of distinct customers who booked each pair of packages"""
+    from bookings.models import Booking
+
+    packages_by_customer = defaultdict(set)
+    bookings = (
+        Booking.objects.exclude(booking_status__in=IGNORED_BOOKING_STATUSES)
+        .values_list('email', 'package_id')
+    )
+    for email, package_id in bookings.iterator():
+        packages_by_customer[email.lower()].add(package_id)
+
+    counts = Counter()
+    for package_ids in packages_by_customer.values():
+        for pair in combinations(sorted(package_ids), 2):
+            counts[pair] += 1
+    return counts
+
+
+def similarity(a, b, co_bookings=0):
+    """Score how related two packages (dicts of Package values) are"""
+    score = 0.0
+    if a['category_id'] and a['category_id'] == b['category_id']:
+        score += WEIGHTS['category']
+    if a['destination_state'] and a['destination_state'].lower() == b['destination_state'].lower():
+        score += WEIGHTS['state']
+    if a['destination_city'].lower() == b['destination_city'].lower():
+        score += WEIGHTS['city']
+
+    score += WEIGHTS['duration'] / (1 + abs(a['duration_days'] - b['duration_days']))
+    low, high = sorted([a['price'], b['price']])
+    if high > 0:
+        score += WEIGHTS['price'] * float(low / high)
+
+    if co_bookings:
+        score += WEIGHTS['co_booking'] * math.log1p(co_bookings)
+    return score
+
+
+def pair_key(a, b):
+    return (a, b) if a < b else (b, a)
+
+
+def candidate_ids(packages, co_bookings):
+    """Ids of the packages worth scoring against each package"""
+    groups = defaultdict(set)
+    for package in packages:
+        if package['category_id']:
+            groups['category', package['category_id']].add(package['id'])
+        if package['destination_state']:
+            groups['state', package['destination_state'].lower()].add(package['id'])
+        if package['destination_city']:
+            groups['city', package['destination_city'].lower()].add(package['id'])
+
+    candidates = defaultdict(set)
+    for members in groups.values():
+        for package_id in members:
+            candidates[package_id] |= members
+    for a, b in co_bookings:
+        candidates[a].add(b)
+        candidates[b].add(a)
+    for package_id, ids in candidates.items():
+        ids.discard(package_id)
+    return candidates
+
+
+def compute_recommendations(limit=RECOMMENDATIONS_PER_PACKAGE):
+    """Rebuild the RelatedPackage table; return the number of rows written"""
+    packages = {
+        package['id']: package
+        for package in Package.objects.filter(available=True).values(
+            'id', 'category_id', 'destination_state', 'destination_city', 'duration_days', 'price',
+        )
+    }
+    # Bookings of packages that are no longer available don't count
+    co_bookings = {
+        pair: count for pair, count in co_booking_counts().items()
+        if pair[0] in packages and pair[1] in packages
+    }
+
+    rows = []
+    for package_id, related_ids in candidate_ids(packages.values(), co_bookings).items():
+        package = packages[package_id]
+        scores = (
+            (similarity(package, packages[related_id], co_bookings.get(pair_key(package_id, related_id), 0)),
+             related_id)
+            for related_id in related_ids
+        )
+        # Best score first; ties go to the older package
+        best = heapq.nlargest(limit, scores, key=lambda candidate: (candidate[0], -candidate[1]))
+        rows.extend(
+            RelatedPackage(package_id=package_id, related_id=related_id, score=round(score, 4), rank=rank)
+            for rank, (score, related_id) in enumerate(best, start=1)
+        )
+
+    with transaction.atomic():
+        RelatedPackage.objects.all().delete()
+        RelatedPackage.objects.bulk_create(rows, batch_size=500)
+    # Cached detail pages show the previous recommendations
+    invalidate_pages()
+    return len(rows)
+
+
+def related_packages(package, limit=4):
+    """Cards of the packages recommended for `package`, best match first"""
+    recommended = list(Package.objects.cards().filter(
+        recommended_for__package=package,
+        available=True
+    ).order_by('recommended_for__rank')[:limit])
+
+    if recommended:
+        return recommended
+
+    # Not computed yet (new package): same category, as before
+    return Package.objects.cards().filter(
+        category=package.category_id,
+        available=True
+    ).exclude(id=package.id)[:limit]
@@ -0,0 +1,78 @@
+"""
+Full-text package search.
+
+Each package has a precomputed PackageSearchDocument (kept in sync by
+Package.save()). The documents are indexed by the database's own full-text
+engine, created in migration 0002:
+
+* SQLite: an FTS5 virtual table (packages_package_fts) maintained by triggers
+* PostgreSQL: a GIN index over the weighted tsvector of title and body
+
+The index is joined into the package query itself, so category, price and
+availability filters are applied by the same statement over every match, and
+results are ordered by their search_rank (higher is better) in SQL.
+
+Other databases fall back to a plain substring match on the documents.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+TOKEN_RE = re.compile(r'[^\W_]+')
+
+SQLITE_FTS_TABLE = 'packages_package_fts'
+
+# bm25() is lower for better matches; title hits weigh ten times body hits
+SQLITE_RANK_SQL = f'-bm25({SQLITE_FTS_TABLE}, 10.0, 1.0)'
+
+# Must match the expression of the GIN index created in migration 0002
+POSTGRES_VECTOR_SQL = (
+    "setweight(to_tsvector('simple', packages_packagesearchdocument.title), 'A') || "
+    "setweight(to_tsvector('simple', packages_packagesearchdocument.body), 'B')"
+)
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens"""
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def search_packages(queryset, query):
+    """Restrict a Package queryset to matches of every term of query (as prefixes), best first"""
+    terms = tokenize(query)
+    if not terms:
+        return queryset.none()
+
+    if connection.vendor == 'sqlite':
+        # Every term is a quoted prefix query, implicitly AND-ed
+        match = ' '.join(f'"{term}"*' for term in terms)
+        return queryset.extra(
+            select={'search_rank': SQLITE_RANK_SQL},
+            tables=[SQLITE_FTS_TABLE],
+            where=[
+                f'{SQLITE_FTS_TABLE}.rowid = packages_package.id',
+                f'{SQLITE_FTS_TABLE} MATCH %s',
+            ],
+            params=[match],
+        ).order_by('-search_rank')
+
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        return queryset.extra(
+            select={'search_rank': f"ts_rank({POSTGRES_VECTOR_SQL}, to_tsquery('simple', %s))"},
+            select_params=[tsquery],
+            tables=['packages_packagesearchdocument'],
+            where=[
+                'packages_packagesearchdocument.package_id = packages_package.id',
+                f"({POSTGRES_VECTOR_SQL}) @@ to_tsquery('simple', %s)",
+            ],
+            params=[tsquery],
+        ).order_by('-search_rank')
+
+    # No full-text engine available: substring match on the documents, unranked
+    for term in terms:
+        queryset = queryset.filter(
+            Q(search_document__title__contains=term) | Q(search_document__body__contains=term)
+        )
+    return queryset
@@ -0,0 +1,5 @@
+from .images import register_image_fields
+from .models import Package, PackageImage
+
+register_image_fields(Package, ['featured_image', 'image_2', 'image_3', 'image_4', 'image_5'])
+register_image_fields(PackageImage, ['image'])
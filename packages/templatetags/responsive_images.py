@@ -0,0 +1,54 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from packages.images import VARIANTS, stored_derivatives
+
+register = template.Library()
+
+# Default `sizes` attribute for the layout each variant is used in
+DEFAULT_SIZES = {
+    'thumb': '(min-width: 992px) 15vw, 25vw',
+    'card': '(min-width: 992px) 33vw, (min-width: 768px) 50vw, 100vw',
+    'hero': '(min-width: 992px) 66vw, 100vw',
+}
+
+
+def _srcset(names, fmt):
+    return ', '.join(
+        f'{default_storage.url(names[(variant, fmt)])} {width}w'
+        for variant, width in VARIANTS.items()
+    )
+
+
+@register.simple_tag
+def responsive_image(image, variant='card', sizes=None, **attrs):
+    """
+    Render an image field as a <picture> with WebP and JPEG srcsets.
+
+    Usage: {% responsive_image package.featured_image 'card' alt=package.name class='card-img-top' %}
+    Falls back to a plain <img> of the original until its derivatives are recorded
+    on the model (querysets must load the image_derivatives column).
+    """
+    attrs.setdefault('loading', 'lazy')
+    if not image:
+        return ''
+
+    names = stored_derivatives(image)
+    if names is None:
+        return format_html('<img src="{}"{}>', image.url, flatatt(attrs))
+
+    sizes = sizes or DEFAULT_SIZES.get(variant, '100vw')
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}>'
+        '</picture>',
+        _srcset(names, 'webp'),
+        sizes,
+        default_storage.url(names[(variant, 'jpeg')]),
+        _srcset(names, 'jpeg'),
+        sizes,
+        flatatt(attrs),
+    )
@@ -1,3 +1,1149 @@
-from django.test import TestCase
+import importlib
+import math
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path, PurePosixPath
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import QuerySet
+from django.template import Context, Template
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from docx import Document
+from PIL import Image
+
+from bookings.models import Booking
+from travel_agency import local_cache
+from travel_agency.testing import (
+    LOCMEM_CACHES, AdminQueryBudgetTestCase, QueryBudgetTestCase, bulk_create_packages, create_package
+)
+from .images import FORMATS, VARIANTS, derivative_name, generate_derivatives, has_derivatives
+from .importers import (
+    PARSER_VERSION, extract_content, file_hash, parse_document, parse_paragraphs, parse_sections,
+)
+from .itinerary import parse_itinerary
+from .management.commands.fetch_package_images import Command as FetchPackageImagesCommand
+from .management.commands.fetch_package_images import (
+    PHOTO_STORAGE_DIR, ImageCache, ProgressManifest, TokenBucket,
+)
+from .management.commands.import_packages import Command as ImportPackagesCommand
+from .models import (
+    Amenity, ImportedDocument, ItineraryDay, Package, PackageCategory, PackageImage, PackageQuerySet,
+    PackageReview, PackageSearchDocument, RelatedPackage,
+)
+from .pagination import (
+    KEYSET_ORDERINGS, InvalidCursor, decode_cursor, encode_cursor, keyset_filter, paginate_by_keyset,
+)
+from .recommendations import compute_recommendations, similarity
+from .search import search_packages
+from .view_counter import BUFFER_KEY, buffer_lock, flush_views, push_views, record_view
+
+
+class PackageQueryPlanTests(TestCase):
+    """Every public Package query must be served by an index, never a full table scan"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = PackageCategory.objects.create(name='Beach')
+        for i in range(20):
+            Package.objects.create(
+                name=f'Goa Package {i}',
+                category=cls.category,
+                description='Sun and sand',
+                short_description='Sun and sand',
+                price=Decimal(10000 + i * 500),
+                duration_days=1 + i % 4,
+                duration_nights=i % 4,
+                location='Goa',
+                destination_city='Goa',
+                inclusions='Hotel',
+                exclusions='Flights',
+                itinerary='Day 1: Arrival',
+                available=i % 5 != 0,
+                featured=i % 3 == 0,
+                popular=i % 4 == 0,
+            )
+        cls.package = Package.objects.filter(available=True).first()
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # The planner prefers sequential scans on tiny tables; only fail
+            # when no usable index exists at all
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        elif connection.vendor != 'sqlite':
+            self.skipTest(f'No query plan checks for {connection.vendor}')
+
+    def assertNoFullTableScan(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            full_scan = re.search(r'\bSCAN packages_package\b(?! USING)', plan)
+        else:
+            full_scan = re.search(r'Seq Scan on packages_package\b', plan)
+        self.assertIsNone(full_scan, f'Full table scan in query plan:\n{plan}\n{queryset.query}')
+
+    def available(self):
+        return Package.objects.filter(available=True)
+
+    def test_package_list_default_order(self):
+        self.assertNoFullTableScan(self.available())
+
+    def test_package_list_sorts(self):
+        for sort_by in ['price', '-price', 'duration_days', '-duration_days', '-created_at']:
+            with self.subTest(sort=sort_by):
+                self.assertNoFullTableScan(self.available().order_by(sort_by))
+
+    def test_package_list_price_range(self):
+        self.assertNoFullTableScan(
+            self.available().filter(price__gte=11000, price__lte=15000).order_by('price')
+        )
+
+    def test_package_list_category(self):
+        self.assertNoFullTableScan(self.available().filter(category__slug=self.category.slug))
+
+    def test_package_list_keyset_pages(self):
+        for sort_by, ordering in KEYSET_ORDERINGS.items():
+            values = [getattr(self.package, key.lstrip('-')) for key in ordering]
+            with self.subTest(sort=sort_by):
+                self.assertNoFullTableScan(
+                    self.available().order_by(*ordering).filter(keyset_filter(ordering, values))[:13]
+                )
+
+    def test_package_detail(self):
+        self.assertNoFullTableScan(Package.objects.filter(slug=self.package.slug, available=True))
+
+    def test_package_detail_related_packages(self):
+        self.assertNoFullTableScan(
+            self.available().filter(category=self.category).exclude(id=self.package.id)[:4]
+        )
+
+    def test_home_featured_packages(self):
+        self.assertNoFullTableScan(Package.objects.filter(featured=True, available=True)[:8])
+
+    def test_home_popular_packages(self):
+        self.assertNoFullTableScan(Package.objects.filter(popular=True, available=True)[:8])
+
+    def test_package_search(self):
+        self.assertNoFullTableScan(
+            search_packages(self.available().filter(category__slug=self.category.slug), 'goa')
+        )
+
+
+class SearchTests(TestCase):
+    """Full-text search: index sync, prefix matching, ranking and filters"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.beach = PackageCategory.objects.create(name='Beach')
+        cls.hills = PackageCategory.objects.create(name='Hills')
+        cls.kerala = create_package(cls.beach, 'Kerala Backwaters', destination_city='Alleppey',
+                                    location='Kerala')
+        cls.goa = create_package(cls.beach, 'Goa Beaches', description='Day trip to the Kerala border')
+        cls.munnar = create_package(cls.hills, 'Munnar Tea Hills', destination_city='Munnar',
+                                    location='Kerala', price=Decimal('5000'))
+
+    def search(self, query, queryset=None):
+        return list(search_packages(queryset or Package.objects.all(), query))
+
+    def test_prefix_matching(self):
+        self.assertEqual(set(self.search('keral')), {self.kerala, self.goa, self.munnar})
+        self.assertEqual(self.search('allep backw'), [self.kerala])
+        self.assertEqual(self.search('  '), [])
+
+    def test_title_matches_rank_first(self):
+        results = self.search('kerala')
+        self.assertEqual(results[-1], self.goa)
+        self.assertGreater(results[0].search_rank, results[-1].search_rank)
+
+    def test_filters_applied_inside_search(self):
+        self.assertEqual(self.search('kerala', Package.objects.filter(category=self.hills)), [self.munnar])
+        self.assertEqual(self.search('kerala', Package.objects.filter(price__gte=Decimal('6000')))[-1], self.goa)
+
+        # A filtered match ranked below hundreds of better ones is still found
+        PackageSearchDocument.objects.refresh_many(bulk_create_packages(self.beach, 600))
+        coorg = create_package(self.hills, 'Coorg', description='A coffee package')
+        self.assertEqual(self.search('package', Package.objects.filter(category=self.hills)), [coorg])
+        self.assertEqual(search_packages(Package.objects.all(), 'package').count(), 601)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.munnar.name = 'Coorg Coffee Hills'
+        self.munnar.save()
+        self.assertEqual(self.search('coorg'), [self.munnar])
+        self.assertEqual(self.search('munnar tea'), [])
+        self.munnar.delete()
+        self.assertEqual(self.search('coorg'), [])
+
+
+class PackageAdminQueryBudgetTests(AdminQueryBudgetTestCase):
+    """Package admin changelists must not run a query per row"""
+
+    @classmethod
+    def setUpTestData(cls):
+        categories = [PackageCategory.objects.create(name=f'Category {i}') for i in range(150)]
+        packages = bulk_create_packages(categories[0], 2000)
+        PackageImage.objects.bulk_create([
+            PackageImage(package=package, image=f'packages/gallery/{package.slug}.jpg')
+            for package in packages[:300]
+        ])
+        PackageReview.objects.bulk_create([
+            PackageReview(package=package, name='Guest', email='guest@example.com', rating=5, review='Great trip')
+            for package in packages
+        ])
+
+    def test_category_changelist(self):
+        self.assertChangelistQueries(8, PackageCategory)
+
+    def test_package_changelist(self):
+        self.assertChangelistQueries(10, Package)
+
+    def test_package_image_changelist(self):
+        self.assertChangelistQueries(9, PackageImage)
+
+    def test_package_review_changelist(self):
+        self.assertChangelistQueries(9, PackageReview)
+
+
+class PackageViewQueryBudgetTests(QueryBudgetTestCase):
+    """Query budgets of the package list and detail pages"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = PackageCategory.objects.create(name='Beach')
+        cls.packages = [create_package(cls.category, f'Goa Package {i}', featured=i < 3) for i in range(6)]
+        cls.package = cls.packages[0]
+        for i in range(3):
+            PackageImage.objects.create(package=cls.package, image=f'packages/gallery/goa_{i}.jpg', order=i)
+            PackageReview.objects.create(package=cls.package, name=f'Guest {i}', email=f'guest{i}@example.com',
+                                         rating=5, review='Great trip', approved=True)
+        compute_recommendations()
+
+    def test_package_list(self):
+        self.assertMaxQueries(18, reverse('packages:package_list'))
+
+    def test_package_list_filtered(self):
+        # One extra query for the full-text search ranking
+        self.assertMaxQueries(19, reverse('packages:package_list'), data={
+            'category': self.category.slug, 'search': 'goa', 'sort': 'price',
+        })
+
+    def test_package_list_cursor(self):
+        self.assertMaxQueries(17, reverse('packages:package_list'), data={'cursor': ''})
+
+    def test_package_detail(self):
+        response = self.assertMaxQueries(20, reverse('packages:package_detail', args=[self.package.slug]))
+        self.assertEqual(len(response.context['reviews']), 3)
+        self.assertEqual(len(response.context['gallery_images']), 3)
+        self.assertEqual(len(response.context['related_packages']), 4)
+
+
+class ApiTests(QueryBudgetTestCase):
+    """JSON API payloads, conditional GETs and query budgets"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = PackageCategory.objects.create(name='Beach')
+        cls.packages = [
+            create_package(cls.category, f'Goa Package {i}', price=Decimal(10000 + i)) for i in range(15)
+        ]
+        cls.package = cls.packages[0]
+
+    def test_package_list(self):
+        url = reverse('api:package_list')
+        response = self.assertMaxQueries(2, url, data={'sort': '-price'})
+        data = response.json()
+        self.assertEqual(len(data['results']), 12)
+        self.assertEqual(data['results'][0]['slug'], self.packages[-1].slug)
+        self.assertEqual(data['results'][0]['featured_image'], '/media/packages/featured/goa.jpg')
+        self.assertEqual(len(self.client.get(data['next']).json()['results']), 3)
+
+    def test_package_list_invalid_cursor(self):
+        url = reverse('api:package_list')
+        for cursor in ('not base64!', encode_cursor([True, None, None]), encode_cursor([1, 2, 3])):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('Invalid cursor', response.json()['error'])
+
+    def test_package_list_not_modified(self):
+        url = reverse('api:package_list')
+        etag = self.client.get(url, {'sort': 'price', 'category': 'beach'})['ETag']
+        self.assertEqual(self.client.get(f'{url}?category=beach&sort=price')['ETag'], etag)
+        self.assertNotEqual(self.client.get(url, {'sort': '-price'})['ETag'], etag)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'sort': 'price', 'category': 'beach'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.package.price = Decimal('5000')
+        self.package.save()
+        response = self.client.get(url, {'sort': 'price', 'category': 'beach'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['price'], '5000.00')
+
+    def test_package_detail(self):
+        url = reverse('api:package_detail', args=[self.package.slug])
+        response = self.assertMaxQueries(3, url)
+        data = response.json()
+        self.assertEqual(data['category'], 'beach')
+        self.assertEqual(data['inclusions_list'], ['Hotel', 'Breakfast'])
+        self.assertEqual([day['title'] for day in data['itinerary']], ['Arrival', 'Beaches', 'Departure'])
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(reverse('api:package_detail', args=['missing'])).status_code, 404)
+
+    def test_category_list(self):
+        url = reverse('api:category_list')
+        response = self.client.get(url)
+        self.assertEqual(response.json()['results'][0]['num_packages'], 15)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_package_list_invalid_filters(self):
+        url = reverse('api:package_list')
+        for params in ({'min_price': 'abc'}, {'max_price': 'NaN'}, {'sort': 'name'}):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('Invalid', response.json()['error'])
+                self.assertNotIn('ETag', response)
+        # The page ignores them instead
+        response = self.client.get(reverse('packages:package_list'), {'min_price': 'abc', 'sort': 'name'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_category_change_modifies_packages(self):
+        list_url = reverse('api:package_list')
+        detail_url = reverse('api:package_detail', args=[self.package.slug])
+        etags = [self.client.get(url, {'category': 'beach'})['ETag'] for url in (list_url, detail_url)]
+        self.category.slug = 'beaches'
+        self.category.save()
+        for url, etag in zip((list_url, detail_url), etags):
+            response = self.client.get(url, {'category': 'beach'}, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(list_url, {'category': 'beach'}).json()['results'], [])
+
+
+class PackageCardTests(QueryBudgetTestCase):
+    """Stored card columns stay in sync with prices, and cards() loads all a card renders"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = PackageCategory.objects.create(name='Beach', slug='beach')
+
+    def test_card_fields_on_save(self):
+        package = create_package(self.category, 'Goa Beach', price=Decimal('9000'),
+                                 original_price=Decimal('12000'), duration_days=4)
+        package.refresh_from_db()
+        self.assertEqual(package.discount_percentage, 25)
+        self.assertEqual(package.price_per_day, Decimal('2250.00'))
+
+        package.price = Decimal('6000')
+        package.save(update_fields=['price'])
+        package.refresh_from_db()
+        self.assertEqual(package.discount_percentage, 50)
+        self.assertEqual(package.price_per_day, Decimal('1500.00'))
+
+    def test_card_fields_on_import(self):
+        package_data = {'name': 'Goa Escape', 'destination': 'Goa', 'duration_days': 4, 'duration_nights': 3}
+        content = {'price': Decimal('9000'), 'original_price': Decimal('10000')}
+        package = ImportPackagesCommand().build_package(package_data, content, {'goa': self.category}, 0)
+        Package.objects.bulk_create([package])
+        package = Package.objects.get(name='Goa Escape')
+        self.assertEqual(package.discount_percentage, 10)
+        self.assertEqual(package.price_per_day, Decimal('2250.00'))
+
+    def test_cards_defer_large_fields(self):
+        create_package(self.category, 'Goa Beach')
+        deferred = Package.objects.cards().get().get_deferred_fields()
+        self.assertTrue({'description', 'itinerary', 'inclusions', 'exclusions'} <= deferred)
+        self.assertFalse(deferred & set(PackageQuerySet.CARD_FIELDS))
+
+    def count_queries(self, url):
+        for backend in caches.all():
+            backend.clear()
+        local_cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(context)
+
+    def test_cards_render_without_deferred_loads(self):
+        # A card reading a deferred column would add one query per package
+        create_package(self.category, 'Goa Beach', featured=True, popular=True, original_price=Decimal('12000'))
+        urls = [reverse('packages:package_list'), reverse('home')]
+        single = [self.count_queries(url) for url in urls]
+        for i in range(11):
+            create_package(self.category, f'Goa Package {i}', featured=True, popular=True,
+                           original_price=Decimal('12000'))
+        self.assertEqual([self.count_queries(url) for url in urls], single)
+
+
+
+class TokenBucketTests(SimpleTestCase):
+    """The Pexels rate limiter allows bursts up to capacity, then `rate` calls per second"""
+
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=20, capacity=3)
+        start = time.monotonic()
+        for _ in range(3):
+            bucket.acquire()
+        self.assertLess(time.monotonic() - start, 0.04)
+        bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    def test_shared_between_threads(self):
+        bucket = TokenBucket(rate=100, capacity=5)
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda _: bucket.acquire(), range(15)))
+        # 5 from the burst, 10 refilled at 100 per second
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        self.assertLess(bucket.tokens, 1)
+
+    def test_drain_until(self):
+        bucket = TokenBucket(rate=1000, capacity=10)
+        bucket.drain_until(time.time() + 0.1)
+        start = time.monotonic()
+        bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+class FetchPackageImagesResumeTests(TestCase):
+    """Finished packages are recorded so that an interrupted run resumes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = PackageCategory.objects.create(name='Beach', slug='beach')
+        cls.goa = create_package(category, 'Goa Beach', featured_image='')
+        cls.kerala = create_package(category, 'Kerala Backwaters', featured_image='', destination_city='Kochi')
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.manifest_path = Path(tmp_dir.name) / 'progress.json'
+        self.cache_dir = Path(tmp_dir.name) / 'cache'
+
+    def test_manifest_round_trip(self):
+        manifest = ProgressManifest(self.manifest_path)
+        self.assertFalse(manifest.is_completed(self.goa))
+        manifest.mark_completed(self.goa, 3)
+        self.assertEqual(list(self.manifest_path.parent.glob('*.tmp')), [])
+
+        manifest = ProgressManifest(self.manifest_path)
+        self.assertTrue(manifest.is_completed(self.goa))
+        self.assertFalse(manifest.is_completed(self.kerala))
+        manifest.delete()
+        self.assertFalse(self.manifest_path.exists())
+
+    def test_corrupt_manifest(self):
+        self.manifest_path.write_text('{"completed": ')
+        self.assertFalse(ProgressManifest(self.manifest_path).is_completed(self.goa))
+
+    def fetch(self, fetch_images):
+        with mock.patch.object(FetchPackageImagesCommand, 'fetch_images', side_effect=fetch_images), \
+                mock.patch.object(FetchPackageImagesCommand, 'store_photo',
+                                  side_effect=lambda image: f"packages/pexels/{image['id']}.jpg"), \
+                mock.patch('packages.images.generate_derivatives'):
+            call_command('fetch_package_images', api_key='key', workers=2, images_per_package=1,
+                         manifest=str(self.manifest_path), cache_dir=str(self.cache_dir), stdout=StringIO())
+
+    def test_resume_after_errors(self):
+        def fail_for_kochi(query, per_page):
+            if query == 'Kochi':
+                raise ConnectionError('network down')
+            return [{'id': query, 'url': f'https://images.example.com/{query}.jpg'}]
+
+        self.fetch(fail_for_kochi)
+        self.assertTrue(ProgressManifest(self.manifest_path).is_completed(self.goa))
+        self.assertFalse(ProgressManifest(self.manifest_path).is_completed(self.kerala))
+
+        fetched = []
+        self.fetch(lambda query, per_page: fetched.append(query) or [{'id': query, 'url': 'https://x/y.jpg'}])
+        # Only the package that failed is fetched again, and a clean run forgets the progress
+        self.assertEqual(fetched, ['Kochi'])
+        self.assertEqual(Package.objects.get(pk=self.kerala.pk).featured_image.name, 'packages/pexels/Kochi.jpg')
+        self.assertFalse(self.manifest_path.exists())
+
+
+
+class ImageCacheTests(SimpleTestCase):
+    """Pexels searches and photos are reused from the content-addressed cache"""
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.cache = ImageCache(Path(tmp_dir.name) / 'cache')
+        media_root = override_settings(MEDIA_ROOT=str(Path(tmp_dir.name) / 'media'))
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+    def test_search_cache_expiry(self):
+        photos = [{'id': 1, 'url': 'https://images.example.com/1.jpg'}]
+        self.assertIsNone(self.cache.get_search('Goa|5', max_age=60))
+        self.cache.set_search('Goa|5', photos)
+        self.assertEqual(self.cache.get_search('Goa|5', max_age=60), photos)
+        self.assertIsNone(self.cache.get_search('Goa|5', max_age=-1))
+
+    def test_photo_by_content_hash(self):
+        digest = self.cache.set_photo(1, 'https://images.example.com/1.jpg', b'beach')
+        self.assertEqual(self.cache.get_photo(1, 'https://images.example.com/1.jpg'), (digest, b'beach'))
+        # A new URL for the same photo id means Pexels changed the photo
+        self.assertIsNone(self.cache.get_photo(1, 'https://images.example.com/1-v2.jpg'))
+        # Identical bytes are stored once, and the index survives a restart
+        self.assertEqual(self.cache.set_photo(2, 'https://images.example.com/2.jpg', b'beach'), digest)
+        self.assertEqual(len(list((self.cache.path / 'objects').iterdir())), 1)
+        self.assertEqual(ImageCache(self.cache.path).get_photo(2, 'https://images.example.com/2.jpg'),
+                         (digest, b'beach'))
+
+    def test_store_photo_downloads_once(self):
+        command = FetchPackageImagesCommand()
+        command.image_cache = self.cache
+        command.session = mock.Mock()
+        command.session.get.return_value = mock.Mock(content=b'beach', status_code=200)
+
+        name = command.store_photo({'id': 1, 'url': 'https://images.example.com/1.jpg'})
+        self.assertEqual(command.store_photo({'id': 1, 'url': 'https://images.example.com/1.jpg'}), name)
+        self.assertEqual(command.session.get.call_count, 1)
+        # Another photo with the same bytes shares the media file
+        self.assertEqual(command.store_photo({'id': 2, 'url': 'https://images.example.com/2.jpg'}), name)
+        self.assertEqual(default_storage.listdir(PHOTO_STORAGE_DIR)[1], [PurePosixPath(name).name])
+
+
+
+def image_file(width, height, fmt='JPEG'):
+    """Bytes of a solid-colour test image"""
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), 'teal').save(buffer, format=fmt)
+    return ContentFile(buffer.getvalue())
+
+
+class ImageDerivativeTests(TestCase):
+    """Uploaded images get WebP/JPEG variants rendered as a <picture> srcset"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = PackageCategory.objects.create(name='Beach', slug='beach')
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        media_root = override_settings(MEDIA_ROOT=tmp_dir.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        cache.clear()
+        self.name = default_storage.save('packages/featured/goa.jpg', image_file(2000, 1000))
+
+    def test_generate_derivatives(self):
+        self.assertFalse(has_derivatives(self.name))
+        self.assertEqual(generate_derivatives(self.name), len(VARIANTS) * len(FORMATS))
+        for variant, width in VARIANTS.items():
+            for fmt, (extension, _) in FORMATS.items():
+                with default_storage.open(derivative_name(self.name, variant, fmt)) as file:
+                    derivative = Image.open(file)
+                    self.assertEqual(derivative.size, (width, width // 2))
+                    self.assertEqual(derivative.format, 'JPEG' if fmt == 'jpeg' else 'WEBP')
+        self.assertTrue(has_derivatives(self.name))
+        self.assertEqual(generate_derivatives(self.name), 0)
+
+    def test_small_images_not_upscaled(self):
+        name = default_storage.save('packages/featured/small.png', image_file(300, 200, 'PNG'))
+        generate_derivatives(name)
+        with default_storage.open(derivative_name(name, 'hero', 'webp')) as file:
+            self.assertEqual(Image.open(file).size, (300, 200))
+
+    def test_generated_on_save(self):
+        package = create_package(self.category, 'Goa Beach', featured_image='')
+        package.featured_image = self.name
+        package.save()
+        self.assertTrue(has_derivatives(self.name))
+        # Unchanged images are not processed again
+        with mock.patch('packages.images.generate_derivatives') as generate:
+            package.save()
+        generate.assert_not_called()
+
+    def test_negative_lookup_cached_until_generated(self):
+        self.assertFalse(has_derivatives(self.name))
+        with mock.patch.object(default_storage, 'exists') as exists:
+            self.assertFalse(has_derivatives(self.name))
+        exists.assert_not_called()
+        generate_derivatives(self.name)
+        self.assertTrue(has_derivatives(self.name))
+
+    def test_srcset_tag(self):
+        template = Template("{% load responsive_images %}{% responsive_image image 'card' alt='Goa' %}")
+        html = template.render(Context({'image': Package(featured_image=self.name).featured_image}))
+        self.assertHTMLEqual(html, f'<img src="/media/{self.name}" alt="Goa" loading="lazy">')
+
+        # The names are read from the instance, never from the cache or storage
+        package = create_package(self.category, 'Goa Beach', featured_image='')
+        package.featured_image = self.name
+        package.save()
+        package = Package.objects.cards().get(pk=package.pk)
+        with self.assertNumQueries(0), mock.patch.object(default_storage, 'exists') as exists:
+            html = template.render(Context({'image': package.featured_image}))
+        exists.assert_not_called()
+        self.assertIn('<source type="image/webp" srcset="/media/derivatives/packages/featured/goa_thumb.webp 320w, '
+                      '/media/derivatives/packages/featured/goa_card.webp 640w, '
+                      '/media/derivatives/packages/featured/goa_hero.webp 1280w"', html)
+        self.assertIn('src="/media/derivatives/packages/featured/goa_card.jpg"', html)
+        self.assertEqual(template.render(Context({'image': Package().featured_image})), '')
+
+    def test_storage_renamed_derivative(self):
+        # Storages may not keep the requested name; the tag must link the stored file
+        save = default_storage.save
+        with mock.patch.object(default_storage, 'save',
+                               side_effect=lambda name, content: save(name.replace('_card', '_card_x7'), content)):
+            package = create_package(self.category, 'Goa Beach', featured_image='')
+            package.featured_image = self.name
+            package.save()
+        html = Template("{% load responsive_images %}{% responsive_image image %}").render(
+            Context({'image': Package.objects.get(pk=package.pk).featured_image})
+        )
+        self.assertIn('/media/derivatives/packages/featured/goa_card_x7.jpg', html)
+        self.assertIn('goa_card_x7.webp 640w', html)
+
+    def test_command_records_names(self):
+        package = create_package(self.category, 'Goa Beach', featured_image='')
+        Package.objects.filter(pk=package.pk).update(featured_image=self.name)
+        call_command('generate_image_derivatives', stdout=StringIO())
+        package.refresh_from_db()
+        self.assertEqual(package.image_derivatives['featured_image']['variants']['card'],
+                         {'webp': derivative_name(self.name, 'card', 'webp'),
+                          'jpeg': derivative_name(self.name, 'card', 'jpeg')})
+
+
+
+def write_document(path, lines):
+    """Save a package .docx with one paragraph per line"""
+    document = Document()
+    for line in lines:
+        document.add_paragraph(line)
+    document.save(path)
+
+
+class RecommendationTests(TestCase):
+    """Related packages are scored within shared groups and ranked best first"""
+
+    @classmethod
+    def setUpTestData(cls):
+        beach = PackageCategory.objects.create(name='Beach', slug='beach')
+        hills = PackageCategory.objects.create(name='Hills', slug='hills')
+        cls.goa = create_package(beach, 'Goa Beach', destination_state='Goa', price=Decimal('10000'))
+        cls.goa_forts = create_package(beach, 'Goa Forts', destination_state='Goa', price=Decimal('10000'))
+        cls.goa_long = create_package(beach, 'Goa Long Stay', destination_state='Goa', duration_days=9,
+                                      price=Decimal('30000'))
+        cls.kerala = create_package(beach, 'Kerala Beach', destination_state='Kerala',
+                                    destination_city='Kovalam', price=Decimal('10000'))
+        cls.ooty = create_package(hills, 'Ooty Hills', destination_state='Tamil Nadu',
+                                  destination_city='Ooty', price=Decimal('10000'))
+        cls.munnar = create_package(hills, 'Munnar Hills', destination_state='Kerala',
+                                    destination_city='Munnar', price=Decimal('10000'))
+
+    def values(self, package):
+        return Package.objects.values(
+            'id', 'category_id', 'destination_state', 'destination_city', 'duration_days', 'price',
+        ).get(pk=package.pk)
+
+    def related(self, package):
+        return list(RelatedPackage.objects.filter(package=package).values_list('related_id', flat=True))
+
+    def test_similarity(self):
+        goa, goa_forts, ooty = self.values(self.goa), self.values(self.goa_forts), self.values(self.ooty)
+        # Category, state and city, with the same duration and price
+        self.assertAlmostEqual(similarity(goa, goa_forts), 3.0 + 2.0 + 1.0 + 1.5 + 1.5)
+        self.assertAlmostEqual(similarity(goa, self.values(self.goa_long)),
+                               3.0 + 2.0 + 1.0 + 1.5 / 7 + 1.5 / 3)
+        self.assertAlmostEqual(similarity(goa, ooty), 3.0)
+        self.assertAlmostEqual(similarity(goa, ooty, co_bookings=2), 3.0 + 2.0 * math.log1p(2))
+
+    def test_ranking(self):
+        compute_recommendations()
+        self.assertEqual(self.related(self.goa), [self.goa_forts.id, self.goa_long.id, self.kerala.id])
+        self.assertEqual(self.related(self.munnar), [self.ooty.id, self.kerala.id])
+        self.assertEqual(
+            list(RelatedPackage.objects.filter(package=self.goa).values_list('rank', flat=True)), [1, 2, 3]
+        )
+
+        compute_recommendations(limit=1)
+        self.assertEqual(self.related(self.goa), [self.goa_forts.id])
+
+    def test_ties_go_to_older_package(self):
+        compute_recommendations()
+        # Goa Beach and Goa Forts share the category only, with equal scores
+        self.assertEqual(self.related(self.kerala),
+                         [self.goa.id, self.goa_forts.id, self.munnar.id, self.goa_long.id])
+
+    def test_only_related_pairs_scored(self):
+        with mock.patch('packages.recommendations.similarity', wraps=similarity) as score:
+            compute_recommendations()
+        # 30 ordered pairs in all; only those sharing a category, state or city are scored
+        self.assertEqual(score.call_count, 16)
+        self.assertNotIn(self.ooty.id, self.related(self.goa))
+
+    def test_co_bookings(self):
+        for package in (self.goa, self.ooty):
+            Booking.objects.create(package=package, full_name='Guest', email='Guest@example.com',
+                                   phone='9999999999', address='1 Beach Road', city='Panaji', state='Goa',
+                                   pincode='403001', number_of_people=2, total_price=Decimal('20000'),
+                                   travel_date=timezone.localdate() + timedelta(days=30))
+        compute_recommendations()
+        self.assertIn(self.ooty.id, self.related(self.goa))
+        self.assertIn(self.goa.id, self.related(self.ooty))
+
+        Booking.objects.update(booking_status='cancelled')
+        compute_recommendations()
+        self.assertNotIn(self.ooty.id, self.related(self.goa))
+
+
+
+class InclusionListTests(TestCase):
+    """Parsed list columns and amenity links follow the inclusion texts"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = PackageCategory.objects.create(name='Beach', slug='beach')
+
+    def test_lists_on_save(self):
+        package = create_package(self.category, 'Goa Beach', inclusions='Hotel\n\n  Breakfast \n',
+                                 highlights='')
+        package.refresh_from_db()
+        self.assertEqual(package.inclusions_list, ['Hotel', 'Breakfast'])
+        self.assertEqual(package.exclusions_list, ['Flights'])
+        self.assertEqual(package.highlights_list, [])
+
+        package.exclusions = 'Flights\nVisa'
+        package.save(update_fields=['exclusions'])
+        package.refresh_from_db()
+        self.assertEqual(package.exclusions_list, ['Flights', 'Visa'])
+
+    def test_with_inclusion(self):
+        goa = create_package(self.category, 'Goa Beach', inclusions='Hotel\nGuided  Sightseeing')
+        kerala = create_package(self.category, 'Kerala Backwaters', inclusions='Houseboat\nguided sightseeing')
+        create_package(self.category, 'Ooty Hills', inclusions='Hotel')
+
+        self.assertQuerySetEqual(Package.objects.with_inclusion('Guided sightseeing').order_by('id'),
+                                 [goa, kerala])
+        self.assertEqual(Amenity.objects.filter(key='guided sightseeing').count(), 1)
+
+        kerala.inclusions = 'Houseboat'
+        kerala.save()
+        self.assertQuerySetEqual(Package.objects.with_inclusion('guided sightseeing'), [goa])
+        self.assertQuerySetEqual(Package.objects.with_inclusion('Houseboat'), [kerala])
+
+    def test_refresh_many(self):
+        packages = bulk_create_packages(self.category, 3)
+        for package in packages:
+            package.inclusions_list = package.get_inclusions_list()
+        Amenity.objects.refresh_many(packages)
+        self.assertEqual(Package.objects.with_inclusion('hotel').count(), 3)
+
+
+
+class ItineraryDayTests(TestCase):
+    """The free-text itinerary is mirrored into one ItineraryDay row per day"""
+
+    DOCUMENT = '\n'.join([
+        'Mangalore: 2 Day 1 night Tour Package',
+        'Duration: 36 hours',
+        'Price: ₹2999 per person',
+        '---',
+        'About the Tour',
+        'Two days along the coast.',
+        'Highlights.',
+        "1.St. Mary's Island",
+        'Day 2',
+        'Inclusions',
+        'Pickup & Drop',
+        'Excludes',
+        'Entry fees & parking',
+        'Itinerary',
+        'Day 1',
+        "1. St. Mary's Island 9am",
+        'Drop at stay 6pm',
+        'Day 2',
+        '1. Sri Krishna Temple Udupi 9am',
+        'Drop off 6pm',
+        '---',
+        'Tour Provider',
+        'Guide Me Now',
+    ])
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = PackageCategory.objects.create(name='Beach', slug='beach')
+
+    def days(self, package):
+        return list(package.itinerary_days.values_list('day_number', 'title', 'activities'))
+
+    def test_parse_itinerary(self):
+        self.assertEqual(parse_itinerary('Arrive in the evening\n* Dinner'), [
+            {'day_number': 1, 'title': '', 'activities': ['Arrive in the evening', 'Dinner']},
+        ])
+        self.assertEqual(parse_itinerary('DAY 2 - Forts\n1. Aguada\nday 1. Arrival\n\nDay 2\n- Chapora'), [
+            {'day_number': 1, 'title': 'Arrival', 'activities': []},
+            {'day_number': 2, 'title': 'Forts', 'activities': ['Aguada', 'Chapora']},
+        ])
+        self.assertEqual(parse_itinerary(''), [])
+
+    def test_parse_itinerary_section(self):
+        # Only the "Itinerary" section of a full document is split
+        self.assertEqual(parse_itinerary(self.DOCUMENT), [
+            {'day_number': 1, 'title': '', 'activities': ["St. Mary's Island 9am", 'Drop at stay 6pm']},
+            {'day_number': 2, 'title': '', 'activities': ['Sri Krishna Temple Udupi 9am', 'Drop off 6pm']},
+        ])
+        # An unlabelled first day keeps its activities
+        self.assertEqual(parse_itinerary('Itinerary (1 Day)\n1.Kodanad view point\n(Day-2)\n1.Pykara falls\n---'), [
+            {'day_number': 1, 'title': '', 'activities': ['Kodanad view point']},
+            {'day_number': 2, 'title': '', 'activities': ['Pykara falls']},
+        ])
+        # Text before a "Day 1" heading is not part of any day
+        self.assertEqual(parse_itinerary('Four days of beaches\nDay 1: Arrival\n- Check-in'), [
+            {'day_number': 1, 'title': 'Arrival', 'activities': ['Check-in']},
+        ])
+
+    def test_rows_on_save(self):
+        package = create_package(self.category, 'Goa Beach')
+        self.assertEqual(self.days(package), [
+            (1, 'Arrival', ['Check-in']), (2, 'Beaches', []), (3, 'Departure', []),
+        ])
+
+        package.itinerary = 'Day 1: Arrival\n- Dinner cruise'
+        package.save()
+        self.assertEqual(self.days(package), [(1, 'Arrival', ['Dinner cruise'])])
+
+        # Saves of other fields leave the rows alone
+        with mock.patch.object(ItineraryDay.objects, 'refresh') as refresh:
+            package.save(update_fields=['price'])
+        refresh.assert_not_called()
+
+    def test_refresh_many(self):
+        packages = bulk_create_packages(self.category, 3)
+        self.assertFalse(ItineraryDay.objects.exists())
+        ItineraryDay.objects.refresh_many(packages)
+        self.assertEqual([self.days(package) for package in packages], [[(1, 'Arrival', [])]] * 3)
+
+    def test_migration_backfill(self):
+        # The migration keeps its own copy of the parser; it must agree with the current one
+        migration = importlib.import_module('packages.migrations.0006_itineraryday')
+        package = create_package(self.category, 'Goa Beach')
+        expected = self.days(package)
+        ItineraryDay.objects.all().delete()
+        migration.split_itineraries(apps, None)
+        self.assertEqual(self.days(package), expected)
+
+    def test_migration_backfill_document(self):
+        # Packages imported before the section parser hold the whole document
+        migration = importlib.import_module('packages.migrations.0006_itineraryday')
+        package = create_package(self.category, 'Mangalore Beaches', itinerary=self.DOCUMENT)
+        ItineraryDay.objects.all().delete()
+        migration.split_itineraries(apps, None)
+        self.assertEqual(self.days(package), [
+            (1, '', ["St. Mary's Island 9am", 'Drop at stay 6pm']),
+            (2, '', ['Sri Krishna Temple Udupi 9am', 'Drop off 6pm']),
+        ])
+
+
+
+class DocumentParserTests(SimpleTestCase):
+    """Package documents are split into sections in one pass and cached by file hash"""
+
+    LINES = [
+        'Goa Beach Holiday',
+        'Duration: 4 Days / 3 Nights',
+        'Price: Rs. 15,999 per person',
+        'About the Tour:',
+        'Sun and sand.',
+        'Highlights',
+        '1. Baga beach',
+        'Day 2: Old Goa',
+        'Inclusions',
+        '1) Hotel',
+        'Breakfast',
+        '---',
+        'Ignored line',
+        'Itinerary',
+        'Day 1: Arrival',
+        '1. Check-in',
+        'Day 2',
+        'Beaches',
+        'Tour Provider',
+        'Goa Trips Pvt Ltd',
+    ]
+
+    def test_sections(self):
+        sections = parse_paragraphs(self.LINES)
+        self.assertEqual(sections['title'], 'Goa Beach Holiday')
+        self.assertEqual(sections['details']['duration'], '4 Days / 3 Nights')
+        self.assertEqual(sections['price'], 15999)
+        self.assertEqual(sections['description'], ['Sun and sand.'])
+        self.assertEqual(sections['highlights'], ['Baga beach'])
+        self.assertEqual(sections['inclusions'], ['Hotel', 'Breakfast'])
+        self.assertEqual(sections['exclusions'], [])
+        self.assertEqual(sections['itinerary'], [
+            {'day': 1, 'title': 'Arrival', 'activities': ['Check-in']},
+            {'day': 2, 'title': '', 'activities': ['Beaches']},
+        ])
+
+    def test_single_day_itinerary(self):
+        sections = parse_paragraphs(['Ooty Day Trip', 'Itinerary', 'Botanical garden', 'Lake'])
+        self.assertEqual(sections['itinerary'], [{'day': 1, 'title': '', 'activities': ['Botanical garden', 'Lake']}])
+        sections = parse_paragraphs(['Ooty', 'Itinerary (1 Day)', '1.Botanical garden', '(Day-2)', '1.Lake'])
+        self.assertEqual(sections['itinerary'], [
+            {'day': 1, 'title': '', 'activities': ['Botanical garden']},
+            {'day': 2, 'title': '', 'activities': ['Lake']},
+        ])
+
+    def test_content(self):
+        content = extract_content(parse_paragraphs(self.LINES))
+        self.assertEqual(content['inclusions'], 'Hotel\nBreakfast')
+        self.assertEqual(content['itinerary'], 'Day 1: Arrival\n- Check-in\n\nDay 2\n- Beaches')
+        self.assertEqual(content['price'], 15999)
+        # Missing sections are left out so that defaults or current values apply
+        self.assertNotIn('exclusions', extract_content(parse_paragraphs(['Goa', 'Inclusions', 'Hotel'])))
+
+    def test_parse_cache(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'Goa - 4 Days 3 Nights.docx'
+            write_document(path, self.LINES)
+            digest = file_hash(path)
+            cache_dir = Path(tmp_dir) / 'cache'
+
+            sections = parse_sections(path, digest, cache_dir)
+            self.assertTrue((cache_dir / f'v{PARSER_VERSION}-{digest}.json').exists())
+            with mock.patch('packages.importers.Document') as open_document:
+                self.assertEqual(parse_sections(path, digest, cache_dir), sections)
+            open_document.assert_not_called()
+
+            # A damaged cache file is parsed again and replaced
+            (cache_dir / f'v{PARSER_VERSION}-{digest}.json').write_text('{')
+            self.assertEqual(parse_sections(path, digest, cache_dir), sections)
+            self.assertEqual(parse_document(path, digest, cache_dir)['package_data']['duration_days'], 4)
+
+
+
+class ImportPackagesTests(TestCase):
+    """Documents are re-imported only when their contents change"""
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.docs_dir = Path(tmp_dir.name) / 'docs'
+        self.docs_dir.mkdir()
+        self.cache_dir = Path(tmp_dir.name) / 'cache'
+        self.document = self.docs_dir / 'Goa - 4 Days 3 Nights Tour Package.docx'
+        write_document(self.document, [
+            'Goa Tour Package', 'Price: Rs. 15,000 per person',
+            'Inclusions', 'Hotel', 'Breakfast',
+            'Itinerary', 'Day 1: Arrival', '- Check-in', 'Day 2: Beaches',
+        ])
+
+    def run_import(self, **options):
+        out = StringIO()
+        call_command('import_packages', docs_dir=str(self.docs_dir), cache_dir=str(self.cache_dir),
+                     workers=1, stdout=out, **options)
+        return out.getvalue()
+
+    def test_import(self):
+        output = self.run_import()
+        self.assertIn('Imported: 1 packages', output)
+        package = Package.objects.get()
+        self.assertEqual(package.price, 15000)
+        self.assertEqual(package.inclusions_list, ['Hotel', 'Breakfast'])
+        self.assertEqual(ImportedDocument.objects.get().package, package)
+
+    def test_unchanged_file_not_opened(self):
+        self.run_import()
+        with mock.patch('packages.management.commands.import_packages.file_hash') as hash_file:
+            output = self.run_import()
+        hash_file.assert_not_called()
+        self.assertIn('Unchanged since last import: 1 files', output)
+        self.assertIn('Updated: 0 packages', output)
+
+    def test_touched_file_matched_by_hash(self):
+        self.run_import()
+        stat = self.document.stat()
+        os.utime(self.document, (stat.st_atime, stat.st_mtime + 60))
+        with mock.patch('packages.management.commands.import_packages.parse_document') as parse:
+            output = self.run_import()
+        parse.assert_not_called()
+        self.assertIn('Updated: 0 packages', output)
+        self.assertEqual(ImportedDocument.objects.get().mtime, stat.st_mtime + 60)
+
+    def test_changed_file_keeps_unparsed_fields(self):
+        self.run_import()
+        package = Package.objects.get()
+        package.itinerary = 'Day 1: Welcome dinner'
+        package.save()
+
+        # The new version has no itinerary section: the admin's itinerary stays
+        write_document(self.document, ['Goa Tour Package', 'Inclusions', 'Hotel', 'Dinner'])
+        self.assertIn('Updated: 1 packages', self.run_import())
+        package.refresh_from_db()
+        self.assertEqual(package.inclusions_list, ['Hotel', 'Dinner'])
+        self.assertEqual(package.itinerary, 'Day 1: Welcome dinner')
+        self.assertEqual(list(package.itinerary_days.values_list('title', flat=True)), ['Welcome dinner'])
+
+    def test_existing_package_adopted(self):
+        # Imported before documents were tracked, with the whole document as its text
+        category = PackageCategory.objects.create(name='Beach', slug='beach')
+        package = create_package(category, '4D/3N Goa Tour Package', inclusions='Goa Tour Package\nInclusions\nHotel')
+        self.assertIn('Updated: 1 packages', self.run_import())
+        package.refresh_from_db()
+        self.assertEqual(package.inclusions_list, ['Hotel', 'Breakfast'])
+        self.assertEqual(list(package.itinerary_days.values_list('title', flat=True)), ['Arrival', 'Beaches'])
+        self.assertEqual(ImportedDocument.objects.get().package, package)
+
+        # A second document with the same package name is skipped
+        write_document(self.docs_dir / 'Goa - 4 Days 3 Nights.docx', ['Goa', 'Inclusions', 'Spa'])
+        self.assertIn('Skipped (exists): 4D/3N Goa Tour Package', self.run_import())
+        package.refresh_from_db()
+        self.assertEqual(package.inclusions_list, ['Hotel', 'Breakfast'])
+
+    def test_dry_run_saves_nothing(self):
+        output = self.run_import(dry_run=True)
+        self.assertIn('Goa - 4 Days 3 Nights Tour Package.docx -> 4D/3N Goa Tour Package', output)
+        self.assertFalse(PackageCategory.objects.exists())
+        self.assertFalse(Package.objects.exists())
+        self.assertFalse(ImportedDocument.objects.exists())
+
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages cover every row once, in order, and reject forged cursors"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = PackageCategory.objects.create(name='Beach', slug='beach')
+        bulk_create_packages(category, 30)
+        # Ties on every sort key, so only the id tiebreaker orders these rows
+        Package.objects.filter(id__lte=Package.objects.order_by('id')[10].id).update(
+            price=Decimal('12000'), duration_days=5, featured=True, created_at=timezone.now()
+        )
+
+    def test_cursor_round_trip(self):
+        for sort_by, ordering in KEYSET_ORDERINGS.items():
+            with self.subTest(sort_by=sort_by):
+                expected = list(Package.objects.order_by(*ordering).values_list('id', flat=True))
+                seen, cursor = [], None
+                while True:
+                    page = paginate_by_keyset(Package.objects.all(), sort_by, cursor, per_page=7)
+                    seen += [package.id for package in page]
+                    if not page.has_next:
+                        break
+                    cursor = page.next_cursor
+                self.assertEqual(seen, expected)
+
+    def test_decode_cursor(self):
+        package = Package.objects.order_by('id').first()
+        ordering = KEYSET_ORDERINGS['-featured']
+        values = [package.featured, package.created_at, package.id]
+        self.assertEqual(decode_cursor(encode_cursor(values), Package, ordering), values)
+
+    def test_invalid_cursors(self):
+        ordering = KEYSET_ORDERINGS['-featured']
+        forged = [[1, 2, 3], [True, None, None], [True, {}, 1], [True, '2024-01-01T00:00:00'], {'id': 1}, 'x']
+        cursors = [encode_cursor(values) for values in forged] + ['not base64!', '', '=']
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor, Package, ordering))
+                with self.assertRaises(InvalidCursor):
+                    paginate_by_keyset(Package.objects.all(), '-featured', cursor or '=')
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_invalid_cursor_shows_first_page(self):
+        response = self.client.get(reverse('packages:package_list'), {'cursor': encode_cursor([True, None, None])})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['packages']), 12)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, PACKAGE_VIEWS_FLUSH_INTERVAL=3600)
+class ViewCounterTests(TestCase):
+    """Views are buffered per worker, merged in the shared cache and drained once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = PackageCategory.objects.create(name='Beach', slug='beach')
+        cls.package = create_package(category, 'Goa Beach')
+        cls.other = create_package(category, 'Goa Forts')
+
+    def setUp(self):
+        cache.clear()
+        flush_views()
+
+    def views(self, package):
+        return Package.objects.get(pk=package.pk).views
+
+    def test_views_buffered_until_flush(self):
+        for _ in range(3):
+            record_view(self.package.id)
+        record_view(self.other.id)
+        self.assertEqual(self.views(self.package), 0)
+
+        self.assertEqual(flush_views(), 4)
+        self.assertEqual(self.views(self.package), 3)
+        self.assertEqual(self.views(self.other), 1)
+        self.assertIsNone(cache.get(BUFFER_KEY))
+
+    def test_flush_command_drains_other_workers(self):
+        # Counts another worker pushed before this process counted its own
+        cache.set(BUFFER_KEY, {self.package.id: 5}, timeout=None)
+        record_view(self.package.id)
+        self.assertEqual(push_views(), 1)
+        self.assertEqual(cache.get(BUFFER_KEY), {self.package.id: 6})
+
+        out = StringIO()
+        call_command('flush_package_views', stdout=out)
+        self.assertIn('Flushed 6 buffered views', out.getvalue())
+        self.assertEqual(self.views(self.package), 6)
+
+    def test_repeated_flushes_count_once(self):
+        record_view(self.package.id)
+        record_view(self.package.id)
+        self.assertEqual(flush_views(), 2)
+        self.assertEqual(flush_views(), 0)
+        self.assertEqual(self.views(self.package), 2)
+
+    def test_flush_waits_for_other_drain(self):
+        record_view(self.package.id)
+        # Another process is draining the buffer: keep the views for the next flush
+        with buffer_lock() as locked, mock.patch('packages.view_counter.LOCK_WAIT', 0):
+            self.assertTrue(locked)
+            self.assertEqual(flush_views(), 0)
+        self.assertEqual(self.views(self.package), 0)
+        self.assertEqual(flush_views(), 1)
+        self.assertEqual(self.views(self.package), 1)
+
+    def test_request_flush_does_not_wait(self):
+        with buffer_lock(), mock.patch('packages.view_counter.time.sleep', side_effect=AssertionError):
+            with self.settings(PACKAGE_VIEWS_FLUSH_INTERVAL=0):
+                record_view(self.package.id)
+        self.assertEqual(self.views(self.package), 0)
+        self.assertEqual(flush_views(), 1)
+        self.assertEqual(self.views(self.package), 1)
+
+    def test_failed_write_keeps_views(self):
+        record_view(self.package.id)
+        with mock.patch.object(QuerySet, 'update', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                flush_views()
+        self.assertEqual(flush_views(), 1)
+        self.assertEqual(self.views(self.package), 1)
+
+    def test_flush_interval(self):
+        with self.settings(PACKAGE_VIEWS_FLUSH_INTERVAL=0):
+            record_view(self.package.id)
+        self.assertEqual(self.views(self.package), 1)
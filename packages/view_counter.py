@@ -0,0 +1,142 @@
+"""
+Buffered page-view counting for packages.
+
+Detail page hits only increment a counter in the worker's memory. Every
+PACKAGE_VIEWS_FLUSH_INTERVAL seconds (and at exit) the worker moves its
+counts into a buffer in the shared cache and drains that buffer into the
+database with one ``F('views') + n`` update per package, instead of a row
+write on every request.
+
+The shared buffer is a single cache entry ({package_id: count}) that is only
+read and written while holding a lock taken with cache.add(), so merging and
+draining are atomic on every backend: a drain reads and resets the buffer in
+one step, and concurrent drains can't count the same views twice. A flush
+started by a request tries the lock once and, if another process holds it,
+leaves the counts for a later flush instead of making the visitor wait.
+``manage.py flush_package_views`` drains it from any process.
+"""
+import atexit
+import logging
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Package
+
+logger = logging.getLogger(__name__)
+
+BUFFER_KEY = 'package_views'
+LOCK_KEY = 'package_views:lock'
+
+# A lock left by a crashed process expires after this many seconds
+# (it is only held for a cache read and write)
+LOCK_TIMEOUT = 10
+# How long flushes outside a request wait for the lock before keeping the counts for the next flush
+LOCK_WAIT = 5
+
+_lock = threading.Lock()
+_local_counts = Counter()
+_last_flush = time.monotonic()
+
+
+@contextmanager
+def buffer_lock(wait=None):
+    """Hold the lock of the shared buffer, waiting up to `wait` seconds (LOCK_WAIT); yield False if not taken"""
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + (LOCK_WAIT if wait is None else wait)
+    while not cache.add(LOCK_KEY, token, timeout=LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            yield False
+            return
+        time.sleep(0.01)
+    try:
+        yield True
+    finally:
+        if cache.get(LOCK_KEY) == token:
+            cache.delete(LOCK_KEY)
+
+
+def record_view(package_id):
+    """Count one view of a package, flushing this worker's counts when they are due"""
+    global _last_flush
+
+    with _lock:
+        _local_counts[package_id] += 1
+        if time.monotonic() - _last_flush < settings.PACKAGE_VIEWS_FLUSH_INTERVAL:
+            return
+        _last_flush = time.monotonic()
+
+    flush_views(wait=0)
+
+
+def _take_local_counts():
+    global _local_counts
+    with _lock:
+        counts, _local_counts = _local_counts, Counter()
+    return counts
+
+
+def _restore_local_counts(counts):
+    with _lock:
+        _local_counts.update(counts)
+
+
+def push_views(wait=None):
+    """Move this worker's counts into the shared buffer; return the number moved"""
+    counts = _take_local_counts()
+    if not counts:
+        return 0
+    with buffer_lock(wait) as locked:
+        if not locked:
+            _restore_local_counts(counts)
+            return 0
+        buffered = Counter(cache.get(BUFFER_KEY) or {})
+        buffered.update(counts)
+        cache.set(BUFFER_KEY, dict(buffered), timeout=None)
+    return sum(counts.values())
+
+
+def drain_views(wait=None):
+    """Read and reset the shared buffer, then write it to the database; return the number written"""
+    with buffer_lock(wait) as locked:
+        if not locked:
+            return 0
+        counts = cache.get(BUFFER_KEY) or {}
+        cache.delete(BUFFER_KEY)
+    if not counts:
+        return 0
+
+    try:
+        with transaction.atomic():
+            for package_id, count in counts.items():
+                Package.objects.filter(pk=package_id).update(views=F('views') + count)
+    except Exception:
+        # Keep the views for the next flush
+        _restore_local_counts(counts)
+        raise
+    return sum(counts.values())
+
+
+def flush_views(wait=None):
+    """Push this worker's counts and drain the shared buffer; return the number of views written"""
+    push_views(wait)
+    return drain_views(wait)
+
+
+def _flush_at_exit():
+    if not _local_counts:
+        return
+    try:
+        flush_views()
+    except Exception as e:
+        logger.warning('Could not flush buffered package views at exit: %s', e)
+
+
+atexit.register(_flush_at_exit)
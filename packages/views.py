@@ -1,45 +1,80 @@
+from decimal import Decimal, InvalidOperation
+
 from django.shortcuts import render, get_object_or_404
 from django.core.paginator import Paginator
-from django.db.models import Q
-from .models import Package, PackageCategory
+from django.db.models import Prefetch
+from pages.middleware import replay_on_cache_hit
+from .models import Package, PackageCategory, PackageImage, PackageReview
+from .pagination import InvalidCursor, paginate_by_keyset
+from .recommendations import related_packages as get_related_packages
+from .search import search_packages
+from .view_counter import record_view
 
 
-def package_list(request):
-    """Display all packages with filtering and pagination"""
-    packages = Package.objects.filter(available=True)
+SORT_OPTIONS = ['price', '-price', 'duration_days', '-duration_days', '-created_at']
+
+
+def parse_price(value):
+    """A price bound from the query string; raise ValueError unless it is a number"""
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(value)
+    if not price.is_finite():
+        raise ValueError(value)
+    return price
 
+
+def filter_packages(packages, params):
+    """Apply the catalogue filters and sort in `params` (query string); return (packages, sort_by)"""
     # Filter by category
-    category_slug = request.GET.get('category')
+    category_slug = params.get('category')
     if category_slug:
         packages = packages.filter(category__slug=category_slug)
 
-    # Search functionality
-    search_query = request.GET.get('search')
+    # Search functionality (ranked by relevance unless another sort is chosen)
+    search_query = params.get('search')
     if search_query:
-        packages = packages.filter(
-            Q(name__icontains=search_query) |
-            Q(destination_city__icontains=search_query) |
-            Q(location__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
-
-    # Filter by price range
-    min_price = request.GET.get('min_price')
-    max_price = request.GET.get('max_price')
-    if min_price:
-        packages = packages.filter(price__gte=min_price)
-    if max_price:
-        packages = packages.filter(price__lte=max_price)
+        packages = search_packages(packages, search_query)
+
+    # Filter by price range (an invalid bound is ignored, like an unknown sort)
+    for param, lookup in (('min_price', 'price__gte'), ('max_price', 'price__lte')):
+        if params.get(param):
+            try:
+                packages = packages.filter(**{lookup: parse_price(params[param])})
+            except ValueError:
+                pass
 
     # Sorting
-    sort_by = request.GET.get('sort', '-featured')
-    if sort_by in ['price', '-price', 'duration_days', '-duration_days', '-created_at']:
+    sort_by = params.get('sort', '-featured')
+    if sort_by in SORT_OPTIONS:
         packages = packages.order_by(sort_by)
+    return packages, sort_by
 
-    # Pagination
-    paginator = Paginator(packages, 12)  # 12 packages per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+
+def package_list(request):
+    """Display all packages with filtering and pagination"""
+    packages, sort_by = filter_packages(Package.objects.cards().filter(available=True), request.GET)
+    category_slug = request.GET.get('category')
+    search_query = request.GET.get('search')
+
+    # Pagination: cursor mode (?cursor=) skips the COUNT(*) and OFFSET entirely
+    cursor_mode = 'cursor' in request.GET
+    next_query = None
+    if cursor_mode:
+        try:
+            page_obj = paginate_by_keyset(packages, sort_by, request.GET.get('cursor'), per_page=12)
+        except InvalidCursor:
+            # Like an invalid ?page=, a tampered or stale cursor shows the first page
+            page_obj = paginate_by_keyset(packages, sort_by, per_page=12)
+        if page_obj.has_next:
+            query = request.GET.copy()
+            query['cursor'] = page_obj.next_cursor
+            next_query = query.urlencode()
+    else:
+        paginator = Paginator(packages, 12)  # 12 packages per page
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
 
     categories = PackageCategory.objects.all()
 
@@ -48,31 +83,37 @@ def package_list(request):
         'categories': categories,
         'search_query': search_query,
         'selected_category': category_slug,
+        'cursor_mode': cursor_mode,
+        'next_query': next_query,
     }
     return render(request, 'packages/package_list.html', context)
 
 
 def package_detail(request, slug):
     """Display package details"""
-    package = get_object_or_404(Package, slug=slug, available=True)
-
-    # Increment views
-    package.views += 1
-    package.save(update_fields=['views'])
-
-    # Get related packages (same category)
-    related_packages = Package.objects.filter(
-        category=package.category,
+    package = get_object_or_404(
+        Package.objects.select_related('category').prefetch_related(
+            'itinerary_days',
+            Prefetch('reviews', queryset=PackageReview.objects.filter(approved=True), to_attr='approved_reviews'),
+            Prefetch('gallery_images', queryset=PackageImage.objects.order_by('order', 'id')),
+        ),
+        slug=slug,
         available=True
-    ).exclude(id=package.id)[:4]
+    )
+
+    # Count the view (buffered, written to the database in batches)
+    record_view(package.id)
 
-    # Get approved reviews
-    reviews = package.reviews.filter(approved=True)
+    # Get related packages (precomputed by compute_recommendations)
+    related_packages = get_related_packages(package)
 
     context = {
         'package': package,
         'related_packages': related_packages,
-        'reviews': reviews,
+        'reviews': package.approved_reviews,
         'gallery_images': package.gallery_images.all(),
     }
-    return render(request, 'packages/package_detail.html', context)
+    response = render(request, 'packages/package_detail.html', context)
+    # Keep counting views when the page is served from the page cache
+    replay_on_cache_hit(response, record_view, package.id)
+    return response
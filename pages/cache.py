@@ -0,0 +1,99 @@
+"""
+Per-section cache for the homepage, and versioning of the full-page cache.
+
+Homepage sections are kept in each worker's memory (travel_agency.local_cache),
+read together with one shared-cache lookup at most, and invalidated by the
+signal handlers in pages.signals whenever one of the models a section is built
+from is saved or deleted. HOME_CACHE_TIMEOUT bounds staleness for workers that
+do not share a cache backend with the process that made the change.
+
+Whole pages cached by pages.middleware.PageCacheMiddleware live in the
+'pages' cache alias and are keyed by a version number instead; any change to
+a model shown on them moves to a new version, so every cached page is dropped
+at once.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from packages.models import Package, PackageCategory, PackageImage, PackageReview
+from testimonials.models import Testimonial
+from travel_agency import local_cache
+from .models import Page, SiteSettings, Slider
+
+CACHE_KEY_PREFIX = 'home_section'
+
+HOME_SECTIONS = {
+    'featured': lambda: list(Package.objects.cards().filter(featured=True, available=True)[:8]),
+    'popular': lambda: list(Package.objects.cards().filter(popular=True, available=True)[:8]),
+    'testimonials': lambda: list(Testimonial.objects.filter(approved=True, featured=True)[:6]),
+    'categories': lambda: list(PackageCategory.objects.all()[:6]),
+    'sliders': lambda: list(Slider.objects.filter(active=True)),
+}
+
+# Models rendered on the pages of the full-page cache
+PAGE_DEPENDENCIES = [
+    Package, PackageCategory, PackageImage, PackageReview, Testimonial, Slider, Page, SiteSettings,
+]
+
+PAGE_CACHE_ALIAS = 'pages'
+PAGE_VERSION_KEY = 'page_cache_version'
+
+# Sections to drop when an instance of the model changes
+SECTION_DEPENDENCIES = {
+    Package: ['featured', 'popular'],
+    PackageCategory: ['categories'],
+    Testimonial: ['testimonials'],
+    Slider: ['sliders'],
+}
+
+
+def _cache_key(section):
+    return f'{CACHE_KEY_PREFIX}:{section}'
+
+
+def get_home_sections(sections):
+    """Return {section: contents} of homepage sections, building the ones that are not cached"""
+    cached = local_cache.get_many(
+        {_cache_key(section): HOME_SECTIONS[section] for section in sections}, settings.HOME_CACHE_TIMEOUT
+    )
+    return {section: cached[_cache_key(section)] for section in sections}
+
+
+def invalidate_home_sections(sections):
+    """Drop the given homepage sections from the cache"""
+    local_cache.invalidate([_cache_key(section) for section in sections])
+
+
+def page_cache():
+    """Cache backend of the full-page cache"""
+    return caches[PAGE_CACHE_ALIAS]
+
+
+def get_page_version():
+    """Current version of the full-page cache, part of every page key"""
+    return page_cache().get_or_set(PAGE_VERSION_KEY, lambda: uuid.uuid4().hex, None)
+
+
+def invalidate_pages():
+    """Drop every page of the full-page cache by moving to a new version"""
+    page_cache().set(PAGE_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def update_and_invalidate(queryset, **fields):
+    """
+    queryset.update() for admin actions. update() sends no signals and leaves
+    auto_now fields (which drive the API's ETags) alone, so this touches them
+    and drops the homepage sections and pages that show the model.
+    """
+    model = queryset.model
+    for field in model._meta.concrete_fields:
+        if getattr(field, 'auto_now', False):
+            fields.setdefault(field.name, timezone.now())
+    updated = queryset.update(**fields)
+    invalidate_home_sections(SECTION_DEPENDENCIES.get(model, []))
+    if model in PAGE_DEPENDENCIES:
+        invalidate_pages()
+    return updated
@@ -0,0 +1,8 @@
+from .models import SiteSettings
+
+
+def site_settings(request):
+    """Make the cached site settings available to every template"""
+    return {
+        'site_settings': SiteSettings.load(),
+    }
@@ -0,0 +1,128 @@
+"""
+Full-response cache for anonymous visitors.
+
+The views named in PAGE_CACHE_TIMEOUTS (URL name -> seconds) are stored
+whole once rendered for an anonymous visitor, and the next anonymous
+requests for the same page are answered from the cache without running the
+view. Pages are keyed by host, path and the normalized query string, so
+``?sort=price&category=goa`` and ``?category=goa&sort=price`` share an entry
+and tracking parameters (utm_*, fbclid, gclid) are ignored. Only the
+parameters a view reads (CACHE_PARAMS) may vary a page; a request with any
+other parameter is rendered normally but not stored, so made-up query
+strings cannot fill the cache.
+
+The cache is bypassed for logged-in users and for requests carrying flash
+messages, whose pages differ per visitor. Responses that set cookies or
+need a CSRF token are never stored. Keys include the version from
+pages.cache.get_page_version(), so saving any model shown on these pages
+drops them all at once.
+
+Side effects of a view that must also happen when its page is served from
+the cache (e.g. counting a package view) are registered on the response
+with replay_on_cache_hit().
+"""
+import hashlib
+from urllib.parse import parse_qsl, urlencode
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.utils.cache import patch_cache_control
+
+from .cache import get_page_version, page_cache
+
+CACHE_KEY_PREFIX = 'page'
+
+# Query parameters read by each cached view (by URL name); other views take none
+CACHE_PARAMS = {
+    'packages:package_list': {'category', 'search', 'min_price', 'max_price', 'sort', 'cursor', 'page'},
+}
+
+# Query parameters that never change the page
+IGNORED_PARAMS = ('fbclid', 'gclid')
+IGNORED_PARAM_PREFIXES = ('utm_',)
+
+
+def normalize_query(query_string, known_params=None):
+    """
+    Query string with its parameters sorted and tracking parameters removed,
+    or None if it has a parameter outside `known_params` (None: allow any).
+    """
+    params = {}
+    for key, value in parse_qsl(query_string, keep_blank_values=True):
+        if key in IGNORED_PARAMS or key.startswith(IGNORED_PARAM_PREFIXES):
+            continue
+        if known_params is not None and key not in known_params:
+            return None
+        # Views read the last value of a repeated parameter
+        params[key] = value
+    return urlencode(sorted(params.items()))
+
+
+def page_cache_key(request):
+    """Cache key of the page requested, or None if its query string must not be cached"""
+    view_name = request.resolver_match.view_name
+    query = normalize_query(request.META.get('QUERY_STRING', ''), CACHE_PARAMS.get(view_name, set()))
+    if query is None:
+        return None
+    digest = hashlib.sha1(f'{request.get_host()}{request.path}?{query}'.encode()).hexdigest()
+    return f'{CACHE_KEY_PREFIX}:{get_page_version()}:{view_name}:{digest}'
+
+
+def replay_on_cache_hit(response, func, *args):
+    """Call func(*args) again each time the cached copy of response is served"""
+    response.page_cache_replays = getattr(response, 'page_cache_replays', []) + [(func, args)]
+
+
+class PageCacheMiddleware:
+    """Serve and store whole pages for anonymous visitors (see module docstring)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        state = getattr(request, '_page_cache', None)
+        if state == 'bypass':
+            # Per-visitor page: keep shared caches from storing it
+            patch_cache_control(response, private=True)
+        elif state is not None:
+            key, timeout = state
+            if self.can_store(request, response):
+                # Browsers revalidate (the page changes on login); shared caches may keep it
+                patch_cache_control(response, public=True, max_age=0, s_maxage=timeout)
+                page_cache().set(key, (response, getattr(response, 'page_cache_replays', [])), timeout)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timeout = settings.PAGE_CACHE_TIMEOUTS.get(request.resolver_match.view_name)
+        if timeout is None or request.method not in ('GET', 'HEAD'):
+            return None
+        if request.user.is_authenticated or len(get_messages(request)):
+            request._page_cache = 'bypass'
+            return None
+
+        key = page_cache_key(request)
+        if key is None:
+            return None
+        cached = page_cache().get(key)
+        if cached is not None:
+            response, replays = cached
+            for func, args in replays:
+                func(*args)
+            return response
+
+        if request.method == 'GET':
+            request._page_cache = (key, timeout)
+        return None
+
+    def can_store(self, request, response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and not request.META.get('CSRF_COOKIE_NEEDS_UPDATE')
+            and not len(get_messages(request))
+            and 'private' not in response.get('Cache-Control', '')
+            and 'no-store' not in response.get('Cache-Control', '')
+        )
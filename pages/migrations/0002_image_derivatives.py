@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 20:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='slider',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Stored names of the responsive image derivatives'),
+        ),
+    ]
@@ -1,6 +1,12 @@
+from django.conf import settings
 from django.db import models
 from django.utils.text import slugify
 
+from travel_agency import local_cache
+
+SITE_SETTINGS_CACHE_KEY = 'site_settings'
+
+
 class Page(models.Model):
     """Static pages like About Us, Terms & Conditions, Privacy Policy"""
     title = models.CharField(max_length=200)
@@ -61,12 +67,19 @@ class SiteSettings(models.Model):
     def __str__(self):
         return self.site_name
 
+    @classmethod
+    def load(cls):
+        """Return the site settings singleton (or None), kept in the worker's memory across requests"""
+        return local_cache.get(SITE_SETTINGS_CACHE_KEY, cls.objects.first, settings.SITE_SETTINGS_CACHE_TIMEOUT)
+
 
 class Slider(models.Model):
     """Homepage slider/carousel"""
     title = models.CharField(max_length=200)
     subtitle = models.CharField(max_length=200, blank=True)
     image = models.ImageField(upload_to='slider/')
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False,
+                                         help_text="Stored names of the responsive image derivatives")
     button_text = models.CharField(max_length=50, blank=True)
     button_link = models.CharField(max_length=200, blank=True)
     order = models.PositiveIntegerField(default=0)
@@ -0,0 +1,35 @@
+from django.db.models.signals import post_delete, post_save
+
+from packages.images import register_image_fields
+from travel_agency import local_cache
+from .cache import PAGE_DEPENDENCIES, SECTION_DEPENDENCIES, invalidate_home_sections, invalidate_pages
+from .models import SITE_SETTINGS_CACHE_KEY, SiteSettings, Slider
+
+
+def invalidate_home_cache(sender, **kwargs):
+    """Drop the homepage sections built from the changed model"""
+    invalidate_home_sections(SECTION_DEPENDENCIES[sender])
+
+
+def invalidate_page_cache(sender, **kwargs):
+    """Drop the cached pages, which may show the changed model"""
+    invalidate_pages()
+
+
+def invalidate_site_settings(sender, **kwargs):
+    """Drop the cached site settings, including on bulk deletes from the admin"""
+    local_cache.invalidate([SITE_SETTINGS_CACHE_KEY])
+
+
+post_save.connect(invalidate_site_settings, sender=SiteSettings, dispatch_uid='site_settings_save')
+post_delete.connect(invalidate_site_settings, sender=SiteSettings, dispatch_uid='site_settings_delete')
+
+for model in SECTION_DEPENDENCIES:
+    post_save.connect(invalidate_home_cache, sender=model, dispatch_uid=f'home_cache_save_{model.__name__}')
+    post_delete.connect(invalidate_home_cache, sender=model, dispatch_uid=f'home_cache_delete_{model.__name__}')
+
+for model in PAGE_DEPENDENCIES:
+    post_save.connect(invalidate_page_cache, sender=model, dispatch_uid=f'page_cache_save_{model.__name__}')
+    post_delete.connect(invalidate_page_cache, sender=model, dispatch_uid=f'page_cache_delete_{model.__name__}')
+
+register_image_fields(Slider, ['image'])
@@ -1,3 +1,199 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from packages.models import Package, PackageCategory
+from packages.view_counter import flush_views
+from testimonials.models import Testimonial
+from travel_agency import local_cache
+from travel_agency.testing import QueryBudgetTestCase, create_package
+from .cache import get_home_sections, page_cache
+from .middleware import normalize_query
+from .models import SiteSettings, Slider
+
+
+class HomeQueryBudgetTests(QueryBudgetTestCase):
+    """Query budget of the homepage, measured with a cold section cache"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = PackageCategory.objects.create(name='Beach')
+        for i in range(8):
+            create_package(category, f'Goa Package {i}', featured=True, popular=True)
+        for i in range(3):
+            Testimonial.objects.create(customer_name=f'Guest {i}', package_name='Goa Package 0', rating=5,
+                                       title='Great trip', review='Loved it', approved=True, featured=True)
+            Slider.objects.create(title=f'Slide {i}', image=f'slider/slide_{i}.jpg', order=i)
+
+    def test_home(self):
+        self.assertMaxQueries(21, reverse('home'))
+
+    # Without the full-page cache, so that the section cache is measured
+    @override_settings(PAGE_CACHE_TIMEOUTS={})
+    def test_home_cached(self):
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('home'))
+        # Every section is checked against its shared version in one lookup, and the site settings in another
+        with self.settings(LOCAL_CACHE_CHECK_INTERVAL=0), self.assertNumQueries(2):
+            self.client.get(reverse('home'))
+
+
+class HomeCacheInvalidationTests(TestCase):
+    """Homepage sections are dropped from the shared cache by every admin edit"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = PackageCategory.objects.create(name='Beach')
+        cls.package = create_package(cls.category, 'Goa Package', featured=True)
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+
+    def section(self, name):
+        return get_home_sections([name])[name]
+
+    def test_other_workers_rebuild(self):
+        self.assertEqual(self.section('featured'), [self.package])
+        # A copy of this worker's sections stands in for the ones of another gunicorn worker
+        other_worker = dict(local_cache._entries)
+        self.package.featured = False
+        self.package.save()
+        local_cache._entries.update(other_worker)
+        # Its copy is served until it is checked against the shared version
+        self.assertEqual(self.section('featured'), [self.package])
+        with self.settings(LOCAL_CACHE_CHECK_INTERVAL=0):
+            self.assertEqual(self.section('featured'), [])
+
+    def test_package_edits(self):
+        self.assertEqual(self.section('featured'), [self.package])
+        self.package.featured = False
+        self.package.save()
+        self.assertEqual(self.section('featured'), [])
+
+        other = create_package(self.category, 'Kerala Package', featured=True)
+        self.assertEqual(self.section('featured'), [other])
+        other.delete()
+        self.assertEqual(self.section('featured'), [])
+
+    def test_other_sections(self):
+        self.assertEqual(self.section('sliders'), [])
+        slider = Slider.objects.create(title='Slide', image='slider/slide.jpg')
+        self.assertEqual(self.section('sliders'), [slider])
+
+        self.assertEqual(self.section('categories'), [self.category])
+        self.category.name = 'Beaches'
+        self.category.save()
+        self.assertEqual(self.section('categories')[0].name, 'Beaches')
+
+        self.assertEqual(self.section('testimonials'), [])
+        testimonial = Testimonial.objects.create(customer_name='Guest', package_name='Goa Package', rating=5,
+                                                 title='Great trip', review='Loved it',
+                                                 approved=True, featured=True)
+        self.assertEqual(self.section('testimonials'), [testimonial])
+        testimonial.delete()
+        self.assertEqual(self.section('testimonials'), [])
+
+    def test_site_settings(self):
+        self.assertIsNone(SiteSettings.load())
+        # A missing row is remembered as well
+        with self.assertNumQueries(0):
+            SiteSettings.load()
+        site = SiteSettings.objects.create(site_name='Goa Trips', contact_email='trips@example.com',
+                                           contact_phone='9999999999', address='Panaji')
+        self.assertEqual(SiteSettings.load().site_name, 'Goa Trips')
+        site.site_name = 'Goa Holidays'
+        site.save()
+        self.assertEqual(SiteSettings.load().site_name, 'Goa Holidays')
+        # The admin's bulk delete action deletes a queryset, bypassing Model.delete()
+        SiteSettings.objects.all().delete()
+        self.assertIsNone(SiteSettings.load())
+
+
+class PageCacheTests(QueryBudgetTestCase):
+    """Whole pages are served from the cache to anonymous visitors only"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = PackageCategory.objects.create(name='Beach')
+        cls.package = create_package(cls.category, 'Goa Package')
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        page_cache().clear()
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query('sort=price&category=goa&utm_source=mail&fbclid=1'),
+                         'category=goa&sort=price')
+        self.assertEqual(normalize_query('cursor='), 'cursor=')
+        self.assertEqual(normalize_query('sort=price&sort=-price', {'sort'}), 'sort=-price')
+        self.assertEqual(normalize_query('sort=price&utm_medium=mail', {'sort'}), 'sort=price')
+        self.assertIsNone(normalize_query('sort=price&x=1', {'sort'}))
+        self.assertIsNone(normalize_query('x=1', set()))
+
+    def test_unknown_params_not_cached(self):
+        url = reverse('packages:package_list')
+        self.client.get(url, {'category': 'beach', 'nonce': '1'})
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'category': 'beach', 'nonce': '1'})
+        self.assertTrue(context.captured_queries)
+        self.assertNotIn('s-maxage', response.get('Cache-Control', ''))
+        self.assertNotIn('s-maxage', self.client.get(reverse('home'), {'nonce': '1'}).get('Cache-Control', ''))
+
+        # Known parameters are still cached, in the dedicated alias
+        self.client.get(url, {'category': 'beach'})
+        cache.clear()
+        with self.assertNumQueries(2):
+            self.client.get(url, {'category': 'beach'})
+
+    def test_anonymous_pages_cached(self):
+        url = reverse('packages:package_list')
+        first = self.client.get(url, {'sort': 'price', 'category': 'beach'})
+        self.assertIn('s-maxage=120', first['Cache-Control'])
+        # One lookup for the page version and one for the page
+        with self.assertNumQueries(2):
+            response = self.client.get(f'{url}?category=beach&sort=price&utm_source=newsletter')
+        self.assertEqual(response.content, first.content)
+        # Another sort is another page
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url, {'sort': '-price'})
+        self.assertTrue(context.captured_queries)
+
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(2):
+            self.client.get(reverse('home'))
+
+    def test_model_save_invalidates(self):
+        url = reverse('packages:package_detail', args=[self.package.slug])
+        self.client.get(url)
+        self.package.name = 'Goa Beach Escape'
+        self.package.save()
+        self.assertContains(self.client.get(url), 'Goa Beach Escape')
+
+    def test_cache_hits_count_views(self):
+        url = reverse('packages:package_detail', args=[self.package.slug])
+        self.client.get(url)
+        self.client.get(url)
+        flush_views()
+        self.assertEqual(Package.objects.get(pk=self.package.pk).views, 2)
+
+    def test_authenticated_bypass(self):
+        self.client.get(reverse('home'))
+        self.client.force_login(get_user_model().objects.create_user('guest', 'guest@example.com', 'password'))
+        response = self.client.get(reverse('home'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertContains(response, 'guest')
+
+    def test_messages_bypass(self):
+        self.client.get(reverse('home'))
+        self.client.post(reverse('contact_submit'), {
+            'name': 'Guest', 'email': 'guest@example.com', 'phone': '9999999999',
+            'subject': 'Hello', 'message': 'Hi',
+        })
+        self.assertContains(self.client.get(reverse('home')), 'Your message has been sent successfully')
+        self.assertNotContains(self.client.get(reverse('home')), 'Your message has been sent successfully')
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
+from pages.cache import update_and_invalidate
 from .models import Testimonial
 
 
@@ -71,21 +72,21 @@ class TestimonialAdmin(admin.ModelAdmin):
     actions = ['approve_testimonials', 'unapprove_testimonials', 'make_featured', 'remove_featured']
 
     def approve_testimonials(self, request, queryset):
-        updated = queryset.update(approved=True)
+        updated = update_and_invalidate(queryset, approved=True)
         self.message_user(request, f'{updated} testimonial(s) approved.')
     approve_testimonials.short_description = 'Approve selected testimonials'
 
     def unapprove_testimonials(self, request, queryset):
-        updated = queryset.update(approved=False)
+        updated = update_and_invalidate(queryset, approved=False)
         self.message_user(request, f'{updated} testimonial(s) unapproved.')
     unapprove_testimonials.short_description = 'Unapprove selected testimonials'
 
     def make_featured(self, request, queryset):
-        updated = queryset.update(featured=True)
+        updated = update_and_invalidate(queryset, featured=True)
         self.message_user(request, f'{updated} testimonial(s) marked as featured.')
     make_featured.short_description = 'Mark as featured'
 
     def remove_featured(self, request, queryset):
-        updated = queryset.update(featured=False)
+        updated = update_and_invalidate(queryset, featured=False)
         self.message_user(request, f'{updated} testimonial(s) removed from featured.')
     remove_featured.short_description = 'Remove from featured'
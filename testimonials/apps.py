@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class TestimonialsConfig(AppConfig):
     name = 'testimonials'
+
+    def ready(self):
+        from . import signals  # noqa: F401
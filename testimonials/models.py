@@ -26,6 +26,8 @@ class Testimonial(models.Model):
     photo_1 = models.ImageField(upload_to='testimonials/photos/', blank=True, null=True)
     photo_2 = models.ImageField(upload_to='testimonials/photos/', blank=True, null=True)
     photo_3 = models.ImageField(upload_to='testimonials/photos/', blank=True, null=True)
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False,
+                                         help_text="Stored names of the responsive image derivatives")
 
     # Status & Display
     approved = models.BooleanField(default=False, help_text="Show on website")
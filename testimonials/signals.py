@@ -0,0 +1,4 @@
+from packages.images import register_image_fields
+from .models import Testimonial
+
+register_image_fields(Testimonial, ['customer_photo', 'photo_1', 'photo_2', 'photo_3'])
@@ -1,3 +1,17 @@
-from django.test import TestCase
+from travel_agency.testing import AdminQueryBudgetTestCase
+from .models import Testimonial
 
-# Create your tests here.
+
+class TestimonialAdminQueryBudgetTests(AdminQueryBudgetTestCase):
+    """The testimonial changelist must not run a query per row"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Testimonial.objects.bulk_create([
+            Testimonial(customer_name=f'Guest {i}', package_name='Goa Package', rating=5,
+                        title='Great trip', review='Loved it', approved=i % 2 == 0)
+            for i in range(2000)
+        ], batch_size=500)
+
+    def test_testimonial_changelist(self):
+        self.assertChangelistQueries(9, Testimonial)
@@ -0,0 +1,66 @@
+"""
+Process-local cache for small values read on most requests.
+
+With the database cache backend every cache lookup is a SQL query, so values
+such as the homepage sections are kept in each worker's memory instead. Only
+a version per key lives in the shared cache: a local copy is served for up to
+LOCAL_CACHE_CHECK_INTERVAL seconds, then its version is compared with the
+shared one (one get_many() for all keys read together) and the value is
+rebuilt if it moved on. invalidate() moves the versions on, so every worker
+drops its copy within the interval, and the invalidating worker at once.
+
+A key without a shared version (never invalidated, or evicted) has version
+None; `timeout` bounds the age of any copy.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY_PREFIX = 'local_version'
+
+# key -> (value, version, built_at, checked_at), times from time.monotonic()
+_entries = {}
+
+
+def _version_key(key):
+    return f'{VERSION_KEY_PREFIX}:{key}'
+
+
+def get_many(builders, timeout):
+    """Return {key: value} for {key: build function}, building the copies that are missing or out of date"""
+    now = time.monotonic()
+    entries = {key: _entries.get(key) for key in builders}
+    due = [
+        key for key, entry in entries.items()
+        if entry is None or now - entry[3] >= settings.LOCAL_CACHE_CHECK_INTERVAL
+    ]
+    if due:
+        versions = cache.get_many([_version_key(key) for key in due])
+        for key in due:
+            version = versions.get(_version_key(key))
+            entry = entries[key]
+            if entry is None or entry[1] != version or now - entry[2] >= timeout:
+                entry = (builders[key](), version, now, now)
+            else:
+                entry = (entry[0], version, entry[2], now)
+            _entries[key] = entries[key] = entry
+    return {key: entry[0] for key, entry in entries.items()}
+
+
+def get(key, build, timeout):
+    """Return the value of `key`, building it if this process has no current copy"""
+    return get_many({key: build}, timeout)[key]
+
+
+def invalidate(keys):
+    """Make every process rebuild the values of `keys`"""
+    cache.set_many({_version_key(key): uuid.uuid4().hex for key in keys}, timeout=None)
+    for key in keys:
+        _entries.pop(key, None)
+
+
+def clear():
+    """Forget this process's copies, e.g. between tests that roll the database back"""
+    _entries.clear()
@@ -61,6 +61,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'pages.middleware.PageCacheMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -79,6 +80,7 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'django.template.context_processors.media',
                 'django.template.context_processors.static',
+                'pages.context_processors.site_settings',
             ],
         },
     },
@@ -108,6 +110,43 @@ else:
     }
 
 
+# Cache
+# One cache shared by every gunicorn worker, so that the signal handlers that
+# drop cached data after an edit reach all processes: Redis when REDIS_URL is
+# set (render.yaml provisions one), otherwise a table in the database (created by
+# `manage.py createcachetable`), where every lookup is a query.
+# Whole pages (pages.middleware) get their own alias, so a burst of distinct
+# URLs only evicts other pages: a separate table with its own size limit, or a
+# separate Redis (PAGE_CACHE_REDIS_URL, e.g. another database number)
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+        'pages': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('PAGE_CACHE_REDIS_URL', default=REDIS_URL),
+            'KEY_PREFIX': 'pages',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+        'pages': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_page_cache',
+            'OPTIONS': {'MAX_ENTRIES': config('PAGE_CACHE_MAX_ENTRIES', default=2000, cast=int)},
+        },
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -171,6 +210,61 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'noreply@travelagency.com'
 
+# Outbound email queue (see bookings.outbox): attempts before an email is marked
+# failed, and the base delay in seconds between attempts (doubled each retry)
+EMAIL_OUTBOX_MAX_ATTEMPTS = config('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5, cast=int)
+EMAIL_OUTBOX_RETRY_DELAY = config('EMAIL_OUTBOX_RETRY_DELAY', default=60, cast=int)
+
+# Seconds between writes of buffered package view counts to the database
+PACKAGE_VIEWS_FLUSH_INTERVAL = config('PACKAGE_VIEWS_FLUSH_INTERVAL', default=60, cast=int)
+
+# Seconds a worker serves its own copy of a hot cached value (homepage sections,
+# site settings, pricing rules) before checking whether another process changed
+# it (see travel_agency.local_cache)
+LOCAL_CACHE_CHECK_INTERVAL = config('LOCAL_CACHE_CHECK_INTERVAL', default=5, cast=int)
+
+# Seconds a cached homepage section may be served before it is rebuilt
+HOME_CACHE_TIMEOUT = config('HOME_CACHE_TIMEOUT', default=300, cast=int)
+
+# Seconds the cached SiteSettings singleton may be served before it is reloaded
+SITE_SETTINGS_CACHE_TIMEOUT = config('SITE_SETTINGS_CACHE_TIMEOUT', default=300, cast=int)
+
+# Seconds the active booking pricing rules may be cached before they are reloaded
+PRICING_RULES_CACHE_TIMEOUT = config('PRICING_RULES_CACHE_TIMEOUT', default=300, cast=int)
+
+# Seats on sale for a package departure date that has no explicit capacity yet
+DEPARTURE_DEFAULT_CAPACITY = config('DEPARTURE_DEFAULT_CAPACITY', default=30, cast=int)
+
+# Seconds a package's availability calendar may be cached (dropped on every reservation)
+AVAILABILITY_CACHE_TIMEOUT = config('AVAILABILITY_CACHE_TIMEOUT', default=60, cast=int)
+
+# Seconds the seats chosen on the booking form stay held for the customer
+# (expired holds are released by the release_expired_holds command)
+SEAT_HOLD_TTL = config('SEAT_HOLD_TTL', default=900, cast=int)
+
+# Packages a visitor's session may hold seats on at the same time
+SEAT_HOLDS_PER_SESSION = config('SEAT_HOLDS_PER_SESSION', default=3, cast=int)
+
+# Days ahead that seats can be held for a travel date
+BOOKING_WINDOW_DAYS = config('BOOKING_WINDOW_DAYS', default=365, cast=int)
+
+# Seconds a booking form submission is remembered so replays return the original booking
+# (older keys are deleted by the purge_idempotency_keys command)
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=86400, cast=int)
+
+# Seconds clients and CDNs may reuse a JSON API response before revalidating it (ETag)
+API_CACHE_MAX_AGE = config('API_CACHE_MAX_AGE', default=60, cast=int)
+
+# Seconds anonymous visitors are served a whole page from the cache, by URL name
+# (see pages.middleware; every page is dropped when a model shown on it changes)
+PAGE_CACHE_TIMEOUTS = {
+    'home': 300,
+    'about': 3600,
+    'page_detail': 3600,
+    'packages:package_list': 120,
+    'packages:package_detail': 300,
+}
+
 # Messages Framework
 from django.contrib.messages import constants as messages
 MESSAGE_TAGS = {
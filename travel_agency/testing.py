@@ -0,0 +1,120 @@
+"""
+Helpers shared by the tests of every app: package fixtures and query budget test cases.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from packages.models import Package
+from packages.view_counter import flush_views
+from travel_agency import local_cache
+
+
+def create_package(category, name, **kwargs):
+    """Create an available package with the required fields filled in"""
+    fields = {
+        'category': category,
+        'name': name,
+        'description': 'Sun and sand',
+        'short_description': 'Sun and sand',
+        'price': Decimal('10000'),
+        'duration_days': 3,
+        'duration_nights': 2,
+        'location': 'Goa',
+        'destination_city': 'Goa',
+        'inclusions': 'Hotel\nBreakfast',
+        'exclusions': 'Flights',
+        'highlights': 'Beaches\nForts',
+        'itinerary': 'Day 1: Arrival\n- Check-in\n\nDay 2: Beaches\n\nDay 3: Departure',
+        'featured_image': 'packages/featured/goa.jpg',
+    }
+    fields.update(kwargs)
+    return Package.objects.create(**fields)
+
+
+# For tests of cache behaviour that is the same on every backend
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'pages': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pages'},
+}
+
+
+# Buffered view counts must not be flushed in the middle of a measured request,
+# and templates must render without a collectstatic manifest. Budgets are measured
+# with the configured cache backend, so database cache lookups count as queries.
+@override_settings(
+    PACKAGE_VIEWS_FLUSH_INTERVAL=3600,
+    STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+)
+class QueryBudgetTestCase(TestCase):
+    """
+    Base class for query budget tests of public views.
+
+    Fixtures should create several related rows (reviews, images, packages) so
+    that an N+1 regression exceeds the budget instead of hiding in a small count.
+    Budgets include the queries of the configured cache backend: with the
+    database cache, filling the page cache and its version costs 12.
+    """
+
+    def setUp(self):
+        # Copies built from another test's (rolled back) data
+        local_cache.clear()
+
+    def assertMaxQueries(self, budget, url, method='get', data=None, status_code=200):
+        """Request `url` with a cold cache and fail if it runs more than `budget` queries"""
+        for backend in caches.all():
+            backend.clear()
+        local_cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, data)
+        self.assertEqual(response.status_code, status_code)
+        queries = '\n'.join(query['sql'] for query in context.captured_queries)
+        self.assertLessEqual(
+            len(context), budget,
+            f'{url} ran {len(context)} queries (budget {budget}):\n{queries}'
+        )
+        return response
+
+    def tearDown(self):
+        # Write views counted by the requests while this test's cache and database exist
+        flush_views()
+
+
+class AdminQueryBudgetTestCase(QueryBudgetTestCase):
+    """Query budgets of admin changelists; fixtures should fill several pages of rows"""
+
+    def setUp(self):
+        super().setUp()
+        user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+
+    def assertChangelistQueries(self, budget, model):
+        url = reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist')
+        return self.assertMaxQueries(budget, url)
+
+
+def bulk_create_packages(category, count):
+    """Insert many packages without going through save() (fixtures for admin tests)"""
+    return Package.objects.bulk_create([
+        Package(
+            category=category,
+            name=f'{category.name} Package {i}',
+            slug=f'{category.slug}-package-{i}',
+            description='Sun and sand',
+            short_description='Sun and sand',
+            price=Decimal(10000 + i),
+            duration_days=3,
+            duration_nights=2,
+            location='Goa',
+            destination_city='Goa',
+            inclusions='Hotel',
+            exclusions='Flights',
+            itinerary='Day 1: Arrival',
+        )
+        for i in range(count)
+    ], batch_size=500)
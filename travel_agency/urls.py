@@ -25,6 +25,7 @@ urlpatterns = [
     path('packages/', include('packages.urls')),
     path('bookings/', include('bookings.urls')),
     path('users/', include('users.urls')),
+    path('api/', include('packages.api_urls')),
 ]
 
 # Serve media files in development